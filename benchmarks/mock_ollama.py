@@ -0,0 +1,315 @@
+"""
+Deterministic stand-in for the Ollama API, for measuring the pipeline without a model.
+
+Serves /api/chat, /api/generate, /api/embeddings and /api/embed with:
+- configurable first-token and per-token latency,
+- canned replies picked by prompt (the repo's agents get replies they can parse; a
+  JSON-schema `format` gets a minimal object that satisfies it),
+- record/replay: with --upstream, misses are forwarded to a real Ollama server and
+  saved to the --cassette file; later runs replay them without the upstream,
+- deterministic bag-of-words embeddings, so texts sharing words are similar.
+
+Usage:
+    python benchmarks/mock_ollama.py --port 11435 --token-latency 0.01
+    OLLAMA_HOST=http://127.0.0.1:11435 python fastapi_app/bulk_process.py
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+# --- Configuration ---
+DEFAULT_PORT = 11435
+EMBEDDING_DIM = 768
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# (substring of the prompt, reply); the first match wins
+CANNED_RESPONSES = [
+    ("You are a debate agent", "<response><agree>true</agree></response>"),
+    ("XML formatting agent", "<response><target>mock target</target><stance>neutral</stance></response>"),
+    ("You are a routing agent", "explicit"),
+    ("expert in stance detection", "neutral"),
+    ("expert in identifying implicit targets", "mock target"),
+    ("expert in identifying explicit targets", "mock target"),
+    ("You are a linguistic expert", "The text is informal and mildly negative in tone, with a sarcastic style."),
+    ("identify concise, 2-3 word targets",
+     '{"target1": "mock target", "target2": "second target", "target3": "third target"}'),
+    ("determine the stance towards a target", '{"stance": "NEUTRAL"}'),
+    ("generate exactly two alternative phrases", "mock target\nmock topic"),
+    ("linguistic features", "The post is informal, with a negative and sarcastic tone."),
+]
+DEFAULT_RESPONSE = "This is a deterministic reply from the mock Ollama server."
+
+
+def request_key(path, body):
+    """Content address of a generation request, used by the record/replay cassette."""
+    relevant = {
+        "path": path,
+        "model": body.get("model"),
+        "messages": body.get("messages"),
+        "system": body.get("system"),
+        "prompt": body.get("prompt"),
+        "format": body.get("format"),
+        "options": body.get("options"),
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def prompt_text(body):
+    if "messages" in body:
+        return "\n".join(str(message.get("content", "")) for message in body["messages"])
+    return f"{body.get('system') or ''}\n{body.get('prompt') or ''}"
+
+
+def value_for_schema(schema, seed):
+    """A minimal value that satisfies a JSON schema (enums pick a seed-dependent member)."""
+    if not isinstance(schema, dict):
+        return None
+    if "enum" in schema:
+        return schema["enum"][seed % len(schema["enum"])]
+    kind = schema.get("type")
+    if kind == "object" or "properties" in schema:
+        return {name: value_for_schema(sub, seed) for name, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [value_for_schema(schema.get("items", {}), seed)]
+    if kind == "boolean":
+        return True
+    if kind in ("integer", "number"):
+        return 0
+    return "mock target"
+
+
+@lru_cache(maxsize=65536)
+def _word_vector(word, dim):
+    seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def mock_embedding(text, dim=EMBEDDING_DIM):
+    """Sum of per-word random vectors, L2-normalized; identical for identical texts."""
+    words = WORD_PATTERN.findall(str(text).lower()) or [""]
+    vector = np.sum([_word_vector(word, dim) for word in words], axis=0)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm > 0 else vector).tolist()
+
+
+class MockOllama:
+    """Reply selection, latency model and the record/replay cassette."""
+
+    def __init__(self, first_token_latency=0.02, token_latency=0.01, responses=None,
+                 cassette=None, upstream=None, embedding_dim=EMBEDDING_DIM):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.responses = list(responses or []) + CANNED_RESPONSES
+        self.cassette = cassette
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.embedding_dim = embedding_dim
+        self.recorded = {}
+        self._lock = threading.Lock()
+        if cassette and os.path.exists(cassette):
+            with open(cassette, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.recorded[entry["key"]] = entry["response"]
+
+    def reply(self, path, body):
+        key = request_key(path, body)
+        if key in self.recorded:
+            return self.recorded[key]
+        if self.upstream:
+            return self._record(key, path, body)
+
+        text = prompt_text(body)
+        schema = body.get("format")
+        if isinstance(schema, dict):
+            seed = int(key[:8], 16)
+            return json.dumps(value_for_schema(schema, seed))
+        if schema == "json":
+            return "{}"
+        for needle, response in self.responses:
+            if needle in text:
+                return response
+        return DEFAULT_RESPONSE
+
+    def _record(self, key, path, body):
+        response = requests.post(f"{self.upstream}{path}", json=dict(body, stream=False), timeout=600)
+        response.raise_for_status()
+        data = response.json()
+        text = data["message"]["content"] if "message" in data else data.get("response", "")
+        with self._lock:
+            self.recorded[key] = text
+            if self.cassette:
+                with open(self.cassette, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "response": text}) + "\n")
+        return text
+
+    def stats(self, body, tokens):
+        prompt_tokens = len(prompt_text(body).split())
+        return {
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((self.first_token_latency + self.token_latency * len(tokens)) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(self.first_token_latency * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(self.token_latency * len(tokens) * 1e9),
+            # Stand-in token ids; a client continuing the call sends them back
+            "context": list(body.get("context") or []) + list(range(prompt_tokens + len(tokens))),
+        }
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Token chunks are tiny; without this, Nagle + delayed ACK adds ~40ms per call
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, data, status=200):
+            payload = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _write_chunk(self, data):
+            line = json.dumps(data).encode("utf-8") + b"\n"
+            self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path == "/api/version":
+                self._send_json({"version": "0.0.0-mock"})
+            elif self.path == "/api/tags":
+                self._send_json({"models": []})
+            else:
+                payload = b"Ollama is running"
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+            if self.path == "/api/embeddings":
+                self._send_json({"embedding": mock_embedding(body.get("prompt", ""), mock.embedding_dim)})
+                return
+            if self.path == "/api/embed":
+                inputs = body.get("input", "")
+                inputs = inputs if isinstance(inputs, list) else [inputs]
+                self._send_json({
+                    "model": body.get("model"),
+                    "embeddings": [mock_embedding(text, mock.embedding_dim) for text in inputs],
+                })
+                return
+            if self.path not in ("/api/chat", "/api/generate"):
+                self._send_json({"error": f"unknown endpoint {self.path}"}, status=404)
+                return
+
+            try:
+                text = mock.reply(self.path, body)
+            except requests.RequestException as e:
+                self._send_json({"error": f"upstream failed: {e}"}, status=502)
+                return
+            tokens = TOKEN_PATTERN.findall(text)
+            chat = self.path == "/api/chat"
+
+            def message(content, done):
+                base = {"model": body.get("model"), "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": done}
+                if chat:
+                    base["message"] = {"role": "assistant", "content": content}
+                else:
+                    base["response"] = content
+                return base
+
+            time.sleep(mock.first_token_latency)
+            if not body.get("stream", True):
+                time.sleep(mock.token_latency * len(tokens))
+                self._send_json({**message(text, True), **mock.stats(body, tokens)})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for token in tokens:
+                    self._write_chunk(message(token, False))
+                    time.sleep(mock.token_latency)
+                self._write_chunk({**message("", True), **mock.stats(body, tokens)})
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client closed the stream early (e.g. early stop); stop "generating"
+                self.close_connection = True
+
+    return Handler
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that stop a stream early reset the connection; that is expected
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def serve(port=DEFAULT_PORT, host="127.0.0.1", **kwargs):
+    """Starts the mock server and blocks."""
+    server = MockServer((host, port), make_handler(MockOllama(**kwargs)))
+    print(f"Mock Ollama listening on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deterministic mock of the Ollama API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--first-token-latency", type=float, default=0.02,
+                        help="Seconds before the first token (stands in for prompt eval).")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds per generated token.")
+    parser.add_argument("--responses", help="JSON file of [{\"match\": ..., \"response\": ...}] checked before the built-in replies.")
+    parser.add_argument("--cassette", help="JSON-lines file of recorded replies to replay (and to record into).")
+    parser.add_argument("--upstream", help="Real Ollama URL; replies missing from the cassette are fetched and recorded.")
+    parser.add_argument("--embedding-dim", type=int, default=EMBEDDING_DIM)
+    args = parser.parse_args()
+
+    responses = None
+    if args.responses:
+        with open(args.responses, "r", encoding="utf-8") as f:
+            responses = [(entry["match"], entry["response"]) for entry in json.load(f)]
+
+    serve(
+        port=args.port,
+        host=args.host,
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency,
+        responses=responses,
+        cassette=args.cassette,
+        upstream=args.upstream,
+        embedding_dim=args.embedding_dim,
+    )
@@ -0,0 +1,235 @@
+"""
+Pipeline benchmark suite against the mock Ollama server.
+
+Starts benchmarks/mock_ollama.py in a subprocess (so its CPU is not counted), points
+every Ollama caller at it and measures each stage:
+
+- transport:  one streamed /api/chat call per item
+- graph:      one LangGraph stance run per item, sequentially
+- bulk:       bulk_process.process_row over all items with --workers in flight
+- evaluation: processed_data/evals/evaluation.py's evaluate_file on a synthetic CSV
+
+For every stage it reports throughput, p50/p99 latency and Python-side CPU per item.
+The LLM response cache is disabled and run files / embeddings go to a temp directory.
+
+Usage:
+    python benchmarks/run_benchmarks.py --runs 50 --workers 4 --token-latency 0.005
+"""
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import requests
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_DIR)
+
+STAGES = ["transport", "graph", "bulk", "evaluation"]
+SAMPLE_TEXTS = [
+    "Electric cars are the future, and the new tax credits finally make them affordable.",
+    "Another day, another 'update' that makes my phone slower. Great job, guys.",
+    "Remote work has its perks, but I miss the energy of a real office.",
+    "If they cut the library budget again, where are kids supposed to study?",
+    "The vaccine rollout here has been remarkably smooth so far.",
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(port, args):
+    command = [
+        sys.executable, os.path.join(ROOT_DIR, "benchmarks", "mock_ollama.py"),
+        "--port", str(port),
+        "--first-token-latency", str(args.first_token_latency),
+        "--token-latency", str(args.token_latency),
+    ]
+    if args.cassette:
+        command += ["--cassette", args.cassette]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=0.5)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("Mock Ollama server did not start")
+
+
+def summarize(stage, count, wall_seconds, cpu_seconds, latencies=None):
+    """Stage result; latency percentiles are None when items are not timed one by one."""
+    percentiles = [None, None]
+    if latencies:
+        percentiles = [round(float(p), 1) for p in np.percentile(np.asarray(latencies) * 1000, [50, 99])]
+    return {
+        "stage": stage,
+        "items": count,
+        "wall_s": round(wall_seconds, 3),
+        "throughput_per_s": round(count / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "p50_ms": percentiles[0],
+        "p99_ms": percentiles[1],
+        "cpu_ms_per_item": round(cpu_seconds * 1000 / count, 2) if count else 0.0,
+    }
+
+
+@contextlib.contextmanager
+def measured():
+    """Yields a dict that gets the wall and process CPU seconds of the block."""
+    result = {}
+    wall, cpu = time.perf_counter(), time.process_time()
+    # The pipeline prints every token; keep that work but not the terminal output
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield result
+    result["wall"] = time.perf_counter() - wall
+    result["cpu"] = time.process_time() - cpu
+
+
+def inputs(runs):
+    return [f"{SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]} (#{i})" for i in range(runs)]
+
+
+# --- Stages ---
+def bench_transport(texts, args):
+    from langgraph_stance_analyzer import ollama_transport
+
+    latencies = []
+    with measured() as totals:
+        for text in texts:
+            started = time.perf_counter()
+            "".join(ollama_transport.stream_chat("llama3.1:8b", [{"role": "user", "content": text}]))
+            latencies.append(time.perf_counter() - started)
+    return summarize("transport", len(texts), totals["wall"], totals["cpu"], latencies)
+
+
+def bench_graph(texts, args):
+    from langgraph_stance_analyzer.main import app
+
+    latencies = []
+    with measured() as totals:
+        for text in texts:
+            started = time.perf_counter()
+            app.invoke({"input": text, "target": "", "max_turns": 3})
+            latencies.append(time.perf_counter() - started)
+    return summarize("graph", len(texts), totals["wall"], totals["cpu"], latencies)
+
+
+def bench_bulk(texts, args, work_dir):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from fastapi_app import bulk_process
+    from fastapi_app.run_store import RunStore
+
+    bulk_process.AGENT_RUNS_DIR = os.path.join(work_dir, "agent_runs")
+    os.makedirs(bulk_process.AGENT_RUNS_DIR, exist_ok=True)
+    run_store = RunStore(bulk_process.AGENT_RUNS_DIR)
+    rows = [{"post": text, "label": "neutral", "new_topic": "mock target"} for text in texts]
+    latencies = []
+
+    async def run_all():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.workers))
+        semaphore = asyncio.Semaphore(args.workers)
+
+        async def bounded(position, row):
+            async with semaphore:
+                started = time.perf_counter()
+                await bulk_process.process_row(position, row, len(rows), run_store)
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(bounded(position, row) for position, row in enumerate(rows)))
+
+    with measured() as totals:
+        asyncio.run(run_all())
+    return summarize(f"bulk (x{args.workers})", len(rows), totals["wall"], totals["cpu"], latencies)
+
+
+def bench_evaluation(texts, args, work_dir):
+    spec = importlib.util.spec_from_file_location(
+        "evals_evaluation", os.path.join(ROOT_DIR, "processed_data", "evals", "evaluation.py")
+    )
+    evaluation = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(evaluation)
+
+    input_path = os.path.join(work_dir, "agent_results_bench.csv")
+    with open(input_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["target", "stance", "Predicted_Target", "Predicted_Stance"])
+        for i, text in enumerate(texts):
+            writer.writerow([f"topic {i % 17}", "FAVOR", " ".join(text.split()[:3]), "FAVOR"])
+
+    with measured() as totals:
+        evaluation.evaluate_file(input_path)
+    # evaluate_file scores the file in chunks, so there is no per-row latency
+    return summarize("evaluation", len(texts), totals["wall"], totals["cpu"])
+
+
+def print_table(results):
+    columns = ["stage", "items", "wall_s", "throughput_per_s", "p50_ms", "p99_ms", "cpu_ms_per_item"]
+    widths = {column: max(len(column), *(len(str(result[column])) for result in results)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for result in results:
+        print("  ".join(str("-" if result[column] is None else result[column]).ljust(widths[column]) for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stance pipeline against a mock Ollama server.")
+    parser.add_argument("--runs", type=int, default=20, help="Items per stage.")
+    parser.add_argument("--workers", type=int, default=4, help="Rows in flight for the bulk stage.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--first-token-latency", type=float, default=0.0)
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="Mock seconds per token; 0 measures pure orchestration overhead.")
+    parser.add_argument("--cassette", help="Replay recorded replies (see mock_ollama.py --upstream).")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_mock_server(port, args)
+    work_dir = tempfile.mkdtemp(prefix="stance-bench-")
+
+    # Must be set before the pipeline modules are imported; they read it at import time
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{port}"
+    os.environ["LLM_CACHE_DISABLED"] = "1"
+    os.environ["EMBEDDING_STORE_DIR"] = os.path.join(work_dir, "embeddings")
+
+    texts = inputs(args.runs)
+    results = []
+    try:
+        for stage in args.stages:
+            print(f"Running {stage} ({args.runs} items)...", flush=True)
+            if stage == "transport":
+                results.append(bench_transport(texts, args))
+            elif stage == "graph":
+                results.append(bench_graph(texts, args))
+            elif stage == "bulk":
+                results.append(bench_bulk(texts, args, work_dir))
+            elif stage == "evaluation":
+                results.append(bench_evaluation(texts, args, work_dir))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print()
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=4)
+        print(f"\nResults saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,23 @@
 import csv
-import requests
-import numpy as np
 
-OLLAMA_EMBED_URL = "http://localhost:11434/api/embeddings"
+from langgraph_stance_analyzer import ollama_transport
+from langgraph_stance_analyzer.embedding_store import EmbeddingStore
+from langgraph_stance_analyzer.similarity import best_matches, iter_chunks
+
 MODEL_NAME = "llama3.1:8b"
+EMBEDDING_STORE = EmbeddingStore(MODEL_NAME)
 
 # ------------------ Embedding Function ------------------
-def get_embedding(text):
-    payload = {
-        "model": MODEL_NAME,
-        "prompt": text
-    }
-    response = requests.post(OLLAMA_EMBED_URL, json=payload)
-    response.raise_for_status()
-    return response.json()["embedding"]
-
-# ------------------ Cosine Similarity ------------------
-def cosine_sim(a, b):
-    a = np.array(a)
-    b = np.array(b)
-    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+def get_embeddings(texts):
+    return EMBEDDING_STORE.get_or_compute(
+        texts, lambda text: ollama_transport.embed(MODEL_NAME, text)
+    )
 
 
 # ------------------ Main Script ------------------
 input_csv = "vast_filtered_ex_simple_agent_pred.csv"
 output_csv = "vast_ex_stance_with_similarity_results.csv"
+CHUNK_SIZE = 1024
 
 correct = 0
 total = 0
@@ -37,40 +30,31 @@ with open(input_csv, "r", encoding="utf-8") as infile, \
     writer = csv.DictWriter(outfile, fieldnames=fieldnames)
     writer.writeheader()
 
-    for row in reader:
-        gt = row["new_topic"]
-        t1 = row["target1"]
-        t2 = row["target2"]
-        t3 = row["target3"]
-
-        # 1. Get embeddings
-        gt_emb = get_embedding(gt)
-        t1_emb = get_embedding(t1)
-        t2_emb = get_embedding(t2)
-        t3_emb = get_embedding(t3)
-
-        # 2. Cosine Similarities
-        sim1 = cosine_sim(gt_emb, t1_emb)
-        sim2 = cosine_sim(gt_emb, t2_emb)
-        sim3 = cosine_sim(gt_emb, t3_emb)
-
-        # 3. Determine best target
-        sims = [sim1, sim2, sim3]
-        best_index = np.argmax(sims)
-        best_target = [t1, t2, t3][best_index]
-
-        # 4. Track accuracy
-        total += 1
-        if best_target.strip().lower() == gt.strip().lower():
-            correct += 1
-
-        # 5. Write row with similarity values
-        row["sim1"] = sim1
-        row["sim2"] = sim2
-        row["sim3"] = sim3
-        row["best_target"] = best_target
-
-        writer.writerow(row)
+    for rows in iter_chunks(reader, CHUNK_SIZE):
+        gts = [row["new_topic"] for row in rows]
+        candidates = [[row["target1"], row["target2"], row["target3"]] for row in rows]
+
+        # 1. Get embeddings for the whole chunk
+        gt_matrix = get_embeddings(gts)
+        candidate_matrix = get_embeddings([t for row_targets in candidates for t in row_targets])
+        candidate_matrix = candidate_matrix.reshape(len(rows), 3, -1)
+
+        # 2. Cosine similarities and best target for every row at once
+        sims, best_index, _ = best_matches(gt_matrix, candidate_matrix)
+
+        for row, gt, row_targets, row_sims, best in zip(rows, gts, candidates, sims, best_index):
+            best_target = row_targets[best]
+
+            # 3. Track accuracy
+            total += 1
+            if best_target.strip().lower() == gt.strip().lower():
+                correct += 1
+
+            # 4. Write row with similarity values
+            row["sim1"], row["sim2"], row["sim3"] = (float(sim) for sim in row_sims)
+            row["best_target"] = best_target
+
+        writer.writerows(rows)
 
 # ------------------ Final Accuracy ------------------
 accuracy = correct / total
@@ -1,5 +1,4 @@
 
-import pandas as pd
 import os
 import sys
 import json
@@ -7,10 +6,20 @@ import uuid
 from datetime import datetime
 import xml.etree.ElementTree as ET
 import asyncio
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Add project root to system path to allow imports from other directories
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from langgraph_stance_analyzer.main import app as langgraph_app
+from fastapi_app.run_store import RunStore
+from langgraph_stance_analyzer.usage import UsageTracker
+from langgraph_stance_analyzer.results_journal import JournalMismatchError, ResultsJournal, file_digest, row_key
+from langgraph_stance_analyzer.dataset_io import PredictionWriter, iter_rows
+from langgraph_stance_analyzer.similarity import iter_chunks
+from langgraph_stance_analyzer.target_index import get_default_index
+from langgraph_stance_analyzer.semantic_cache import get_default_semantic_cache
 
 # --- Configuration ---
 # Assuming the 'data' directory is at the project root
@@ -19,6 +28,16 @@ INPUT_CSV_PATH = os.path.join(DATA_DIR, "vast_filtered_ex.csv")
 OUTPUT_CSV_PATH = os.path.join(DATA_DIR, "vast_filtered_ex_with_predictions.csv")
 AGENT_RUNS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "agent_runs"))
 NUM_ROWS_TO_PROCESS = 50
+# Rows in flight at once; size this to what the Ollama backend can serve in parallel
+NUM_WORKERS = int(os.environ.get("BULK_WORKERS", 4))
+# Dataset store splits use the standard column names; rows and run files use VAST's
+STORE_TO_VAST_COLUMNS = {"tweet": "post", "target": "new_topic", "stance": "label"}
+# Also map each predicted target to its nearest known ground-truth target (see target_index.py)
+CANONICAL_TARGETS = os.environ.get("CANONICAL_TARGETS", "0") == "1"
+# Output rows whose canonical targets are looked up in one batch
+CANONICAL_BATCH = 1024
+# Results reused for near-duplicate posts (SEMANTIC_CACHE=1); None when disabled
+semantic_cache = get_default_semantic_cache()
 
 def parse_final_response(final_response_str: str) -> tuple[str | None, str | None]:
     """Parses the XML output from the final agent to extract target and stance."""
@@ -37,90 +56,267 @@ def parse_final_response(final_response_str: str) -> tuple[str | None, str | Non
         print(f"  \n[Error] Could not parse XML response: {final_response_str}. Error: {e}")
         return "parsing_error", "parsing_error"
 
-async def process_dataset():
-    """
-    Reads the input CSV, runs the stance analysis agent on each post,
-    and saves the results to a new CSV.
-    """
-    print(f"Starting bulk processing for {INPUT_CSV_PATH}")
-    os.makedirs(AGENT_RUNS_DIR, exist_ok=True)
-    os.makedirs(DATA_DIR, exist_ok=True)
+def read_rows(input_path, start, stop, sample):
+    """(row_index, row) pairs of the input; store splits are renamed to the VAST columns."""
+    for position, row in iter_rows(input_path, start, stop, sample):
+        if 'post' not in row:
+            row = {STORE_TO_VAST_COLUMNS.get(column, column): value for column, value in row.items()}
+        yield position, row
 
-    try:
-        df = pd.read_csv(INPUT_CSV_PATH)
-    except FileNotFoundError:
-        print(f"\n[Error] Input file not found at: {INPUT_CSV_PATH}")
-        print("Please ensure the 'data/vast/vast_filtered_ex.csv' file exists.")
-        return
+def journal_path(output_path):
+    """Completed rows are journaled next to the output; an interrupted run resumes from there."""
+    return f"{output_path}.journal.jsonl"
 
-    # Limit the dataframe to the first N rows for processing
-    df_to_process = df.head(NUM_ROWS_TO_PROCESS).copy()
-    
-    predicted_targets = []
-    predicted_stances = []
+def input_key(row):
+    """Journal key of a row: its post plus the ground truth carried into the output."""
+    return row_key(row['post'], row.get('new_topic'), row.get('label'))
 
-    print(f"\nProcessing the first {NUM_ROWS_TO_PROCESS} rows...")
+async def process_row(position, row, total, run_store, journal=None):
+    """
+    Runs the stance analysis agent on a single row, saves its run log and
+    returns the predicted target and stance.
+    A completed row is also recorded in `journal`, so a restarted run skips it.
+    A post close enough to one already processed reuses its result (semantic cache).
+    """
+    run_id = str(uuid.uuid4())
+    timestamp = datetime.now()
+    input_text = row['post']
 
-    for index, row in df_to_process.iterrows():
-        run_id = str(uuid.uuid4())
-        timestamp = datetime.now()
-        input_text = row['post']
-        
-        print(f"\n[{index + 1}/{NUM_ROWS_TO_PROCESS}] Processing run_id: {run_id}")
-        print(f"  Input text: \"{input_text[:80]}...\"")
+    print(f"\n[{position + 1}/{total}] Processing run_id: {run_id}")
+    print(f"  Input text: \"{input_text[:80]}...\"")
 
+    usage = UsageTracker()
+    cached, similarity = None, 0.0
+    if semantic_cache is not None:
+        cached, similarity = await asyncio.to_thread(semantic_cache.lookup, input_text)
+    if cached is not None:
+        print(f"  -> [{position + 1}/{total}] Semantic cache hit ({similarity:.3f}) on run {cached['run_id']}")
+        result = cached["result"]
+        status = "completed"
+        pred_target, pred_stance = cached["predicted_target"], cached["predicted_stance"]
+    else:
         try:
             # --- Invoke the LangGraph agent ---
             initial_state = {"input": input_text, "target": "", "max_turns": 3}
-            # NOTE: Using ainvoke for async compatibility if needed, but running synchronously here.
-            result = langgraph_app.invoke(initial_state)
+            result = await langgraph_app.ainvoke(initial_state, config={"callbacks": [usage]})
             status = "completed"
-            
+
             # --- Parse the final result ---
             final_response = result.get("final_response", "")
             pred_target, pred_stance = parse_final_response(final_response)
-            
+
         except Exception as e:
             print(f"  \n[Error] An exception occurred during agent invocation: {e}")
             result = {"error": str(e)}
             status = "failed"
             pred_target, pred_stance = "invocation_error", "invocation_error"
 
-        predicted_targets.append(pred_target)
-        predicted_stances.append(pred_stance)
-        print(f"  -> Predicted Target: {pred_target}")
-        print(f"  -> Predicted Stance: {pred_stance}")
+        if semantic_cache is not None and status == "completed" and pred_target != "parsing_error":
+            await asyncio.to_thread(semantic_cache.add, input_text, {
+                "run_id": run_id,
+                "result": result,
+                "predicted_target": pred_target,
+                "predicted_stance": pred_stance,
+            })
 
-        # --- Save the full agent run log ---
-        run_data = {
+    print(f"  -> [{position + 1}/{total}] Predicted Target: {pred_target}")
+    print(f"  -> [{position + 1}/{total}] Predicted Stance: {pred_stance}")
+    print(f"  -> [{position + 1}/{total}] Usage: {usage.summary()}")
+
+    # --- Save the full agent run log ---
+    run_data = {
+        "run_id": run_id,
+        "status": status,
+        "row_index": position,
+        "input_text": input_text,
+        "original_label": row.get('label'),
+        "original_topic": row.get('new_topic'),
+        "predicted_target": pred_target,
+        "predicted_stance": pred_stance,
+        "result": result,
+        "usage": usage.report(),
+        "timestamp": timestamp.isoformat()
+    }
+    if cached is not None:
+        run_data["cache_hit"] = {"run_id": cached["run_id"], "similarity": round(similarity, 4)}
+
+    file_path = os.path.join(AGENT_RUNS_DIR, f"{run_id}.json")
+    with open(file_path, "w") as f:
+        # Use a custom encoder to handle non-serializable types if they exist
+        json.dump(run_data, f, indent=4, default=str)
+    run_store.upsert(run_data)
+
+    if journal is not None and status == "completed":
+        journal.append(input_key(row), {
             "run_id": run_id,
-            "status": status,
-            "input_text": input_text,
-            "original_label": row.get('label'),
-            "original_topic": row.get('new_topic'),
             "predicted_target": pred_target,
             "predicted_stance": pred_stance,
-            "result": result,
-            "timestamp": timestamp.isoformat()
-        }
-        
-        file_path = os.path.join(AGENT_RUNS_DIR, f"{run_id}.json")
-        with open(file_path, "w") as f:
-            # Use a custom encoder to handle non-serializable types if they exist
-            json.dump(run_data, f, indent=4, default=str)
-
-    # Add the predictions as new columns to the processed dataframe
-    df_to_process['predicted_target'] = predicted_targets
-    df_to_process['predicted_stance'] = predicted_stances
-
-    # --- Save the updated dataframe to a new CSV file ---
+        })
+
+    return pred_target, pred_stance, usage.report()
+
+async def process_dataset(num_workers=NUM_WORKERS, output_path=OUTPUT_CSV_PATH, restart=False,
+                          input_path=INPUT_CSV_PATH, start=0, stop=NUM_ROWS_TO_PROCESS, sample=None,
+                          canonical_targets=CANONICAL_TARGETS):
+    """
+    Streams rows [start, stop) of the input file (CSV, Parquet or NDJSON), runs the
+    stance analysis agent on up to `num_workers` posts at a time, and saves the
+    results to a new file in the original row order. Rows completed by an earlier,
+    interrupted run are taken from the journal instead of being processed again.
+    Only the rows in flight are held in memory, whatever the size of the input.
+    With `canonical_targets`, the output also gets the canonical target nearest to
+    each predicted target and its similarity.
+    """
+    print(f"Starting bulk processing for {input_path}")
+    os.makedirs(AGENT_RUNS_DIR, exist_ok=True)
+    os.makedirs(DATA_DIR, exist_ok=True)
+
+    run_store = RunStore(AGENT_RUNS_DIR)
+
+    if not os.path.exists(input_path):
+        print(f"\n[Error] Input file not found at: {input_path}")
+        print("Please ensure the 'data/vast/vast_filtered_ex.csv' file exists.")
+        return
+
+    # A journal only resumes the job it was written for: same input file, same contents
+    journal_file = journal_path(output_path)
+    header = {"input": os.path.abspath(input_path), "input_sha256": file_digest(input_path)}
+    if restart and os.path.exists(journal_file):
+        os.remove(journal_file)
+    try:
+        journal = ResultsJournal(journal_file, header=header)
+    except JournalMismatchError as e:
+        print(f"\n[Error] Refusing to resume: {e}")
+        print("Pass --restart to discard it, or choose another --output.")
+        return
+
+    # Shown as "[row/total]" in the progress lines; unknown without a stop offset
+    total = stop if stop is not None else "?"
+
+    # The graph nodes are synchronous, so ainvoke runs them on the loop's default
+    # executor; size it so every worker gets a thread.
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=num_workers))
+    semaphore = asyncio.Semaphore(num_workers)
+    # (key, predicted target, predicted stance, usage) of the rows processed by this run
+    results = []
+    in_flight = set()
+
+    async def run(position, row, key):
+        try:
+            pred_target, pred_stance, usage = await process_row(position, row, total, run_store, journal)
+        except Exception as e:
+            # Saving the run log or journaling the row failed; count the row as failed
+            # (it is retried on the next run) instead of aborting the batch
+            print(f"  \n[Error] Row {position} could not be saved: {e}")
+            pred_target, pred_stance, usage = "invocation_error", "invocation_error", UsageTracker().report()
+        finally:
+            semaphore.release()
+        results.append((key, pred_target, pred_stance, usage))
+
+    print(f"\nProcessing rows {start} to {stop if stop is not None else 'end'} with {num_workers} worker(s)...")
+    start_time = time.perf_counter()
+
+    resumed = 0
+    for position, row in read_rows(input_path, start, stop, sample):
+        if input_key(row) in journal:
+            resumed += 1
+            continue
+        # Wait for a free worker before reading further, so the input is not read ahead
+        await semaphore.acquire()
+        task = asyncio.create_task(run(position, row, input_key(row)))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    await asyncio.gather(*in_flight, return_exceptions=True)
+
+    elapsed = time.perf_counter() - start_time
+    rows_per_sec = len(results) / elapsed if elapsed > 0 else 0.0
+    if resumed:
+        print(f"\nResumed: {resumed} rows were already in {journal_file}")
+
+    # Failed rows are not journaled (they are retried next time); use this run's error values
+    failed = {key: {"predicted_target": pred_target, "predicted_stance": pred_stance}
+              for key, pred_target, pred_stance, _ in results if key not in journal}
+
+    prompt_eval_seconds = sum(usage["total"]["prompt_eval_duration"] for _, _, _, usage in results) / 1e9
+    prompt_eval_tokens = sum(usage["total"]["prompt_eval_count"] for _, _, _, usage in results)
+    print(f"\nPrompt eval: {prompt_eval_tokens} tokens in {prompt_eval_seconds:.2f}s "
+          f"({prompt_eval_seconds / max(len(results), 1):.2f}s per run)")
+    partial_calls = sum(usage["total"].get("partial_calls", 0) for _, _, _, usage in results)
+    if partial_calls:
+        print(f"  {partial_calls} LLM calls ended without usage; their generation counts are estimated")
+
+    # --- Backend time per graph node ---
+    node_seconds = {}
+    for _, _, _, usage in results:
+        for node, node_usage in usage["nodes"].items():
+            seconds = (node_usage["prompt_eval_duration"] + node_usage["eval_duration"]) / 1e9
+            node_seconds[node] = node_seconds.get(node, 0.0) + seconds
+    for node, seconds in sorted(node_seconds.items(), key=lambda item: -item[1]):
+        print(f"  {node}: {seconds:.2f}s")
+    if semantic_cache is not None:
+        stats = semantic_cache.stats()
+        print(f"\nSemantic cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.1%} hit rate), {stats['entries']} entries")
+
+    # --- Write the input rows with their predictions, in input order, to the output file ---
     try:
-        df_to_process.to_csv(OUTPUT_CSV_PATH, index=False)
-        print(f"\nSuccessfully processed {len(df_to_process)} rows.")
-        print(f"Output with predictions saved to: {OUTPUT_CSV_PATH}")
+        index = get_default_index() if canonical_targets else None
+        with PredictionWriter(output_path) as writer:
+            for chunk in iter_chunks(read_rows(input_path, start, stop, sample), CANONICAL_BATCH):
+                output_rows = []
+                for _, row in chunk:
+                    # A row without a result (e.g. its task was cancelled) counts as failed
+                    record = journal.get(input_key(row)) or failed.setdefault(input_key(row), {
+                        "predicted_target": "invocation_error", "predicted_stance": "invocation_error"})
+                    output_rows.append({**row, "predicted_target": record["predicted_target"],
+                                        "predicted_stance": record["predicted_stance"]})
+                if index is not None:
+                    matches = index.nearest([row["predicted_target"] or "" for row in output_rows])
+                    for row, row_matches in zip(output_rows, matches):
+                        target, score = row_matches[0] if row_matches else ("", 0.0)
+                        row["canonical_target"] = target
+                        row["canonical_target_score"] = round(score, 4)
+                for row in output_rows:
+                    writer.write(row)
+        print(f"\nSuccessfully processed {len(results)} rows in {elapsed:.1f}s ({rows_per_sec:.2f} rows/sec).")
+        if failed:
+            print(f"[Warning] {len(failed)} row(s) failed and will be retried on the next run.")
+        print(f"Output with predictions ({writer.rows_written} rows) saved to: {output_path}")
     except Exception as e:
-        print(f"\n[Error] Failed to save output CSV file: {e}")
+        print(f"\n[Error] Failed to save output file: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the stance analysis agent over the VAST dataset.")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS,
+                        help="Number of rows processed concurrently (1 = sequential).")
+    parser.add_argument("--input", default=INPUT_CSV_PATH, help="Input CSV, Parquet or NDJSON file.")
+    parser.add_argument("--dataset", help="Dataset store split as NAME/SPLIT (e.g. vast_explicit/test); overrides --input.")
+    parser.add_argument("--output", default=OUTPUT_CSV_PATH,
+                        help="Output file; a .parquet or .jsonl extension selects the format (CSV otherwise).")
+    parser.add_argument("--start", type=int, default=0, help="First row to process.")
+    parser.add_argument("--stop", type=int, default=NUM_ROWS_TO_PROCESS,
+                        help="Row to stop before; 0 or less processes the whole file.")
+    parser.add_argument("--sample", type=float, help="Process a random fraction of the rows (e.g. 0.1).")
+    parser.add_argument("--restart", action="store_true",
+                        help="Discard the results journal and process every row again.")
+    parser.add_argument("--canonical-targets", action="store_true", default=CANONICAL_TARGETS,
+                        help="Add the nearest known ground-truth target of each prediction (CANONICAL_TARGETS=1).")
+    args = parser.parse_args()
+    if args.dataset:
+        # pyarrow is only needed for the dataset store
+        from langgraph_stance_analyzer.dataset_store import DatasetStore
+
+        args.input = DatasetStore().path(*args.dataset.split("/", 1))
+
     # Using asyncio.run() to execute the async function
-    asyncio.run(process_dataset())
+    asyncio.run(process_dataset(
+        num_workers=max(1, args.workers),
+        output_path=args.output,
+        restart=args.restart,
+        input_path=args.input,
+        start=args.start,
+        stop=args.stop if args.stop > 0 else None,
+        sample=args.sample,
+        canonical_targets=args.canonical_targets,
+    ))
\ No newline at end of file
@@ -1,18 +1,34 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 import uuid
 import json
 from datetime import datetime
 import os
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
 
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from langgraph_stance_analyzer.main import app as langgraph_app
+from langgraph_stance_analyzer.usage import UsageTracker
+from langgraph_stance_analyzer.semantic_cache import get_default_semantic_cache
+from fastapi_app.metrics import observe_run, register_semantic_cache, render_metrics
+from fastapi_app.run_events import RunEvents
+from fastapi_app.run_store import RunStore
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    run_executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "*", 
@@ -29,6 +45,42 @@ app.add_middleware(
 AGENT_RUNS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "agent_runs"))
 os.makedirs(AGENT_RUNS_DIR, exist_ok=True)
 
+# Summary index over the run files, kept up to date by save_run
+run_store = RunStore(AGENT_RUNS_DIR)
+run_store.sync_from_dir()
+
+# Number of graph runs executed at the same time; further runs wait in the queue
+MAX_CONCURRENT_RUNS = int(os.environ.get("MAX_CONCURRENT_RUNS", 4))
+run_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_RUNS, thread_name_prefix="agent-run")
+
+# Queued and running jobs; finished runs are only kept on disk
+active_runs: dict[str, dict] = {}
+active_runs_lock = threading.Lock()
+# Live node/token events of queued and running jobs, for /agent_runs/{run_id}/events
+run_events: dict[str, RunEvents] = {}
+
+# Results reused for near-duplicate inputs (SEMANTIC_CACHE=1); None when disabled
+semantic_cache = get_default_semantic_cache()
+if semantic_cache is not None:
+    register_semantic_cache(semantic_cache)
+
+def fail_interrupted_runs():
+    """
+    Marks runs left queued or running by a previous server process as failed; their
+    jobs died with it. Assumes one API process owns agent_runs/.
+    """
+    for run_id in run_store.run_ids_with_status("queued", "running"):
+        file_path = os.path.join(AGENT_RUNS_DIR, f"{run_id}.json")
+        try:
+            with open(file_path, "r") as f:
+                run_data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[Warning] Could not reconcile interrupted run {run_id}: {e}")
+            continue
+        run_data["status"] = "failed"
+        run_data["result"] = {"error": "Interrupted by a server restart before it finished"}
+        save_run(run_data)
+
 class RunAgentRequest(BaseModel):
     text: str
 
@@ -38,52 +90,203 @@ class AgentRunResponse(BaseModel):
     input_text: str
     result: dict | None = None
     timestamp: datetime
+    predicted_target: str | None = None
+    predicted_stance: str | None = None
+    usage: dict | None = None
+    # {"run_id": ..., "similarity": ...} of the earlier run whose result was reused
+    cache_hit: dict | None = None
 
-@app.post("/run_agent", response_model=AgentRunResponse)
-async def run_agent(request: RunAgentRequest):
-    run_id = str(uuid.uuid4())
-    timestamp = datetime.now()
-    input_text = request.text
+class AgentRunPage(BaseModel):
+    runs: list[AgentRunResponse]
+    next_cursor: str | None = None
 
+def save_run(run_data: dict):
+    file_path = os.path.join(AGENT_RUNS_DIR, f"{run_data['run_id']}.json")
+    with open(file_path, "w") as f:
+        json.dump(run_data, f, indent=4, default=str)
+    run_store.upsert(run_data)
+
+fail_interrupted_runs()
+
+def execute_run(run_id: str):
+    """Streams the graph for a queued job, publishing its events and status transitions."""
+    with active_runs_lock:
+        run_data = active_runs[run_id]
+        run_data["status"] = "running"
+        events = run_events[run_id]
+    events.publish({"event": "status", "status": "running"})
+
+    cached, similarity = None, 0.0
+    if semantic_cache is not None:
+        cached, similarity = semantic_cache.lookup(run_data["input_text"])
+    if cached is not None:
+        finish_run(run_id, run_data, events, "completed", cached["result"], UsageTracker().report(),
+                   cache_hit={"run_id": cached["run_id"], "similarity": round(similarity, 4)})
+        return
+
+    usage = UsageTracker()
+    started = time.perf_counter()
     try:
-        initial_state = {"input": input_text, "target": "", "max_turns": 3}
-        result = langgraph_app.invoke(initial_state)
+        initial_state = {"input": run_data["input_text"], "target": "", "max_turns": 3}
+        result = None
+        for mode, chunk in langgraph_app.stream(
+            initial_state, config={"callbacks": [usage]}, stream_mode=["tasks", "custom", "values"]
+        ):
+            if mode == "custom":
+                events.publish(chunk)
+            elif mode == "tasks":
+                # Task start payloads carry "input", task results carry "result"
+                if "result" in chunk:
+                    events.publish({"event": "node_end", "node": chunk["name"]})
+                else:
+                    events.publish({"event": "node_start", "node": chunk["name"]})
+            else:
+                result = chunk
         status = "completed"
     except Exception as e:
         result = {"error": str(e)}
         status = "failed"
+    observe_run(usage, status, time.perf_counter() - started, result)
+    if semantic_cache is not None and status == "completed" and result and result.get("final_response"):
+        semantic_cache.add(run_data["input_text"], {"run_id": run_id, "result": result})
+    finish_run(run_id, run_data, events, status, result, usage.report())
+
+def finish_run(run_id: str, run_data: dict, events: RunEvents, status: str, result: dict | None,
+               usage: dict, cache_hit: dict | None = None):
+    """Records the outcome of a job, saves it and closes its event stream."""
+    with active_runs_lock:
+        run_data["result"] = result
+        run_data["status"] = status
+        run_data["usage"] = usage
+        if cache_hit is not None:
+            run_data["cache_hit"] = cache_hit
+    # Persist before dropping the in-memory entry so pollers never see a 404
+    save_run(run_data)
+    events.publish({"event": "final", "status": status, "result": result}, close=True)
+    with active_runs_lock:
+        active_runs.pop(run_id, None)
+        run_events.pop(run_id, None)
+
+@app.post("/run_agent", response_model=AgentRunResponse, status_code=202)
+async def run_agent(request: RunAgentRequest, wait: bool = False):
+    """
+    Queues an agent run and returns immediately with its run_id and "queued" status.
+    Poll GET /agent_runs/{run_id} for progress, or pass ?wait=true to block until it finishes.
+    """
+    run_id = str(uuid.uuid4())
+    timestamp = datetime.now()
 
     run_data = {
         "run_id": run_id,
-        "status": status,
-        "input_text": input_text,
-        "result": result,
+        "status": "queued",
+        "input_text": request.text,
+        "result": None,
         "timestamp": timestamp.isoformat()
     }
+    with active_runs_lock:
+        active_runs[run_id] = run_data
+        run_events[run_id] = RunEvents()
+    # The JSON write and index upsert are blocking I/O; keep them off the event loop
+    await asyncio.to_thread(save_run, run_data)
+    future = run_executor.submit(execute_run, run_id)
+
+    if wait:
+        await asyncio.wrap_future(future)
+        return AgentRunResponse(**await asyncio.to_thread(load_run, run_id))
+    return AgentRunResponse(**run_data)
+
+def load_run(run_id: str) -> dict | None:
+    with active_runs_lock:
+        if run_id in active_runs:
+            return dict(active_runs[run_id])
 
     file_path = os.path.join(AGENT_RUNS_DIR, f"{run_id}.json")
-    with open(file_path, "w") as f:
-        json.dump(run_data, f, indent=4)
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "r") as f:
+        return json.load(f)
 
-    return AgentRunResponse(run_id=run_id, status=status, input_text=input_text, result=result, timestamp=timestamp)
+@app.get("/agent_runs", response_model=AgentRunPage)
+def get_all_agent_runs(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = None,
+    status: str | None = None,
+    predicted_stance: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    summary: bool = False,
+):
+    """
+    Returns one page of runs, newest first. Pass the returned next_cursor to get the
+    following page. With summary=true the full result blobs are left out.
+    A plain def, so FastAPI runs the index query and file reads in its threadpool.
+    """
+    try:
+        page, next_cursor = run_store.list_runs(
+            limit=limit,
+            cursor=cursor,
+            status=status,
+            predicted_stance=predicted_stance,
+            since=since.isoformat() if since else None,
+            until=until.isoformat() if until else None,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-@app.get("/agent_runs", response_model=list[AgentRunResponse])
-async def get_all_agent_runs():
     runs = []
-    for filename in os.listdir(AGENT_RUNS_DIR):
-        if filename.endswith(".json"):
-            file_path = os.path.join(AGENT_RUNS_DIR, filename)
-            with open(file_path, "r") as f:
-                run_data = json.load(f)
-                runs.append(AgentRunResponse(**run_data))
-    return runs
+    for run_summary in page:
+        if summary:
+            runs.append(AgentRunResponse(**run_summary))
+            continue
+        run_data = load_run(run_summary["run_id"])
+        if run_data is not None:
+            runs.append(AgentRunResponse(**{**run_summary, **run_data}))
+    return AgentRunPage(runs=runs, next_cursor=next_cursor)
 
 @app.get("/agent_runs/{run_id}", response_model=AgentRunResponse)
-async def get_agent_run(run_id: str):
-    file_path = os.path.join(AGENT_RUNS_DIR, f"{run_id}.json")
-    if not os.path.exists(file_path):
+def get_agent_run(run_id: str):
+    run_data = load_run(run_id)
+    if run_data is None:
         raise HTTPException(status_code=404, detail="Agent run not found")
-    
-    with open(file_path, "r") as f:
-        run_data = json.load(f)
     return AgentRunResponse(**run_data)
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@app.get("/agent_runs/{run_id}/events")
+async def stream_agent_run(run_id: str):
+    """
+    Server-Sent Events stream of a run: status, node_start, token, node_end and a
+    closing final event. Finished runs only emit the final event.
+    """
+    with active_runs_lock:
+        events = run_events.get(run_id)
+
+    if events is None:
+        run_data = await asyncio.to_thread(load_run, run_id)
+        if run_data is None:
+            raise HTTPException(status_code=404, detail="Agent run not found")
+
+        async def finished():
+            yield format_sse({"event": "final", "status": run_data["status"], "result": run_data["result"]})
+        return StreamingResponse(finished(), media_type="text/event-stream")
+
+    queue = events.subscribe()
+
+    async def live():
+        try:
+            while True:
+                event = await queue.get()
+                yield format_sse(event)
+                if event["event"] == "final":
+                    break
+        finally:
+            events.unsubscribe(queue)
+
+    return StreamingResponse(live(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-node LLM latency, tokens and tokens/sec, plus per-run totals."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
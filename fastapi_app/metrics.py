@@ -0,0 +1,85 @@
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+RUN_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320, 640)
+TOKENS_PER_SECOND_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 120, 160, 240)
+
+LLM_CALL_SECONDS = Histogram(
+    "stance_llm_call_seconds", "Wall-clock latency of one LLM call", ["node"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "stance_llm_tokens_per_second", "Generation speed of one LLM call", ["node"], buckets=TOKENS_PER_SECOND_BUCKETS
+)
+LLM_TOKENS = Counter("stance_llm_tokens", "Tokens processed by the LLM", ["node", "kind"])
+LLM_GPU_SECONDS = Counter(
+    "stance_llm_gpu_seconds", "Backend time spent on prompt eval, generation and model loads", ["node", "phase"]
+)
+LLM_PARTIAL_CALLS = Counter(
+    "stance_llm_partial_calls", "LLM calls that ended without Ollama's usage (cancelled or closed early)", ["node"]
+)
+LLM_CACHE_HITS = Counter("stance_llm_cache_hits", "LLM calls served from the response cache", ["node"])
+
+RUNS = Counter("stance_runs", "Finished agent runs", ["status"])
+RUN_SECONDS = Histogram("stance_run_seconds", "Wall-clock duration of an agent run", ["status"], buckets=RUN_BUCKETS)
+RUN_LLM_CALLS = Histogram("stance_run_llm_calls", "LLM calls per agent run", buckets=(1, 3, 5, 7, 9, 11, 15, 20, 30))
+DEBATE_TURNS = Histogram("stance_debate_turns", "Debate turns per agent run", buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10))
+
+
+def observe_run(usage, status: str, seconds: float, result: dict | None = None):
+    """Records a finished run and every LLM call captured by its UsageTracker."""
+    for call in list(usage.calls):
+        node = call["node"] or "unknown"
+        if call.get("cached"):
+            # No backend work was done; keep hits out of the latency and token figures
+            LLM_CACHE_HITS.labels(node).inc()
+            continue
+        if call["latency"]:
+            LLM_CALL_SECONDS.labels(node).observe(call["latency"])
+        if call.get("partial"):
+            # Only the streamed chunks were counted; keep them out of the backend figures
+            LLM_PARTIAL_CALLS.labels(node).inc()
+            LLM_TOKENS.labels(node, "eval_estimated").inc(call["eval_count"])
+            continue
+        if call["eval_duration"]:
+            LLM_TOKENS_PER_SECOND.labels(node).observe(call["eval_count"] / (call["eval_duration"] / 1e9))
+        LLM_TOKENS.labels(node, "prompt").inc(call["prompt_eval_count"])
+        LLM_TOKENS.labels(node, "eval").inc(call["eval_count"])
+        LLM_GPU_SECONDS.labels(node, "prompt_eval").inc(call["prompt_eval_duration"] / 1e9)
+        LLM_GPU_SECONDS.labels(node, "eval").inc(call["eval_duration"] / 1e9)
+        LLM_GPU_SECONDS.labels(node, "load").inc(call["load_duration"] / 1e9)
+
+    RUNS.labels(status).inc()
+    RUN_SECONDS.labels(status).observe(seconds)
+    RUN_LLM_CALLS.observe(len(usage.calls))
+    if result and "debate_history" in result:
+        DEBATE_TURNS.observe(len(result["debate_history"] or []))
+
+
+class SemanticCacheCollector:
+    """Exports the semantic cache's own counters at scrape time."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def collect(self):
+        stats = self.cache.stats()
+        lookups = CounterMetricFamily("stance_semantic_cache_lookups", "Semantic cache lookups", labels=["outcome"])
+        lookups.add_metric(["hit"], stats["hits"])
+        lookups.add_metric(["miss"], stats["misses"])
+        yield lookups
+        evictions = CounterMetricFamily("stance_semantic_cache_evictions", "Semantic cache evictions", labels=["reason"])
+        for reason, count in stats["evictions"].items():
+            evictions.add_metric([reason], count)
+        yield evictions
+        yield GaugeMetricFamily("stance_semantic_cache_entries", "Live semantic cache entries", value=stats["entries"])
+        yield GaugeMetricFamily("stance_semantic_cache_hit_ratio", "Semantic cache hits per lookup", value=stats["hit_rate"])
+
+
+def register_semantic_cache(cache):
+    REGISTRY.register(SemanticCacheCollector(cache))
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Returns the exposition body and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+
+class RunEvents:
+    """
+    Event log for one in-flight agent run.
+
+    The worker thread publishes events; each subscriber gets its own asyncio.Queue
+    that first replays everything published so far, so late subscribers miss nothing.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def publish(self, event: dict, close: bool = False):
+        with self._lock:
+            self.events.append(event)
+            self.closed = self.closed or close
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Must be called from the subscriber's event loop."""
+        queue = asyncio.Queue()
+        with self._lock:
+            for event in self.events:
+                queue.put_nowait(event)
+            if not self.closed:
+                self._subscribers.append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers = [(loop, q) for loop, q in self._subscribers if q is not queue]
@@ -0,0 +1,155 @@
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+
+STANCE_PATTERN = re.compile(r"<stance>\s*(.*?)\s*</stance>", re.DOTALL)
+TARGET_PATTERN = re.compile(r"<target>\s*(.*?)\s*</target>", re.DOTALL)
+
+
+def summarize_run(run_data: dict) -> dict:
+    """Extracts the indexed summary fields from a full run record."""
+    predicted_target = run_data.get("predicted_target")
+    predicted_stance = run_data.get("predicted_stance")
+
+    # API runs only carry the final agent's XML; pull target and stance out of it
+    result = run_data.get("result") or {}
+    final_response = result.get("final_response") if isinstance(result, dict) else None
+    if final_response and predicted_target is None:
+        match = TARGET_PATTERN.search(final_response)
+        predicted_target = match.group(1) if match else None
+    if final_response and predicted_stance is None:
+        match = STANCE_PATTERN.search(final_response)
+        predicted_stance = match.group(1) if match else None
+
+    return {
+        "run_id": run_data["run_id"],
+        "status": run_data.get("status"),
+        "input_text": run_data.get("input_text"),
+        "timestamp": str(run_data.get("timestamp")),
+        "predicted_target": predicted_target,
+        "predicted_stance": predicted_stance.upper() if predicted_stance else None,
+    }
+
+
+def encode_cursor(timestamp: str, run_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp}|{run_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    timestamp, run_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    return timestamp, run_id
+
+
+class RunStore:
+    """
+    SQLite summary index over the run JSON files in agent_runs/.
+
+    Every writer calls `upsert` after saving a run file, so listing a page is an
+    indexed range query instead of loading every file.
+    """
+
+    def __init__(self, runs_dir: str, db_path: str | None = None):
+        self.runs_dir = runs_dir
+        self.db_path = db_path or os.path.join(runs_dir, "index.sqlite")
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                status TEXT,
+                input_text TEXT,
+                timestamp TEXT,
+                predicted_target TEXT,
+                predicted_stance TEXT
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON runs(timestamp, run_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_status ON runs(status, timestamp, run_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_stance ON runs(predicted_stance, timestamp, run_id)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, run_data: dict):
+        summary = summarize_run(run_data)
+        conn = self._conn()
+        conn.execute(
+            """INSERT OR REPLACE INTO runs
+               VALUES (:run_id, :status, :input_text, :timestamp, :predicted_target, :predicted_stance)""",
+            summary,
+        )
+        conn.commit()
+
+    def sync_from_dir(self) -> int:
+        """Indexes run files written before the index existed. Returns how many were added."""
+        known = {row[0] for row in self._conn().execute("SELECT run_id FROM runs")}
+        added = 0
+        for filename in os.listdir(self.runs_dir):
+            if not filename.endswith(".json") or filename[:-5] in known:
+                continue
+            try:
+                with open(os.path.join(self.runs_dir, filename), "r") as f:
+                    self.upsert(json.load(f))
+                added += 1
+            except (json.JSONDecodeError, KeyError, OSError) as e:
+                print(f"[Warning] Could not index run file {filename}: {e}")
+        return added
+
+    def run_ids_with_status(self, *statuses: str) -> list[str]:
+        placeholders = ", ".join("?" for _ in statuses)
+        rows = self._conn().execute(f"SELECT run_id FROM runs WHERE status IN ({placeholders})", statuses)
+        return [row[0] for row in rows]
+
+    def list_runs(
+        self,
+        limit: int = 50,
+        cursor: str | None = None,
+        status: str | None = None,
+        predicted_stance: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+    ) -> tuple[list[dict], str | None]:
+        """
+        Returns one page of run summaries, newest first, and the cursor of the next
+        page (None on the last page).
+        """
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if predicted_stance:
+            clauses.append("predicted_stance = ?")
+            params.append(predicted_stance.upper())
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if cursor:
+            # Keyset pagination: resume strictly after the last row of the previous page
+            clauses.append("(timestamp, run_id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn().execute(
+            f"SELECT * FROM runs {where} ORDER BY timestamp DESC, run_id DESC LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+
+        page = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(page[-1]["timestamp"], page[-1]["run_id"])
+        return page, next_cursor
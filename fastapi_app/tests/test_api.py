@@ -0,0 +1,54 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_app import main
+from fastapi_app.run_store import RunStore
+
+
+def on_event_loop():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "AGENT_RUNS_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "run_store", RunStore(str(tmp_path)))
+    monkeypatch.setattr(main, "run_executor", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(main, "execute_run", lambda run_id: None)
+    disk_io = []
+
+    def record(function):
+        def wrapper(*args):
+            disk_io.append((function.__name__, on_event_loop()))
+            return function(*args)
+        return wrapper
+
+    monkeypatch.setattr(main, "save_run", record(main.save_run))
+    monkeypatch.setattr(main, "load_run", record(main.load_run))
+    return disk_io
+
+
+def test_run_files_are_read_and_written_off_the_event_loop(api):
+    with TestClient(main.app) as client:
+        run_id = client.post("/run_agent", json={"text": "post"}).json()["run_id"]
+        with main.active_runs_lock:
+            main.active_runs.pop(run_id)
+            main.run_events.pop(run_id)
+        assert client.get(f"/agent_runs/{run_id}").json()["status"] == "queued"
+        assert [run["run_id"] for run in client.get("/agent_runs").json()["runs"]] == [run_id]
+
+    assert {name for name, _ in api} == {"save_run", "load_run"}
+    assert not any(blocking for _, blocking in api)
+
+
+def test_shutdown_stops_the_run_executor(api):
+    with TestClient(main.app):
+        pass
+    assert main.run_executor._shutdown
@@ -0,0 +1,37 @@
+import asyncio
+import csv
+
+from fastapi_app import bulk_process
+from langgraph_stance_analyzer.usage import UsageTracker
+
+
+def write_input(path, posts):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["post", "new_topic", "label"])
+        writer.writeheader()
+        for post in posts:
+            writer.writerow({"post": post, "new_topic": "topic", "label": "0"})
+
+
+def test_row_that_fails_to_save_does_not_abort_the_batch(tmp_path, monkeypatch):
+    input_path, output_path = tmp_path / "in.csv", tmp_path / "out.csv"
+    write_input(input_path, ["first", "second", "third"])
+    monkeypatch.setattr(bulk_process, "AGENT_RUNS_DIR", str(tmp_path / "runs"))
+    monkeypatch.setattr(bulk_process, "DATA_DIR", str(tmp_path))
+
+    async def process_row(position, row, total, run_store, journal=None):
+        if row["post"] == "second":
+            raise OSError("disk full")
+        await asyncio.sleep(0)
+        return f"target {position}", "FAVOR", UsageTracker().report()
+
+    monkeypatch.setattr(bulk_process, "process_row", process_row)
+    asyncio.run(bulk_process.process_dataset(
+        num_workers=2, output_path=str(output_path), input_path=str(input_path), stop=None,
+        canonical_targets=False,
+    ))
+
+    with open(output_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["predicted_target"] for row in rows] == ["target 0", "invocation_error", "target 2"]
+    assert [row["predicted_stance"] for row in rows] == ["FAVOR", "invocation_error", "FAVOR"]
@@ -0,0 +1,20 @@
+from prometheus_client import REGISTRY
+
+from fastapi_app import metrics
+from langgraph_stance_analyzer.usage import UsageTracker, usage_from_chunk
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_cache_hits_are_counted_but_kept_out_of_backend_figures():
+    hits = sample("stance_llm_cache_hits_total", node="metrics_test")
+    latency_count = sample("stance_llm_call_seconds_count", node="metrics_test")
+    usage = UsageTracker()
+    usage.record(usage_from_chunk({}), node="metrics_test", latency=0.001, cached=True)
+
+    metrics.observe_run(usage, "completed", 1.0)
+
+    assert sample("stance_llm_cache_hits_total", node="metrics_test") == hits + 1
+    assert sample("stance_llm_call_seconds_count", node="metrics_test") == latency_count
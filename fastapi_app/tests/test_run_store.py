@@ -0,0 +1,61 @@
+from fastapi_app.run_store import RunStore, decode_cursor, encode_cursor, summarize_run
+
+
+def make_run(index, status="completed", stance="FAVOR"):
+    return {
+        "run_id": f"run-{index:03d}",
+        "status": status,
+        "input_text": f"post {index}",
+        "timestamp": f"2024-01-01T00:00:{index % 60:02d}",
+        "result": {"final_response": f"<response><target>t{index}</target><stance>{stance.lower()}</stance></response>"},
+    }
+
+
+def test_summary_parses_target_and_stance_from_final_response():
+    summary = summarize_run(make_run(1, stance="AGAINST"))
+    assert summary["predicted_target"] == "t1"
+    assert summary["predicted_stance"] == "AGAINST"
+    assert summarize_run({"run_id": "q", "status": "queued", "result": None})["predicted_stance"] is None
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("2024-01-01T00:00:00", "a|b")) == ("2024-01-01T00:00:00", "a|b")
+
+
+def test_keyset_pagination_visits_every_run_once_newest_first(tmp_path):
+    store = RunStore(str(tmp_path))
+    # Pairs of runs share a timestamp, so the run_id tie-break matters
+    for index in range(25):
+        run = make_run(index)
+        run["timestamp"] = f"2024-01-01T00:00:{index // 2:02d}"
+        store.upsert(run)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.list_runs(limit=7, cursor=cursor)
+        seen.extend(run["run_id"] for run in page)
+        if cursor is None:
+            break
+    assert seen == [f"run-{index:03d}" for index in reversed(range(25))]
+
+
+def test_filters_and_status_lookup(tmp_path):
+    store = RunStore(str(tmp_path))
+    store.upsert(make_run(1, stance="FAVOR"))
+    store.upsert(make_run(2, stance="AGAINST"))
+    store.upsert(make_run(3, status="queued"))
+    store.upsert(make_run(4, status="running"))
+
+    page, cursor = store.list_runs(predicted_stance="against")
+    assert [run["run_id"] for run in page] == ["run-002"] and cursor is None
+    page, _ = store.list_runs(status="completed", since="2024-01-01T00:00:02")
+    assert [run["run_id"] for run in page] == ["run-002"]
+    assert sorted(store.run_ids_with_status("queued", "running")) == ["run-003", "run-004"]
+
+
+def test_upsert_replaces_a_run(tmp_path):
+    store = RunStore(str(tmp_path))
+    store.upsert(make_run(1, status="queued"))
+    store.upsert(make_run(1))
+    page, _ = store.list_runs()
+    assert [(run["run_id"], run["status"]) for run in page] == [("run-001", "completed")]
@@ -0,0 +1,175 @@
+"""
+Declarative ingestion of raw stance datasets into the raw_{split}_all_onecol.csv files.
+
+Each source in SOURCES says where its raw files are, which columns hold the tweet,
+target and stance, how to map raw labels, and how to split. Inputs are read in
+chunks; labels are mapped with vectorized lookups and rows are assigned to
+train/val/test by a hash of their tweet and target, so the split is deterministic,
+independent of row order and chunk size, and stable when new rows are added.
+Adding a source is a new SOURCES entry.
+
+The committed wtwt raw_*_all_onecol.csv files, which merge_datasets.py reads, were
+drawn with random.seed(1). Rerunning the wtwt ingestion puts different rows in
+train/val/test, in the same 10:2:3 proportion; rebuild the merged datasets with it.
+
+Usage:
+    python ingest.py wtwt pstance
+    python ingest.py --all
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+DATASETS_DIR = Path(__file__).resolve().parent / "data_new" / "Zero_Stance-Chat_GPT" / "Originial datasets"
+CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", 100_000))
+OUTPUT_COLUMNS = ['Tweet', 'Target 1', 'Stance 1']
+SPLITS = ['train', 'val', 'test']
+
+# A source is:
+#   dir:        directory under DATASETS_DIR holding the raw files and the outputs
+#   inputs:     a list of files to split with `split`, or {split: [files]} for data
+#               that comes already split
+#   columns:    {'tweet' | 'target' | 'stance': raw column name}
+#   target_map: optional {raw target: target}; rows with unmapped targets are dropped
+#   stance_map: optional {raw stance: stance}; rows with unmapped stances are dropped
+#   split:      {split: weight}; each row goes to a split by a hash of tweet + target
+SOURCES = {
+    'wtwt': {
+        'dir': 'wtwt',
+        'inputs': ['wtwt_dataset.csv'],
+        'columns': {'tweet': 'text', 'target': 'merger', 'stance': 'stance'},
+        'target_map': {
+            'CVS_AET': 'The merge of Company CVS Health and Company Aetna',
+            'CI_ESRX': 'The merge of Company Cigna and Company Express Scripts',
+            'ANTM_CI': 'The merge of Company Anthem and Company Cigna',
+            'AET_HUM': 'The merge of Company Aetna and Company Humana',
+            'FOXA_DIS': 'The merge of Company Disney and Company 21st Century Fox',
+        },
+        'stance_map': {
+            'support': 'FAVOR',
+            'refute': 'AGAINST',
+            'unrelated': 'NONE',
+        },
+        # train:val:test = 10:2:3, by hash rather than the original random.seed(1) draw
+        'split': {'train': 10, 'val': 2, 'test': 3},
+    },
+    'pstance': {
+        'dir': 'pstance',
+        # P-Stance ships per-candidate splits; the onecol files concatenate them
+        'inputs': {
+            split: [f'raw_{split}_{candidate}.csv' for candidate in ['trump', 'biden', 'bernie']]
+            for split in SPLITS
+        },
+        'columns': {'tweet': 'Tweet', 'target': 'Target', 'stance': 'Stance'},
+    },
+}
+
+
+def read_frames(path, chunk_size=CHUNK_SIZE, columns=None):
+    """Yields DataFrames of at most chunk_size rows from a CSV, Parquet or NDJSON file."""
+    path = str(path)
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    elif path.endswith(('.jsonl', '.ndjson')):
+        with pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False) as reader:
+            for frame in reader:
+                yield frame[columns] if columns else frame
+    else:
+        with pd.read_csv(path, chunksize=chunk_size, usecols=columns) as reader:
+            yield from reader
+
+
+def map_chunk(frame, source):
+    """Standard tweet/target/stance frame of a raw chunk, with the source's label maps applied."""
+    columns = source['columns']
+    mapped = pd.DataFrame({column: frame[columns[column]] for column in ['tweet', 'target', 'stance']})
+    for column, mapping in (('target', source.get('target_map')), ('stance', source.get('stance_map'))):
+        if mapping:
+            mapped[column] = mapped[column].map(mapping)
+    return mapped.dropna(subset=['tweet', 'target', 'stance'])
+
+
+def assign_splits(frame, weights):
+    """Split name per row, drawn by a hash of tweet + target in proportion to `weights`."""
+    names = list(weights)
+    bounds = np.cumsum([weights[name] for name in names])
+    hashes = pd.util.hash_pandas_object(frame[['tweet', 'target']], index=False).to_numpy()
+    return np.asarray(names)[np.searchsorted(bounds, hashes % np.uint64(bounds[-1]), side='right')]
+
+
+class SplitWriter:
+    """Appends chunks to raw_{split}_all_onecol.csv files, replacing each one only when closed."""
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.counts = {}
+
+    def _tmp_path(self, split):
+        return self.output_dir / f'raw_{split}_all_onecol.csv.tmp'
+
+    def write(self, split, frame):
+        if frame.empty:
+            return
+        first = split not in self.counts
+        frame.set_axis(OUTPUT_COLUMNS, axis=1).to_csv(self._tmp_path(split), mode='w' if first else 'a', header=first, index=False)
+        self.counts[split] = self.counts.get(split, 0) + len(frame)
+
+    def close(self):
+        for split in self.counts:
+            os.replace(self._tmp_path(split), self.output_dir / f'raw_{split}_all_onecol.csv')
+
+
+def ingest(name, base_dir=DATASETS_DIR, chunk_size=CHUNK_SIZE):
+    """Builds the onecol split files of SOURCES[name]; returns the row count per split."""
+    source = SOURCES[name]
+    source_dir = Path(base_dir) / source['dir']
+    inputs = source['inputs']
+    # Pre-split sources map each split to its files; the others are split by hash
+    jobs = inputs.items() if isinstance(inputs, dict) else [(None, inputs)]
+    raw_columns = list(dict.fromkeys(source['columns'].values()))
+
+    start_time = time.perf_counter()
+    writer = SplitWriter(source_dir)
+    seen = kept = 0
+    for split, files in jobs:
+        for file_name in files:
+            for frame in read_frames(source_dir / file_name, chunk_size, raw_columns):
+                seen += len(frame)
+                mapped = map_chunk(frame, source)
+                kept += len(mapped)
+                if split is not None:
+                    writer.write(split, mapped)
+                    continue
+                splits = assign_splits(mapped, source['split'])
+                for split_name in source['split']:
+                    writer.write(split_name, mapped[splits == split_name])
+    writer.close()
+
+    print(f"{name}: {kept} of {seen} rows kept in {time.perf_counter() - start_time:.1f}s")
+    for split, count in writer.counts.items():
+        print(f"  {source_dir / f'raw_{split}_all_onecol.csv'}: {count} rows")
+    return writer.counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build raw_*_all_onecol.csv files from raw stance datasets.")
+    parser.add_argument("sources", nargs="*", help=f"Sources to ingest: {', '.join(SOURCES)}.")
+    parser.add_argument("--all", action="store_true", help="Ingest every configured source.")
+    parser.add_argument("--base-dir", type=Path, default=DATASETS_DIR, help="Directory holding the source directories.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    unknown = [name for name in args.sources if name not in SOURCES]
+    if unknown or not (args.sources or args.all):
+        parser.error(f"choose sources from {', '.join(SOURCES)} or pass --all (unknown: {', '.join(unknown) or '-'})")
+
+    for name in (list(SOURCES) if args.all else args.sources):
+        ingest(name, args.base_dir, args.chunk_size)
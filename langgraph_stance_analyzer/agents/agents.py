@@ -1,66 +1,112 @@
 from langchain_core.prompts import ChatPromptTemplate
 import os
+import re
+
+from langgraph_stance_analyzer.llm_cache import CachedLLM, get_default_cache
+from langgraph_stance_analyzer.micro_batch import batched
+from langgraph_stance_analyzer.structured_output import bind_llm, prompt_suffix
 
 PROMPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'prompts'))
 
-def create_agent(llm, prompt_path):
+PLACEHOLDER = re.compile(r"(?<!{){[a-z_]+}(?!})")
+
+
+def split_prompt(text):
+    """
+    Splits a prompt file into its static instructions and the sections that hold
+    template variables. A variable section starts at the `**Header:**` line above
+    its first variable and ends at its last variable; everything else is static.
+    Returns (static, dynamic); dynamic is None when the prompt has no variables.
+    """
+    lines = text.split("\n")
+    variable_lines = [i for i, line in enumerate(lines) if PLACEHOLDER.search(line)]
+    if not variable_lines:
+        return text, None
+    start, end = variable_lines[0], variable_lines[-1] + 1
+    while start > 0 and not lines[start].startswith("**"):
+        start -= 1
+    static = "\n".join(lines[:start]).rstrip("\n")
+    trailing = "\n".join(lines[end:]).strip("\n")
+    if trailing:
+        static += "\n\n" + trailing
+    return static, "\n".join(lines[start:end])
+
+
+def create_agent(llm, prompt_path, name=None):
     """
     Creates a LangChain agent from a prompt file.
+    The prompt's static instructions (and the structured-output schema) form the
+    system message, so every call to the agent starts with the same bytes and the
+    backend can reuse the evaluated prefix; the sections holding variables follow
+    in the human message, or just `{input}` when the prompt has none.
+    Responses are served from the persistent LLM cache when it is enabled.
+    With structured output on, `name` selects the agent's JSON schema.
+    With MICRO_BATCH on, concurrent calls to the agent are sent to the backend in batches.
     """
     with open(prompt_path, 'r') as f:
-        system_prompt = f.read()
-    
+        system_prompt, human_prompt = split_prompt(f.read())
+    # Escape the schema's braces so the template does not read them as variables
+    system_prompt += prompt_suffix(name).replace("{", "{{").replace("}", "}}")
+
     prompt = ChatPromptTemplate.from_messages(
         [
             ("system", system_prompt),
-            ("human", "{input}"),
+            ("human", human_prompt or "{input}"),
         ]
     )
-    return prompt | llm
+    return prompt | CachedLLM(batched(bind_llm(llm, name)), get_default_cache())
 
 def linguistic_agent(llm):
     """
     Returns the linguistic analysis agent.
     """
-    return create_agent(llm, os.path.join(PROMPTS_DIR, "linguistic_agent.md"))
+    return create_agent(llm, os.path.join(PROMPTS_DIR, "linguistic_agent.md"), "linguistic")
 
 
 def implicit_target_agent(llm):
     """
     Returns the implicit target identification agent.
     """
-    return create_agent(llm, os.path.join(PROMPTS_DIR, "implicit_target_agent.md"))
+    return create_agent(llm, os.path.join(PROMPTS_DIR, "implicit_target_agent.md"), "implicit_target")
 
 
 def explicit_target_agent(llm):
     """
     Returns the explicit target identification agent.
     """
-    return create_agent(llm, os.path.join(PROMPTS_DIR, "explicit_target_agent.md"))
+    return create_agent(llm, os.path.join(PROMPTS_DIR, "explicit_target_agent.md"), "explicit_target")
 
 
 def target_decider_agent(llm):
     """
     Returns the target decider agent.
     """
-    return create_agent(llm, os.path.join(PROMPTS_DIR, "target_decider_agent.md"))
+    return create_agent(llm, os.path.join(PROMPTS_DIR, "target_decider_agent.md"), "target_decider")
 
 
 def debate_agent(llm):
     """
     Returns the debate agent.
     """
-    return create_agent(llm, os.path.join(PROMPTS_DIR, "debate_agent.md"))
+    return create_agent(llm, os.path.join(PROMPTS_DIR, "debate_agent.md"), "debate")
+
+
+def debate_followup_agent(llm):
+    """
+    Returns the debate agent for later turns that continue the previous turn's
+    Ollama context (DEBATE_CONTEXT=1) instead of resending the whole debate.
+    """
+    return create_agent(llm, os.path.join(PROMPTS_DIR, "debate_followup_agent.md"), "debate")
 
 
 def stance_agent(llm):
     """
     Returns the stance detection agent.
     """
-    return create_agent(llm, os.path.join(PROMPTS_DIR, "stance_agent.md"))
+    return create_agent(llm, os.path.join(PROMPTS_DIR, "stance_agent.md"), "stance")
 
 def final_agent(llm):
     """
     Returns the final response generation agent.
     """
-    return create_agent(llm, os.path.join(PROMPTS_DIR, "final_agent.md"))
\ No newline at end of file
+    return create_agent(llm, os.path.join(PROMPTS_DIR, "final_agent.md"), "final")
\ No newline at end of file
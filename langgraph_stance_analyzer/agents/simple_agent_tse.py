@@ -1,42 +1,72 @@
 
-import requests
 import json
-import csv
+import os
+import sys
+import time
 from langgraph.graph import StateGraph, END
 from typing import TypedDict, List
 
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+from langgraph_stance_analyzer import ollama_transport
+from langgraph_stance_analyzer import llm_cache
+from langgraph_stance_analyzer import early_stop
+from langgraph_stance_analyzer.usage import UsageTracker, estimated_usage, usage_from_chunk
+from langgraph_stance_analyzer import structured_output
+from langgraph_stance_analyzer.dataset_io import PredictionWriter, iter_rows
+
 # --- Ollama LLM Communication ---
-OLLAMA_API_URL = "http://localhost:11434/api/chat"
 MODEL_NAME = 'llama3.1:8b'
 
-def stream_ollama(prompt):
+# Token counts and timings of every call, per graph node
+usage = UsageTracker()
+
+def stream_ollama(prompt, agent=None, node=None):
     """
     Streams the chat response from the Ollama API to the terminal 
     and returns the full, concatenated response string.
+    With structured output on, `agent` selects the JSON schema the reply must follow.
+    JSON agents (those with an `agent` name) stop as soon as the object is complete.
+    The call's token counts and timings are recorded in `usage` under `node`.
     """
-    data = {
-        "model": MODEL_NAME,
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": True,  # Enable streaming
-    }
-    
+    messages = [{"role": "user", "content": prompt}]
+    schema, options = structured_output.ollama_options(agent)
+
+    cache = llm_cache.get_default_cache()
+    cache_key = llm_cache.make_key(MODEL_NAME, json.dumps(messages), dict(options, format=schema) if schema else None) if cache else None
+    cached = cache.get(cache_key) if cache else None
+    if cached is not None:
+        print(cached)
+        return cached
+
     full_response = []
+    parser = early_stop.EarlyStopParser() if agent and early_stop.EARLY_STOP else None
+    done_chunks = []
+    chunks, first_token, last_token = 0, None, None
+    started = time.perf_counter()
+    stream = ollama_transport.stream_chat(MODEL_NAME, messages, options, format=schema, on_done=done_chunks.append)
     try:
-        with requests.post(OLLAMA_API_URL, json=data, stream=True) as response:
-            response.raise_for_status()
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        json_data = json.loads(line)
-                        if "content" in json_data["message"]:
-                            chunk = json_data["message"]["content"]
-                            print(chunk, end="", flush=True)  # Print chunk to terminal
-                            full_response.append(chunk)
-                    except json.JSONDecodeError:
-                        pass  # Ignore non-json lines
+        for chunk in stream:
+            last_token = time.perf_counter()
+            first_token = first_token or last_token
+            chunks += 1
+            print(chunk, end="", flush=True)  # Print chunk to terminal
+            full_response.append(chunk)
+            if parser is not None and parser.feed(chunk):
+                stream.close()  # Closes the HTTP stream, which stops the generation
+                full_response = [parser.payload]
+                break
         print() # Add a newline after the stream ends
-        return "".join(full_response)
-    except requests.exceptions.RequestException as e:
+        response = "".join(full_response)
+        latency = time.perf_counter() - started
+        if done_chunks:
+            usage.record(usage_from_chunk(done_chunks[0]), node=node, latency=latency)
+        else:
+            # An early-stopped call never receives the final chunk; estimate from the stream
+            usage.record(estimated_usage(chunks, first_token, last_token), node=node, latency=latency, partial=True)
+        if cache:
+            cache.put(cache_key, MODEL_NAME, response)
+        return response
+    except ollama_transport.OllamaError as e:
         print(f"Error calling Ollama: {e}")
         return None
 
@@ -79,7 +109,7 @@ def linguistic_analyzer_node(state):
     prompt = f"""Analyze the following tweet for its linguistic features, including sentiment, tone, try to keep the analysis 2-3 lines.
     Tweet: "{state['tweet']}"
     Provide a brief analysis:"""
-    analysis = stream_ollama(prompt)
+    analysis = stream_ollama(prompt, node="linguistic_analyzer")
     if not analysis:
         analysis = "Error in analysis."
     print(f"--- LINGUISTIC ANALYSIS ---\n{analysis}\n")
@@ -114,7 +144,7 @@ Tweet: "I can't believe they are still pushing that awful new update. It's slow
 Tweet: "{state['tweet']}"
 [OUTPUT]
 """
-    full_response = stream_ollama(prompt)
+    full_response = stream_ollama(prompt, "simple_targets", node="target_detector")
     targets = parse_json_from_response(full_response)
     if not targets:
         targets = {"target1": "ERROR", "target2": "ERROR", "target3": "ERROR"}
@@ -158,7 +188,7 @@ Tweet: "{state['tweet']}"
 Target: "{primary_target}"
 [OUTPUT]
 """
-    full_response = stream_ollama(prompt)
+    full_response = stream_ollama(prompt, "simple_stance", node="stance_detector")
     parsed_json = parse_json_from_response(full_response)
     stance = parsed_json.get("stance", "ERROR") if parsed_json else "ERROR"
     print(f"--- PARSED STANCE ---\n{stance}\n")
@@ -167,7 +197,7 @@ Target: "{primary_target}"
 # --- Graph Definition ---
 workflow = StateGraph(AgentState)
 
-workflow.add_node("linguiprimary_tastic_analyzer", linguistic_analyzer_node)
+workflow.add_node("linguistic_analyzer", linguistic_analyzer_node)
 workflow.add_node("target_detector", target_detection_node)
 workflow.add_node("stance_detector", stance_detection_node)
 
@@ -179,6 +209,9 @@ workflow.add_edge("stance_detector", END)
 app = workflow.compile()
 
 # --- Main Execution ---
+OUTPUT_COLUMNS = ['tweet', 'GT Target', 'GT Stance', 'target1', 'target2', 'target3', 'stance']
+NUM_TWEETS = 100
+
 def main():
     """
     Main function to run the stance detection agent and save results to a CSV file.
@@ -189,24 +222,14 @@ def main():
     print(f"Processing tweets from: {input_csv_path}")
     print(f"Saving results to: {output_csv_path}")
 
-    with open(input_csv_path, 'r', newline='', encoding='utf-8') as infile, \
-         open(output_csv_path, 'w', newline='', encoding='utf-8') as outfile:
-        
-        reader = csv.DictReader(infile)
-        writer = csv.writer(outfile)
-        
-        # Write header to the output file
-        writer.writerow(['tweet', 'GT Target', 'GT Stance', 'target1', 'target2', 'target3', 'stance'])
-        
-        for i, row in enumerate(reader):
-            if i >= 100:
-                break
-            
+    # Rows are read in chunks and each result is written as soon as it is ready
+    with PredictionWriter(output_csv_path, OUTPUT_COLUMNS) as writer:
+        for i, row in iter_rows(input_csv_path, stop=NUM_TWEETS):
             tweet_text = row['tweet']
             gt_target = row['GT Target']
             gt_stance = row['GT Stance']
             
-            print(f"\n--- PROCESSING TWEET {i+1}/{100} ---")
+            print(f"\n--- PROCESSING TWEET {i+1}/{NUM_TWEETS} ---")
             
             initial_state = {
                 "tweet": tweet_text,
@@ -216,18 +239,23 @@ def main():
             
             final_state = app.invoke(initial_state)
             
-            # Write the results to the output CSV
-            writer.writerow([
-                final_state['tweet'],
-                final_state['gt_target'],
-                final_state['gt_stance'],
-                final_state.get('target1', 'N/A'),
-                final_state.get('target2', 'N/A'),
-                final_state.get('target3', 'N/A'),
-                final_state.get('stance', 'N/A')
-            ])
-            outfile.flush() # Force write to disk after each row
+            # Write the results to the output CSV (flushed after each row)
+            writer.write({
+                'tweet': final_state['tweet'],
+                'GT Target': final_state['gt_target'],
+                'GT Stance': final_state['gt_stance'],
+                'target1': final_state.get('target1', 'N/A'),
+                'target2': final_state.get('target2', 'N/A'),
+                'target3': final_state.get('target3', 'N/A'),
+                'stance': final_state.get('stance', 'N/A')
+            })
             print("--- Result saved to CSV ---")
 
+    print(f"\nUsage: {usage.summary()}")
+    for node, node_usage in usage.by_node().items():
+        print(f"  {node}: {node_usage['calls']} calls, {node_usage['latency']:.1f}s, "
+              f"{node_usage['prompt_eval_count']} prompt / {node_usage['eval_count']} generated tokens"
+              f"{' (partial, estimated)' if node_usage['partial'] else ''}")
+
 if __name__ == "__main__":
     main()
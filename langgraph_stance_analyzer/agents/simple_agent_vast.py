@@ -1,41 +1,72 @@
-import requests
 import json
-import csv
+import os
+import sys
+import time
 from langgraph.graph import StateGraph, END
 from typing import TypedDict, List
 
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+from langgraph_stance_analyzer import ollama_transport
+from langgraph_stance_analyzer import llm_cache
+from langgraph_stance_analyzer import early_stop
+from langgraph_stance_analyzer.usage import UsageTracker, estimated_usage, usage_from_chunk
+from langgraph_stance_analyzer import structured_output
+from langgraph_stance_analyzer.results_journal import ResultsJournal, row_key
+from langgraph_stance_analyzer.dataset_io import PredictionWriter, iter_rows
+
 # --- Ollama LLM Communication ---
-OLLAMA_API_URL = "http://localhost:11434/api/chat"
 MODEL_NAME = 'llama3.1:8b'
 
-def stream_ollama(prompt):
+# Token counts and timings of every call, per graph node
+usage = UsageTracker()
+
+def stream_ollama(prompt, agent=None, node=None):
     """
     Streams the chat response from the Ollama API to the terminal 
     and returns the full, concatenated response string.
+    With structured output on, `agent` selects the JSON schema the reply must follow.
+    JSON agents (those with an `agent` name) stop as soon as the object is complete.
+    The call's token counts and timings are recorded in `usage` under `node`.
     """
-    data = {
-        "model": MODEL_NAME,
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": True,  # Enable streaming
-    }
-    
+    messages = [{"role": "user", "content": prompt}]
+    schema, options = structured_output.ollama_options(agent)
+
+    cache = llm_cache.get_default_cache()
+    cache_key = llm_cache.make_key(MODEL_NAME, json.dumps(messages), dict(options, format=schema) if schema else None) if cache else None
+    cached = cache.get(cache_key) if cache else None
+    if cached is not None:
+        print(cached)
+        return cached
+
     full_response = []
+    parser = early_stop.EarlyStopParser() if agent and early_stop.EARLY_STOP else None
+    done_chunks = []
+    chunks, first_token, last_token = 0, None, None
+    started = time.perf_counter()
+    stream = ollama_transport.stream_chat(MODEL_NAME, messages, options, format=schema, on_done=done_chunks.append)
     try:
-        with requests.post(OLLAMA_API_URL, json=data, stream=True) as response:
-            response.raise_for_status()
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        json_data = json.loads(line)
-                        if "content" in json_data["message"]:
-                            chunk = json_data["message"]["content"]
-                            print(chunk, end="", flush=True)  # Print chunk to terminal
-                            full_response.append(chunk)
-                    except json.JSONDecodeError:
-                        pass  # Ignore non-json lines
+        for chunk in stream:
+            last_token = time.perf_counter()
+            first_token = first_token or last_token
+            chunks += 1
+            print(chunk, end="", flush=True)  # Print chunk to terminal
+            full_response.append(chunk)
+            if parser is not None and parser.feed(chunk):
+                stream.close()  # Closes the HTTP stream, which stops the generation
+                full_response = [parser.payload]
+                break
         print() # Add a newline after the stream ends
-        return "".join(full_response)
-    except requests.exceptions.RequestException as e:
+        response = "".join(full_response)
+        latency = time.perf_counter() - started
+        if done_chunks:
+            usage.record(usage_from_chunk(done_chunks[0]), node=node, latency=latency)
+        else:
+            # An early-stopped call never receives the final chunk; estimate from the stream
+            usage.record(estimated_usage(chunks, first_token, last_token), node=node, latency=latency, partial=True)
+        if cache:
+            cache.put(cache_key, MODEL_NAME, response)
+        return response
+    except ollama_transport.OllamaError as e:
         print(f"Error calling Ollama: {e}")
         return None
 
@@ -60,19 +91,6 @@ def parse_json_from_response(response_str: str):
 
 # --- Graph State ---
 class AgentState(TypedDict):
-# --- Graph Definition ---
-workflow = StateGraph(AgentState)
-
-workflow.add_node("linguistic_analyzer", linguistic_analyzer_node)
-workflow.add_node("target_detector", target_detection_node)
-workflow.add_node("stance_detector", stance_detection_node)
-
-workflow.set_entry_point("linguistic_analyzer")
-workflow.add_edge("linguistic_analyzer", "target_detector")
-workflow.add_edge("target_detector", "stance_detector")
-workflow.add_edge("stance_detector", END)
-
-app = workflow.compile()
     post: str
     new_topic: str # Ground Truth Target from vast.csv
     label: str     # Ground Truth Stance from vast.csv
@@ -91,7 +109,7 @@ def linguistic_analyzer_node(state):
     prompt = f"""Analyze the following post for its linguistic features, including sentiment, tone, try to keep the analysis 2-3 lines.
     Post: "{state['post']}"
     Provide a brief analysis:"""
-    analysis = stream_ollama(prompt)
+    analysis = stream_ollama(prompt, node="linguistic_analyzer")
     if not analysis:
         analysis = "Error in analysis."
     print(f"--- LINGUISTIC ANALYSIS ---\n{analysis}\n")
@@ -126,7 +144,7 @@ Text: "I can't believe they are still pushing that awful new update. It's slow a
 Text: "{state['post']}"
 [OUTPUT]
 """
-    full_response = stream_ollama(prompt)
+    full_response = stream_ollama(prompt, "simple_targets", node="target_detector")
     targets = parse_json_from_response(full_response)
     if not targets:
         targets = {"target1": "ERROR", "target2": "ERROR", "target3": "ERROR"}
@@ -170,7 +188,7 @@ Text: "{state['post']}"
 Target: "{primary_target}"
 [OUTPUT]
 """
-    full_response = stream_ollama(prompt)
+    full_response = stream_ollama(prompt, "simple_stance", node="stance_detector")
     parsed_json = parse_json_from_response(full_response)
     stance = parsed_json.get("stance", "ERROR") if parsed_json else "ERROR"
     print(f"--- PARSED STANCE ---\n{stance}\n")
@@ -191,55 +209,61 @@ workflow.add_edge("stance_detector", END)
 app = workflow.compile()
 
 # --- Main Execution ---
+OUTPUT_COLUMNS = ['post', 'new_topic', 'label', 'target1', 'target2', 'target3', 'stance']
+NUM_POSTS = 100
+
 def main():
     """
     Main function to run the stance detection agent and save results to a CSV file.
+    Each finished post is recorded in a journal next to the output file, so an
+    interrupted run picks up where it stopped when started again.
     """
     input_csv_path = "/home/rgukt/Documents/major project/major-project/data/vast/vast_filtered_ex.csv"
     output_csv_path = "/home/rgukt/Documents/major project/major-project/stance_analysis_results.csv"
+    journal = ResultsJournal(os.path.splitext(output_csv_path)[0] + ".journal.jsonl")
     
     print(f"Processing posts from: {input_csv_path}")
     print(f"Saving results to: {output_csv_path}")
 
-    with open(input_csv_path, 'r', newline='', encoding='utf-8') as infile, \
-         open(output_csv_path, 'w', newline='', encoding='utf-8') as outfile:
-        
-        reader = csv.DictReader(infile)
-        writer = csv.writer(outfile)
-        
-        # Write header to the output file
-        writer.writerow(['post', 'new_topic', 'label', 'target1', 'target2', 'target3', 'stance'])
-        
-        for i, row in enumerate(reader):
-            if i >= 100:
-                break
-            
-            post_text = row['post']
-            gt_topic = row['new_topic']
-            gt_label = row['label']
-            
-            print(f"\n--- PROCESSING POST {i+1}/{100} ---")
-            
-            initial_state = {
-                "post": post_text,
-                "new_topic": gt_topic,
-                "label": gt_label
-            }
-            
-            final_state = app.invoke(initial_state)
-            
-            # Write the results to the output CSV
-            writer.writerow([
-                final_state['post'],
-                final_state['new_topic'],
-                final_state['label'],
-                final_state.get('target1', 'N/A'),
-                final_state.get('target2', 'N/A'),
-                final_state.get('target3', 'N/A'),
-                final_state.get('stance', 'N/A')
-            ])
-            outfile.flush() # Force write to disk after each row
-            print("--- Result saved to CSV ---")
+    for i, row in iter_rows(input_csv_path, stop=NUM_POSTS):
+        key = row_key(row['post'], row['new_topic'], row['label'])
+        if key in journal:
+            print(f"--- POST {i+1}/{NUM_POSTS} already done, skipping ---")
+            continue
+
+        print(f"\n--- PROCESSING POST {i+1}/{NUM_POSTS} ---")
+
+        initial_state = {
+            "post": row['post'],
+            "new_topic": row['new_topic'],
+            "label": row['label']
+        }
+
+        final_state = app.invoke(initial_state)
+
+        # Record the result durably before moving on to the next post
+        journal.append(key, {
+            'post': final_state['post'],
+            'new_topic': final_state['new_topic'],
+            'label': final_state['label'],
+            'target1': final_state.get('target1', 'N/A'),
+            'target2': final_state.get('target2', 'N/A'),
+            'target3': final_state.get('target3', 'N/A'),
+            'stance': final_state.get('stance', 'N/A')
+        })
+        print("--- Result saved to journal ---")
+
+    # Materialize the output in input order from the journal
+    with PredictionWriter(output_csv_path, OUTPUT_COLUMNS) as writer:
+        for _, row in iter_rows(input_csv_path, stop=NUM_POSTS):
+            writer.write(journal.get(row_key(row['post'], row['new_topic'], row['label'])))
+    print(f"\nResults written to: {output_csv_path}")
+
+    print(f"\nUsage: {usage.summary()}")
+    for node, node_usage in usage.by_node().items():
+        print(f"  {node}: {node_usage['calls']} calls, {node_usage['latency']:.1f}s, "
+              f"{node_usage['prompt_eval_count']} prompt / {node_usage['eval_count']} generated tokens"
+              f"{' (partial, estimated)' if node_usage['partial'] else ''}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
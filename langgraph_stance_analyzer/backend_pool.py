@@ -0,0 +1,284 @@
+"""
+Pool of Ollama backends with least-outstanding-requests routing.
+
+Every request leases the healthy backend with the fewest requests in flight. A
+backend is ejected after several consecutive failures, or when its time to first
+byte is far above the fastest backend's. A health-check thread re-admits it once
+its cooldown has passed and it answers again.
+
+Configure the hosts with OLLAMA_HOSTS (comma-separated); with a single host
+(OLLAMA_HOST, the default) the pool only adds bookkeeping.
+"""
+
+import itertools
+import os
+import threading
+import time
+
+import requests
+
+# --- Configuration ---
+DEFAULT_HOST = "http://localhost:11434"
+EJECT_AFTER_FAILURES = int(os.environ.get("OLLAMA_EJECT_AFTER_FAILURES", 3))
+EJECT_SECONDS = float(os.environ.get("OLLAMA_EJECT_SECONDS", 30))
+# A backend whose latency EWMA exceeds this multiple of the fastest one is ejected
+SLOW_FACTOR = float(os.environ.get("OLLAMA_SLOW_FACTOR", 4))
+# Latency samples needed before a backend can be judged slow
+MIN_SAMPLES = 5
+EWMA_ALPHA = 0.2
+HEALTH_INTERVAL = float(os.environ.get("OLLAMA_HEALTH_INTERVAL", 10))
+HEALTH_TIMEOUT = 2
+
+
+def normalize_host(host):
+    host = host.strip().rstrip("/")
+    return host if host.startswith("http") else f"http://{host}"
+
+
+def configured_hosts():
+    """Hosts from OLLAMA_HOSTS, falling back to OLLAMA_HOST."""
+    hosts = [host for host in os.environ.get("OLLAMA_HOSTS", "").split(",") if host.strip()]
+    if not hosts:
+        hosts = [os.environ.get("OLLAMA_HOST", DEFAULT_HOST)]
+    return [normalize_host(host) for host in hosts]
+
+
+class Backend:
+    """One Ollama endpoint and its routing state."""
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.latency_ewma = None
+        self.samples = 0
+        self.ejected_until = None
+        self.eject_reason = None
+
+    @property
+    def healthy(self):
+        return self.ejected_until is None
+
+    def snapshot(self):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "latency_ewma": self.latency_ewma,
+            "consecutive_failures": self.consecutive_failures,
+            "eject_reason": self.eject_reason,
+        }
+
+
+class BackendPool:
+    """Routes requests over a fixed set of backends; safe to share between threads."""
+
+    def __init__(self, urls, eject_after=EJECT_AFTER_FAILURES, eject_seconds=EJECT_SECONDS,
+                 slow_factor=SLOW_FACTOR, health_interval=HEALTH_INTERVAL):
+        self.backends = [Backend(url) for url in urls]
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.slow_factor = slow_factor
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._rotation = itertools.count()
+        self._health_thread = None
+
+    def acquire(self, exclude=()):
+        """
+        Leases the healthy backend with the fewest outstanding requests, skipping
+        `exclude`. When every candidate is ejected it fails open to the one whose
+        cooldown ends first rather than refusing the request.
+        """
+        with self._lock:
+            candidates = [backend for backend in self.backends if backend not in exclude]
+            if not candidates:
+                raise LookupError("No Ollama backend left to try")
+            healthy = [backend for backend in candidates if backend.healthy]
+            if healthy:
+                # Rotate the starting point so ties are spread across backends
+                offset = next(self._rotation) % len(healthy)
+                rotated = healthy[offset:] + healthy[:offset]
+                backend = min(rotated, key=lambda b: b.outstanding)
+            else:
+                backend = min(candidates, key=lambda b: b.ejected_until)
+            backend.outstanding += 1
+            return backend
+
+    def release(self, backend, latency=None, error=False):
+        """
+        Ends a lease. `latency` is the time to first byte in seconds; `error` marks
+        a failure of the backend itself (connection errors, 5xx, timeouts).
+        """
+        with self._lock:
+            backend.outstanding -= 1
+            if error:
+                backend.consecutive_failures += 1
+                if backend.healthy and backend.consecutive_failures >= self.eject_after:
+                    self._eject(backend, f"{backend.consecutive_failures} consecutive failures")
+                return
+
+            backend.consecutive_failures = 0
+            if not backend.healthy:
+                # Served a request while ejected (fail-open), so it is back
+                self._readmit(backend)
+            if latency is None:
+                return
+            if backend.latency_ewma is None:
+                backend.latency_ewma = latency
+            else:
+                backend.latency_ewma += EWMA_ALPHA * (latency - backend.latency_ewma)
+            backend.samples += 1
+            self._check_slow(backend)
+
+    # --- Failover helpers ---
+    # `is_failure(exception)` decides whether an error is the backend's fault; only
+    # those count towards ejection and are retried on another backend.
+
+    def call(self, send, is_failure):
+        """Returns `send(backend)` from the least-loaded backend, failing over on backend errors."""
+        tried = []
+        while True:
+            backend = self.acquire(exclude=tried)
+            started = time.perf_counter()
+            try:
+                result = send(backend)
+            except Exception as e:
+                error = is_failure(e)
+                self.release(backend, error=error)
+                tried.append(backend)
+                if not error or len(tried) >= len(self.backends):
+                    raise
+                continue
+            self.release(backend, latency=time.perf_counter() - started)
+            return result
+
+    def stream(self, open_stream, is_failure):
+        """
+        Yields the items of `open_stream(backend)`. Backend errors before the first
+        item fail over to another backend; once items were yielded they are raised.
+        """
+        tried = []
+        while True:
+            backend = self.acquire(exclude=tried)
+            started = time.perf_counter()
+            latency, error, stream = None, False, None
+            try:
+                # Opening can fail too; the lease must still be released below
+                stream = open_stream(backend)
+                for item in stream:
+                    if latency is None:
+                        latency = time.perf_counter() - started
+                    yield item
+                return
+            except Exception as e:
+                error = is_failure(e)
+                tried.append(backend)
+                if latency is not None or not error or len(tried) >= len(self.backends):
+                    raise
+            finally:
+                # Also runs when the consumer closes the stream early
+                if stream is not None:
+                    stream.close()
+                self.release(backend, latency=None if error else latency, error=error)
+
+    async def acall(self, send, is_failure):
+        """Async variant of call; `send(backend)` returns an awaitable."""
+        tried = []
+        while True:
+            backend = self.acquire(exclude=tried)
+            started = time.perf_counter()
+            try:
+                result = await send(backend)
+            except Exception as e:
+                error = is_failure(e)
+                self.release(backend, error=error)
+                tried.append(backend)
+                if not error or len(tried) >= len(self.backends):
+                    raise
+                continue
+            self.release(backend, latency=time.perf_counter() - started)
+            return result
+
+    async def astream(self, open_stream, is_failure):
+        """Async variant of stream; `open_stream(backend)` returns an async iterator."""
+        tried = []
+        while True:
+            backend = self.acquire(exclude=tried)
+            started = time.perf_counter()
+            latency, error, stream = None, False, None
+            try:
+                stream = open_stream(backend)
+                async for item in stream:
+                    if latency is None:
+                        latency = time.perf_counter() - started
+                    yield item
+                return
+            except Exception as e:
+                error = is_failure(e)
+                tried.append(backend)
+                if latency is not None or not error or len(tried) >= len(self.backends):
+                    raise
+            finally:
+                if stream is not None:
+                    await stream.aclose()
+                self.release(backend, latency=None if error else latency, error=error)
+
+    def _check_slow(self, backend):
+        healthy = [b for b in self.backends if b.healthy and b.samples >= MIN_SAMPLES]
+        if backend not in healthy or len(healthy) < 2:
+            return
+        fastest = min(b.latency_ewma for b in healthy)
+        if backend.latency_ewma > self.slow_factor * max(fastest, 1e-3):
+            self._eject(backend, f"latency {backend.latency_ewma:.2f}s vs {fastest:.2f}s")
+
+    def _eject(self, backend, reason):
+        backend.ejected_until = time.monotonic() + self.eject_seconds
+        backend.eject_reason = reason
+        print(f"[Warning] Ejecting Ollama backend {backend.url}: {reason}")
+        if self._health_thread is None and len(self.backends) > 1:
+            self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+            self._health_thread.start()
+
+    def _readmit(self, backend):
+        """Must be called with the lock held."""
+        backend.ejected_until = None
+        backend.eject_reason = None
+        backend.consecutive_failures = 0
+        # Judge it afresh rather than on the latency that got it ejected
+        backend.latency_ewma = None
+        backend.samples = 0
+        print(f"[Info] Re-admitted Ollama backend {backend.url}")
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_interval)
+            now = time.monotonic()
+            with self._lock:
+                due = [b for b in self.backends if not b.healthy and b.ejected_until <= now]
+            for backend in due:
+                try:
+                    requests.get(f"{backend.url}/api/version", timeout=HEALTH_TIMEOUT).raise_for_status()
+                except requests.exceptions.RequestException:
+                    with self._lock:
+                        backend.ejected_until = time.monotonic() + self.eject_seconds
+                    continue
+                with self._lock:
+                    self._readmit(backend)
+
+    def snapshot(self):
+        with self._lock:
+            return [backend.snapshot() for backend in self.backends]
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide pool over the configured hosts."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = BackendPool(configured_hosts())
+    return _default_pool
@@ -0,0 +1,107 @@
+"""
+Debate convergence detection.
+
+The debate agent often "disagrees" by proposing a target that is trivially equivalent
+to the current one ("Facebook" vs "Facebook's Role in Cheating"). A detector scores the
+current and proposed targets with a pluggable, symmetric similarity function and treats
+anything at or above its threshold as agreement, so the graph can go straight to
+stance detection. Off by default, since ending a debate early changes predictions.
+"""
+
+import os
+import re
+import threading
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from langgraph_stance_analyzer import ollama_transport
+from langgraph_stance_analyzer.embedding_store import EmbeddingStore
+from langgraph_stance_analyzer.similarity import normalize_rows
+
+# --- Configuration ---
+# "off", "string" or "embedding"
+CONVERGENCE_MODE = os.environ.get("DEBATE_CONVERGENCE", "off")
+# Default threshold of each mode; DEBATE_CONVERGENCE_THRESHOLD overrides it
+DEFAULT_THRESHOLDS = {"string": 0.75, "embedding": 0.8}
+CONVERGENCE_THRESHOLD = (
+    float(os.environ["DEBATE_CONVERGENCE_THRESHOLD"]) if os.environ.get("DEBATE_CONVERGENCE_THRESHOLD") else None
+)
+EMBEDDING_MODEL = os.environ.get("DEBATE_CONVERGENCE_EMBEDDING_MODEL", "nomic-embed-text")
+
+# Words that frame a target without changing what it refers to
+FILLER_WORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "about", "with", "s",
+    "role", "issue", "issues", "topic", "debate", "policy", "policies", "impact", "use",
+}
+
+
+def target_tokens(text):
+    """Lowercased content words of a target, without possessives and filler words."""
+    words = re.findall(r"[a-z0-9]+", text.lower().replace("'s", ""))
+    return {word for word in words if word not in FILLER_WORDS}
+
+
+def string_similarity(a, b):
+    """
+    Mean of the overlap coefficient (shared content words over the smaller set) and
+    the Jaccard similarity of the content words. Reordering a target or adding
+    framing words scores 1.0; narrowing it by one word ("Facebook" vs "Facebook's
+    Role in Cheating") scores 0.75, by two words 0.67, and targets sharing only part
+    of their words score lower still. Targets made only of filler words fall back to
+    character-level similarity.
+    """
+    a_norm, b_norm = " ".join(a.lower().split()), " ".join(b.lower().split())
+    if not a_norm or not b_norm:
+        return 0.0
+
+    a_tokens, b_tokens = target_tokens(a), target_tokens(b)
+    if not a_tokens or not b_tokens:
+        return SequenceMatcher(None, a_norm, b_norm).ratio()
+    shared = len(a_tokens & b_tokens)
+    overlap = shared / min(len(a_tokens), len(b_tokens))
+    jaccard = shared / len(a_tokens | b_tokens)
+    return (overlap + jaccard) / 2
+
+
+def make_embedding_similarity(model=EMBEDDING_MODEL):
+    """Returns a cosine similarity function over embeddings from the persistent store."""
+    store = EmbeddingStore(model)
+    # Graph runs on several threads share the store
+    lock = threading.Lock()
+
+    def embedding_similarity(a, b):
+        with lock:
+            vectors = store.get_or_compute([a, b], lambda text: ollama_transport.embed(model, text))
+        vectors = normalize_rows(vectors)
+        return float(np.dot(vectors[0], vectors[1]))
+
+    return embedding_similarity
+
+
+class ConvergenceDetector:
+    """Decides whether a proposed target is equivalent to the current one."""
+
+    def __init__(self, similarity=string_similarity, threshold=DEFAULT_THRESHOLDS["string"]):
+        self.similarity = similarity
+        self.threshold = threshold
+
+    def converged(self, current_target, proposed_target):
+        if not current_target or not proposed_target:
+            return False
+        try:
+            return self.similarity(current_target.strip(), proposed_target.strip()) >= self.threshold
+        except Exception as e:
+            print(f"\nWarning: Convergence check failed ({e}). Continuing the debate.")
+            return False
+
+
+def get_detector(mode=CONVERGENCE_MODE, threshold=CONVERGENCE_THRESHOLD):
+    """Builds the detector selected by DEBATE_CONVERGENCE, or None when it is off."""
+    if mode == "off":
+        return None
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS.get(mode, DEFAULT_THRESHOLDS["string"])
+    if mode == "embedding":
+        return ConvergenceDetector(make_embedding_similarity(), threshold)
+    return ConvergenceDetector(string_similarity, threshold)
@@ -0,0 +1,165 @@
+"""
+Streaming dataset reader and prediction writer for inference jobs.
+
+`iter_rows` reads CSV, Parquet, NDJSON (.jsonl/.ndjson) or the dataset store's
+Arrow files (.arrow, memory-mapped) in chunks and yields one row at a time, so
+memory stays flat however large the input is. `PredictionWriter`
+writes rows to the same formats as they are produced.
+"""
+
+import csv
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+CHUNK_SIZE = int(os.environ.get("DATASET_CHUNK_SIZE", 1000))
+# Rows buffered per Parquet row group; CSV and NDJSON rows are written one by one
+PARQUET_ROW_GROUP = 1000
+NDJSON_EXTENSIONS = (".jsonl", ".ndjson")
+
+
+def read_chunks(path, chunk_size, columns=None):
+    """Yields the file's rows as lists of dicts, `chunk_size` rows at a time."""
+    if path.endswith(".arrow"):
+        import pyarrow as pa
+
+        # One memory-mapped record batch at a time; only the chunk being yielded
+        # is converted to Python objects
+        reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns:
+                batch = batch.select(columns)
+            for offset in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(offset, chunk_size).to_pylist()
+    elif path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pylist()
+    elif path.endswith(NDJSON_EXTENSIONS):
+        with open(path, "r", encoding="utf-8") as f:
+            chunk = []
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                chunk.append({column: row.get(column) for column in columns} if columns else row)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+    else:
+        # Strings as written, like csv.DictReader; empty cells stay "" instead of NaN
+        with pd.read_csv(path, chunksize=chunk_size, usecols=columns, dtype=str, keep_default_na=False) as reader:
+            for frame in reader:
+                yield frame.to_dict("records")
+
+
+def iter_rows(path, start=0, stop=None, sample=None, seed=0, chunk_size=CHUNK_SIZE, columns=None):
+    """
+    Yields (row_index, row) for the rows in [start, stop) of a CSV, Parquet, NDJSON or Arrow file.
+    With `sample` (a fraction in (0, 1]), each row is kept with that probability.
+    The choice depends only on `seed` and the row's index, so a resumed job sees the
+    same rows whatever its start offset or chunk size.
+    """
+    rng = np.random.default_rng(seed) if sample is not None else None
+    index = 0
+    for chunk in read_chunks(path, chunk_size, columns):
+        # Draw for every row in file order, skipped or not, so the draws stay aligned
+        keep = rng.random(len(chunk)) < sample if rng is not None else None
+        for offset, row in enumerate(chunk):
+            position = index + offset
+            if stop is not None and position >= stop:
+                return
+            if position >= start and (keep is None or keep[offset]):
+                yield position, row
+        index += len(chunk)
+
+
+class PredictionWriter:
+    """
+    Writes rows (dicts) to a CSV, Parquet or NDJSON file as they arrive. CSV and
+    NDJSON rows are flushed one by one; Parquet rows go out one row group at a time.
+    The columns are taken from `columns` or else from the first row.
+    """
+
+    def __init__(self, path, columns=None, row_group_size=PARQUET_ROW_GROUP):
+        self.path = path
+        self.columns = list(columns) if columns else None
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self._file = None
+        self._writer = None
+        self._buffer = []
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if path.endswith(".parquet"):
+            self.format = "parquet"
+        elif path.endswith(NDJSON_EXTENSIONS):
+            self.format = "ndjson"
+            self._file = open(path, "w", encoding="utf-8")
+        else:
+            self.format = "csv"
+            self._file = open(path, "w", newline="", encoding="utf-8")
+
+    def write(self, row):
+        if self.columns is None:
+            self.columns = list(row)
+        row = {column: row.get(column) for column in self.columns}
+        if self.format == "csv":
+            if self._writer is None:
+                self._writer = csv.DictWriter(self._file, fieldnames=self.columns)
+                self._writer.writeheader()
+            self._writer.writerow(row)
+            self._file.flush()
+        elif self.format == "ndjson":
+            self._file.write(json.dumps(row, default=str) + "\n")
+            self._file.flush()
+        else:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.row_group_size:
+                self._write_row_group()
+        self.rows_written += 1
+
+    def _write_row_group(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            schema = pa.Table.from_pylist(self._buffer).schema
+            # Columns that are all empty in the first group would otherwise be typed null
+            schema = pa.schema([
+                pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                for field in schema
+            ])
+            self._writer = pq.ParquetWriter(self.path, schema)
+        self._writer.write_table(pa.Table.from_pylist(self._buffer, schema=self._writer.schema))
+        self._buffer = []
+
+    def close(self):
+        if self.format == "parquet":
+            if self._buffer:
+                self._write_row_group()
+            if self._writer is not None:
+                self._writer.close()
+            elif self.columns:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                # No rows at all; still leave a readable file with the columns
+                pq.write_table(pa.table({column: pa.array([], pa.string()) for column in self.columns}), self.path)
+        else:
+            if self.format == "csv" and self._writer is None and self.columns:
+                csv.writer(self._file).writerow(self.columns)
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
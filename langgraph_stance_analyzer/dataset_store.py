@@ -0,0 +1,215 @@
+"""
+Columnar store of the stance datasets, converted once from their source files.
+
+Each split is stored as an uncompressed Arrow IPC file with the standard
+`tweet`/`target`/`stance` columns (whatever the source called them: "post",
+"GT Target", "new_topic", ...). A manifest.json records the source, its size and
+modification time and the row count of every split, so a split is only rebuilt
+when its source changes.
+
+Loading memory-maps the file: selecting columns and slicing rows copies nothing,
+and batches handed to inference or evaluation code point straight into the map.
+
+Usage:
+    python langgraph_stance_analyzer/dataset_store.py build
+    python langgraph_stance_analyzer/dataset_store.py add vast_explicit raw data/vast/vast_filtered_ex.csv
+    python langgraph_stance_analyzer/dataset_store.py list
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import pyarrow as pa
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from langgraph_stance_analyzer.dataset_io import CHUNK_SIZE, read_chunks
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+STORE_DIR = os.environ.get("DATASET_STORE_DIR", os.path.join(ROOT_DIR, "dataset_store"))
+STANDARD_COLUMNS = ["tweet", "target", "stance"]
+# Source column names for each standard column, in order of preference
+COLUMN_ALIASES = {
+    "tweet": ["tweet", "Tweet", "post", "text"],
+    "target": ["target", "Target 1", "GT Target", "GT_Target", "new_topic", "Target ori"],
+    "stance": ["stance", "Stance 1", "label", "GT Stance", "GT_Stance"],
+}
+# (name, split, path relative to the repo root) converted by `build`
+DEFAULT_SOURCES = [
+    ("merged", "train", "processed_data/merged_train_dataset.csv"),
+    ("unified", "train", "processed_data/unified_datasets/unified_train.csv"),
+    ("tse_explicit", "test", "processed_data/test_tse_explicit.csv"),
+    ("tse_implicit", "test", "processed_data/test_tse_implicit.csv"),
+    ("vast_explicit", "test", "processed_data/test_vast_explicit.csv"),
+    ("vast_implicit", "test", "processed_data/test_vast_implicit.csv"),
+    ("tse_explicit", "raw", "data/tse/tse_explicit.csv"),
+    ("tse_implicit", "raw", "data/tse/tse_implicit.csv"),
+    ("vast_explicit", "raw", "data/vast/vast_filtered_ex.csv"),
+    ("vast_implicit", "raw", "data/vast/vast_filtered_im.csv"),
+]
+
+
+def resolve_columns(available):
+    """Maps each standard column to its name among `available`; exact matches first, then case-insensitive."""
+    lower = {name.lower(): name for name in available}
+    mapping = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        match = next((alias for alias in aliases if alias in available), None)
+        if match is None:
+            match = next((lower[alias.lower()] for alias in aliases if alias.lower() in lower), None)
+        if match is None:
+            raise KeyError(f"No column for '{column}' among {sorted(available)}")
+        mapping[column] = match
+    return mapping
+
+
+def _text(value):
+    return None if value is None else str(value).strip()
+
+
+class DatasetStore:
+    """Arrow IPC files under `root`, one per (name, split), plus manifest.json."""
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+
+    @property
+    def manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def path(self, name, split):
+        return os.path.join(self.root, name, f"{split}.arrow")
+
+    def entry(self, name, split):
+        return self.manifest.get(name, {}).get(split)
+
+    def is_current(self, name, split, source):
+        """True when the split was built from `source` as it is now."""
+        entry = self.entry(name, split)
+        if entry is None or not os.path.exists(self.path(name, split)):
+            return False
+        stat = os.stat(source)
+        return (entry["source"] == os.path.abspath(source) and entry["source_size"] == stat.st_size
+                and entry["source_mtime"] == stat.st_mtime)
+
+    def add(self, name, split, source, extra_columns=(), force=False):
+        """
+        Converts `source` (CSV, Parquet or NDJSON) into the store, streaming it in
+        chunks. `extra_columns` are kept next to the standard ones, as strings.
+        Returns the manifest entry; an up-to-date split is not converted again.
+        """
+        if not force and self.is_current(name, split, source):
+            return self.entry(name, split)
+
+        schema = pa.schema(
+            [pa.field(column, pa.string()) for column in STANDARD_COLUMNS]
+            + [pa.field(column, pa.string()) for column in extra_columns]
+        )
+        path = self.path(name, split)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        rows = 0
+        mapping = None
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            for chunk in read_chunks(source, CHUNK_SIZE):
+                if mapping is None and chunk:
+                    mapping = resolve_columns(list(chunk[0]))
+                    mapping.update({column: column for column in extra_columns})
+                arrays = [pa.array([_text(row.get(mapping[field.name])) for row in chunk], pa.string())
+                          for field in schema]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                rows += len(chunk)
+        os.replace(tmp_path, path)
+
+        stat = os.stat(source)
+        entry = {
+            "path": os.path.relpath(path, self.root),
+            "rows": rows,
+            "columns": schema.names,
+            "source": os.path.abspath(source),
+            "source_columns": mapping,
+            "source_size": stat.st_size,
+            "source_mtime": stat.st_mtime,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        manifest = self.manifest
+        manifest.setdefault(name, {})[split] = entry
+        self._save_manifest(manifest)
+        return entry
+
+    def build(self, sources=DEFAULT_SOURCES, force=False):
+        """Converts every source that exists; returns the (name, split) pairs now in the store."""
+        built = []
+        for name, split, relative_path in sources:
+            source = os.path.join(ROOT_DIR, relative_path)
+            if not os.path.exists(source):
+                print(f"[Warning] Skipping {name}/{split}: {relative_path} not found")
+                continue
+            current = not force and self.is_current(name, split, source)
+            entry = self.add(name, split, source, force=force)
+            print(f"  {'=' if current else '+'} {name}/{split}: {entry['rows']} rows")
+            built.append((name, split))
+        return built
+
+    # --- Loading ---
+    def load(self, name, split, columns=None, start=0, stop=None):
+        """
+        The split as a memory-mapped pyarrow Table. `columns` projects and
+        [start, stop) slices the rows; neither copies data.
+        """
+        path = self.path(name, split)
+        if not os.path.exists(path):
+            raise KeyError(f"{name}/{split} is not in the store at {self.root}")
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        stop = table.num_rows if stop is None else min(stop, table.num_rows)
+        return table.slice(start, max(stop - start, 0))
+
+    def iter_batches(self, name, split, columns=None, start=0, stop=None, batch_size=CHUNK_SIZE):
+        """Yields zero-copy RecordBatches of at most `batch_size` rows."""
+        yield from self.load(name, split, columns, start, stop).to_batches(max_chunksize=batch_size)
+
+    def to_pandas(self, name, split, columns=None, start=0, stop=None):
+        return self.load(name, split, columns, start, stop).to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the stance datasets into the columnar store.")
+    parser.add_argument("--root", default=STORE_DIR, help="Store directory (DATASET_STORE_DIR).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Convert the repo's standard splits.")
+    build.add_argument("--force", action="store_true", help="Rebuild splits even when their source is unchanged.")
+    add = commands.add_parser("add", help="Convert one file as NAME/SPLIT.")
+    add.add_argument("name")
+    add.add_argument("split")
+    add.add_argument("source")
+    add.add_argument("--extra-columns", nargs="*", default=[], help="Source columns to keep as well.")
+    add.add_argument("--force", action="store_true")
+    commands.add_parser("list", help="Show the manifest.")
+    args = parser.parse_args()
+
+    store = DatasetStore(args.root)
+    if args.command == "build":
+        store.build(force=args.force)
+    elif args.command == "add":
+        entry = store.add(args.name, args.split, args.source, args.extra_columns, force=args.force)
+        print(f"{args.name}/{args.split}: {entry['rows']} rows -> {store.path(args.name, args.split)}")
+    else:
+        for name, splits in sorted(store.manifest.items()):
+            for split, entry in sorted(splits.items()):
+                print(f"{name}/{split}: {entry['rows']} rows from {entry['source']}")
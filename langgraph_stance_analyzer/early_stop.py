@@ -0,0 +1,115 @@
+"""
+Early-stop parsing of streamed agent replies.
+
+Agents that answer with an XML element or a JSON object tend to keep generating
+after it (explanations after `</response>`, text after the closing `}`). The parser
+is fed tokens as they arrive and reports as soon as the first element/object is
+complete, so the caller can close the stream and free the backend slot.
+"""
+
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+
+# Opt-in: a closed stream never receives Ollama's final chunk, so the token counts
+# and backend timings of early-stopped calls are missing from usage reports
+EARLY_STOP = os.environ.get("EARLY_STOP", "0") == "1"
+
+OPEN_TAG = re.compile(r"<([A-Za-z_][\w.-]*)[^<>]*>")
+
+
+class EarlyStopParser:
+    """
+    Incremental detector for the first complete XML element or JSON object in a
+    stream. Preambles and code fences before it are skipped; `payload` is the
+    element/object text alone.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.kind = None
+        self.start = None
+        self.end = None
+        # Scan state
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._close_tag = None
+
+    @property
+    def complete(self):
+        return self.end is not None
+
+    @property
+    def payload(self):
+        return self.buffer[self.start:self.end] if self.complete else None
+
+    @property
+    def value(self):
+        """The parsed payload: a dict for JSON, an Element for XML (None if incomplete)."""
+        if not self.complete:
+            return None
+        try:
+            if self.kind == "json":
+                return json.loads(self.payload)
+            return ET.fromstring(self.payload)
+        except (json.JSONDecodeError, ET.ParseError):
+            return None
+
+    def feed(self, token):
+        """Adds a token; returns True once the payload is complete."""
+        if self.complete:
+            return True
+        self.buffer += token
+        if self.kind is None:
+            self._find_start()
+        if self.kind == "json":
+            self._scan_json()
+        elif self.kind == "xml":
+            self._scan_xml()
+        return self.complete
+
+    def _find_start(self):
+        brace = self.buffer.find("{", self._pos)
+        tag = OPEN_TAG.search(self.buffer, self._pos)
+        if brace != -1 and (tag is None or brace < tag.start()):
+            self.kind, self.start, self._pos = "json", brace, brace
+        elif tag is not None:
+            self.kind, self.start, self._pos = "xml", tag.start(), tag.end()
+            self._close_tag = f"</{tag.group(1)}>"
+        else:
+            # An opening tag may still be arriving; rescan from its '<' next time
+            last_lt = self.buffer.rfind("<", self._pos)
+            self._pos = last_lt if last_lt != -1 else len(self.buffer)
+
+    def _scan_json(self):
+        for i in range(self._pos, len(self.buffer)):
+            char = self.buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = i + 1
+                    return
+        self._pos = len(self.buffer)
+
+    def _scan_xml(self):
+        found = self.buffer.find(self._close_tag, self._pos)
+        if found != -1:
+            self.end = found + len(self._close_tag)
+        else:
+            # Keep enough overlap to catch a closing tag split across tokens
+            self._pos = max(self._pos, len(self.buffer) - len(self._close_tag) + 1)
+
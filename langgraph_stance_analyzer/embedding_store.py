@@ -0,0 +1,176 @@
+"""
+Persistent embedding store keyed by model and text.
+
+Vectors live in an append-only float32 matrix that is memory-mapped on load, next to
+an append-only JSON-lines index of the texts (line number == row). Any number of
+processes can read the same store; writers take a file lock, so several threads and
+processes can add to it as well.
+"""
+
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+# --- Configuration ---
+EMBEDDINGS_DIR = os.environ.get(
+    "EMBEDDING_STORE_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "embeddings_cache")),
+)
+
+
+class EmbeddingStore:
+    """Memory-mapped float32 embedding matrix plus a text -> row index for one model."""
+
+    def __init__(self, model, root=EMBEDDINGS_DIR, read_only=False):
+        self.model = model
+        self.read_only = read_only
+        self.dir = os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]", "_", model))
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.keys_path = os.path.join(self.dir, "keys.jsonl")
+        self.lock_path = os.path.join(self.dir, "write.lock")
+
+        self.dim = None
+        self._index = {}
+        # Lines read from keys.jsonl so far; a key's row is its line number
+        self._rows = 0
+        self._keys_offset = 0
+        self._vectors = None
+        self._lock = threading.RLock()
+
+        if not read_only:
+            os.makedirs(self.dir, exist_ok=True)
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                self.dim = json.load(f)["dim"]
+        self.refresh()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, text):
+        return text in self._index
+
+    def refresh(self):
+        """Picks up rows appended since the last load (e.g. by another process)."""
+        with self._lock:
+            if self.dim is None and os.path.exists(self.meta_path):
+                with open(self.meta_path, "r") as f:
+                    self.dim = json.load(f)["dim"]
+            if self.dim is None or not os.path.exists(self.keys_path):
+                return
+
+            with open(self.keys_path, "rb") as f:
+                f.seek(self._keys_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Partially written line, pick it up on the next refresh
+                    # A text written twice keeps its first row; the duplicate row is never read
+                    self._index.setdefault(json.loads(line), self._rows)
+                    self._rows += 1
+                    self._keys_offset += len(line)
+
+            # Vectors are always written before their keys, so the matrix covers the index
+            n_rows = min(self._rows, os.path.getsize(self.vectors_path) // (self.dim * 4))
+            if n_rows:
+                self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n_rows, self.dim))
+
+    @contextmanager
+    def _write_lock(self):
+        """Serializes writers across threads (RLock) and processes (flock on write.lock)."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def lookup(self, texts):
+        """
+        Bulk lookup. Returns an (len(texts), dim) float32 matrix and a boolean mask of
+        which texts were found; rows for missing texts are zero.
+        """
+        with self._lock:
+            rows = np.array([self._index.get(text, -1) for text in texts], dtype=np.int64)
+            found = rows >= 0
+            if self.dim is None:
+                return np.zeros((len(texts), 0), dtype=np.float32), found
+
+            matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+            if found.any():
+                matrix[found] = self._vectors[rows[found]]
+            return matrix, found
+
+    def add(self, texts, vectors):
+        """Bulk insert. Texts already in the store are skipped."""
+        if self.read_only:
+            raise PermissionError(f"Embedding store for '{self.model}' was opened read-only")
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise ValueError("Expected one embedding vector per text")
+
+        with self._write_lock():
+            # Another writer may have added rows (or created the store) since our last read
+            self.refresh()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_path, "w") as f:
+                    json.dump({"model": self.model, "dim": self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dim embeddings, got {vectors.shape[1]}")
+
+            new_rows = {}
+            for text, vector in zip(texts, vectors):
+                if text not in self._index and text not in new_rows:
+                    new_rows[text] = vector
+            if not new_rows:
+                return
+
+            # Trim what a crashed writer left behind (vectors without keys, a partial key
+            # line), so that the next vector lands on the row of the next key line
+            vectors_size = self._rows * self.dim * 4
+            if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) > vectors_size:
+                os.truncate(self.vectors_path, vectors_size)
+            if os.path.exists(self.keys_path) and os.path.getsize(self.keys_path) > self._keys_offset:
+                os.truncate(self.keys_path, self._keys_offset)
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.stack(list(new_rows.values())).tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(json.dumps(text).encode("utf-8") + b"\n" for text in new_rows))
+            self.refresh()
+
+    def get_or_compute(self, texts, embed_fn):
+        """
+        Returns the embeddings for all texts, calling `embed_fn(text)` once per
+        distinct text that is not stored yet and saving the results.
+        """
+        matrix, found = self.lookup(texts)
+        if found.all():
+            return matrix
+
+        missing = list(dict.fromkeys(text for text, hit in zip(texts, found) if not hit))
+        computed = [embed_fn(text) for text in missing]
+        if self.read_only:
+            by_text = dict(zip(missing, computed))
+            vectors = [by_text[text] for text, hit in zip(texts, found) if not hit]
+            if matrix.shape[1] == 0:
+                matrix = np.zeros((len(texts), len(vectors[0])), dtype=np.float32)
+            matrix[~found] = np.asarray(vectors, dtype=np.float32)
+            return matrix
+
+        self.add(missing, computed)
+        return self.lookup(texts)[0]
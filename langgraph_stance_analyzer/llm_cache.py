@@ -0,0 +1,292 @@
+"""
+Persistent, content-addressed cache for LLM responses.
+
+Entries are keyed by a hash of the model, the fully rendered prompt and the sampling
+options, so editing one prompt file only invalidates the calls that use it. Old
+entries are evicted by age and, least recently used first, by total size.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.callbacks import AsyncCallbackManager, CallbackManager
+from langchain_core.outputs import Generation, LLMResult
+from langchain_core.runnables import Runnable, ensure_config
+
+from langgraph_stance_analyzer.early_stop import EarlyStopParser
+
+# --- Configuration ---
+CACHE_PATH = os.environ.get(
+    "LLM_CACHE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "llm_cache", "responses.sqlite")),
+)
+CACHE_ENABLED = os.environ.get("LLM_CACHE_DISABLED", "0") != "1"
+MAX_AGE_DAYS = float(os.environ.get("LLM_CACHE_MAX_AGE_DAYS", 30))
+MAX_SIZE_MB = float(os.environ.get("LLM_CACHE_MAX_SIZE_MB", 512))
+
+# Eviction is checked once every this many writes instead of on every put
+EVICT_EVERY = 256
+
+# generation_info reported to the callbacks for a call served from the cache
+CACHE_HIT_INFO = {"done": True, "cached": True}
+
+# LLM attributes that change the generated text and therefore belong in the key
+SAMPLING_FIELDS = (
+    "temperature", "top_k", "top_p", "num_predict", "num_ctx", "seed", "stop",
+    "repeat_penalty", "repeat_last_n", "mirostat", "mirostat_eta", "mirostat_tau",
+    "tfs_z", "format",
+)
+
+
+def make_key(model, prompt, options=None):
+    """Returns the content address for a model, rendered prompt and sampling options."""
+    payload = json.dumps(
+        {"model": model, "prompt": prompt, "options": options or {}},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed response cache with age and size eviction."""
+
+    def __init__(self, path=CACHE_PATH, max_age_days=MAX_AGE_DAYS, max_size_mb=MAX_SIZE_MB):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                size INTEGER,
+                created_at REAL,
+                accessed_at REAL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        conn.commit()
+        self.evict()
+
+    def _conn(self):
+        # One connection per thread; WAL lets the bulk workers read while one writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Returns the cached response for a key, or None on a miss."""
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is None or now - row[1] > self.max_age:
+                with self._lock:
+                    self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            with self._lock:
+                self.hits += 1
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"[Warning] LLM cache read failed: {e}")
+            return None
+
+    def put(self, key, model, response):
+        """Stores a response under a key."""
+        try:
+            now = time.time()
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"[Warning] LLM cache write failed: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            should_evict = self._writes % EVICT_EVERY == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until under the size limit."""
+        try:
+            conn = self._conn()
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                to_free = total - self.max_bytes
+                victims = []
+                for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                    victims.append((key,))
+                    to_free -= size
+                    if to_free <= 0:
+                        break
+                conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"[Warning] LLM cache eviction failed: {e}")
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Returns the process-wide cache, or None when caching is disabled."""
+    global _default_cache
+    if not CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+    return _default_cache
+
+
+def llm_params(llm):
+    """Returns the model name and the sampling options set on a LangChain LLM."""
+    model = getattr(llm, "model", type(llm).__name__)
+    options = {
+        name: getattr(llm, name)
+        for name in SAMPLING_FIELDS
+        if getattr(llm, name, None) is not None
+    }
+    return model, options
+
+
+def _prompt_text(input):
+    return input.to_string() if hasattr(input, "to_string") else str(input)
+
+
+def _configure(manager_class, config):
+    config = ensure_config(config)
+    return manager_class.configure(
+        config.get("callbacks"),
+        inheritable_tags=config.get("tags"),
+        inheritable_metadata=config.get("metadata"),
+    )
+
+
+def _hit_result(text):
+    return LLMResult(generations=[[Generation(text=text, generation_info=CACHE_HIT_INFO)]])
+
+
+class CachedLLM(Runnable):
+    """
+    Wraps a LangChain LLM so that `invoke`/`stream` are served from the cache when
+    the same model, rendered prompt and sampling options were seen before.
+    A cache hit is streamed back as a single token and reported to the callbacks as
+    an LLM call marked `cached`, so usage tracking counts it without backend time.
+    """
+
+    def __init__(self, llm, cache=None):
+        self.llm = llm
+        self.cache = cache
+
+    def _key(self, input, kwargs):
+        model, options = llm_params(self.llm)
+        # Call-time parameters such as an Ollama `context` change the reply too
+        return model, make_key(model, _prompt_text(input), {**options, **kwargs})
+
+    def _report_hit(self, input, config, text):
+        manager = _configure(CallbackManager, config)
+        for run_manager in manager.on_llm_start({"name": llm_params(self.llm)[0]}, [_prompt_text(input)]):
+            run_manager.on_llm_end(_hit_result(text))
+
+    async def _areport_hit(self, input, config, text):
+        manager = _configure(AsyncCallbackManager, config)
+        for run_manager in await manager.on_llm_start({"name": llm_params(self.llm)[0]}, [_prompt_text(input)]):
+            await run_manager.on_llm_end(_hit_result(text))
+
+    def _put_early_stopped(self, key, model, chunks):
+        """
+        A consumer that closes the stream early (see early_stop) has already seen a
+        complete answer; cache that answer, but never a cut-off one.
+        """
+        if not chunks:
+            return
+        parser = EarlyStopParser()
+        text = "".join(chunks)
+        # Only when the payload was completed by the last token, i.e. the consumer
+        # stopped because of it rather than being cancelled later for another reason
+        if parser.feed(text) and parser.end > len(text) - len(chunks[-1]):
+            self.cache.put(key, model, parser.payload)
+
+    def invoke(self, input, config=None, **kwargs):
+        return "".join(self.stream(input, config, **kwargs))
+
+    def stream(self, input, config=None, **kwargs):
+        if self.cache is None:
+            yield from self.llm.stream(input, config, **kwargs)
+            return
+
+        model, key = self._key(input, kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._report_hit(input, config, cached)
+            yield cached
+            return
+
+        chunks = []
+        try:
+            for token in self.llm.stream(input, config, **kwargs):
+                chunks.append(token)
+                yield token
+        except GeneratorExit:
+            self._put_early_stopped(key, model, chunks)
+            raise
+        self.cache.put(key, model, "".join(chunks))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return "".join([token async for token in self.astream(input, config, **kwargs)])
+
+    async def astream(self, input, config=None, **kwargs):
+        if self.cache is None:
+            async for token in self.llm.astream(input, config, **kwargs):
+                yield token
+            return
+
+        model, key = self._key(input, kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            await self._areport_hit(input, config, cached)
+            yield cached
+            return
+
+        chunks = []
+        try:
+            async for token in self.llm.astream(input, config, **kwargs):
+                chunks.append(token)
+                yield token
+        except GeneratorExit:
+            self._put_early_stopped(key, model, chunks)
+            raise
+        self.cache.put(key, model, "".join(chunks))
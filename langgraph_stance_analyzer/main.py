@@ -1,7 +1,13 @@
-from langchain_ollama.llms import OllamaLLM
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import ensure_config, merge_configs
 from langgraph.graph import StateGraph, END
+from langgraph.config import get_stream_writer
 from typing import TypedDict, Annotated, List
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import operator
+import os
+import threading
 import xml.etree.ElementTree as ET
 
 from langgraph_stance_analyzer.agents.agents import (
@@ -10,10 +16,22 @@ from langgraph_stance_analyzer.agents.agents import (
     explicit_target_agent,
     target_decider_agent,
     debate_agent,
+    debate_followup_agent,
     stance_agent,
     final_agent,
 )
+from langgraph_stance_analyzer.convergence import get_detector
+from langgraph_stance_analyzer.early_stop import EARLY_STOP, EarlyStopParser
+from langgraph_stance_analyzer.ollama_transport import KEEP_ALIVE
+from langgraph_stance_analyzer.pooled_llm import PooledOllamaLLM
+from langgraph_stance_analyzer.structured_output import STRUCTURED_OUTPUT, to_text
+from langgraph_stance_analyzer.usage import UsageTracker
 
+# Opt-in: run linguistic analysis and both target identifications concurrently
+SPECULATIVE_BRANCHES = os.environ.get("SPECULATIVE_BRANCHES", "0") == "1"
+# Opt-in: later debate turns continue the previous turn's Ollama context and send
+# only the new background information instead of the whole prompt and history
+DEBATE_CONTEXT = os.environ.get("DEBATE_CONTEXT", "0") == "1"
 
 
 class AgentState(TypedDict):
@@ -25,38 +43,105 @@ class AgentState(TypedDict):
     final_response: Annotated[str, operator.add]
     debate_history: List[str]
     max_turns: int
+    debate_converged: bool # Set when the debate re-proposed an equivalent target
+    debate_context: List[int] # Ollama context after the last debate turn (DEBATE_CONTEXT=1)
 
 
-llm = OllamaLLM(model="llama3.1:8b")
+# keep_alive keeps the model and its KV cache resident between the agents' calls,
+# so the shared system-prompt prefixes are not re-evaluated after a reload.
+# Calls are spread over the backends listed in OLLAMA_HOSTS.
+llm = PooledOllamaLLM(model="llama3.1:8b", keep_alive=KEEP_ALIVE)
 
 linguistic_runnable = linguistic_agent(llm)
 implicit_target_runnable = implicit_target_agent(llm)
 explicit_target_runnable = explicit_target_agent(llm)
 target_decider_runnable = target_decider_agent(llm)
 debate_runnable = debate_agent(llm)
+debate_followup_runnable = debate_followup_agent(llm)
 stance_runnable = stance_agent(llm)
 final_runnable = final_agent(llm)
 
+# Agent behind each node, for turning structured replies back into the node's text
+NODE_AGENTS = {
+    "linguistic_analysis": "linguistic",
+    "decide_target_type": "target_decider",
+    "implicit_target_identification": "implicit_target",
+    "explicit_target_identification": "explicit_target",
+    "debate": "debate",
+    "stance_detection": "stance",
+    "final_response_generation": "final",
+}
 
-def get_linguistic_analysis(state):
-    print("Linguistic Analysis:", end=" ", flush=True)
+# Nodes whose agents answer with a single XML element; with structured output every
+# node answers with a JSON object
+XML_NODES = {"debate", "final_response_generation"}
+
+# Ends the debate early when a proposed target is equivalent to the current one
+convergence_detector = get_detector()
+
+
+class GenerationContext(BaseCallbackHandler):
+    """Keeps the Ollama `context` returned with the final chunk of a completed call."""
+
+    def __init__(self):
+        self.context = None
+
+    def on_llm_end(self, response, **kwargs):
+        if response.generations and response.generations[0]:
+            generation_info = response.generations[0][0].generation_info or {}
+            self.context = generation_info.get("context") or self.context
+
+
+def stream_agent(runnable, inputs, label, node, cancel_event=None, callbacks=None):
+    """
+    Streams an agent's tokens to stdout and, when the graph is run with
+    stream_mode="custom", to LangGraph's custom stream as token events.
+    Setting `cancel_event` stops the generation and closes the backend stream.
+    `callbacks` are added to the ones inherited from the graph (usage tracking).
+    Structured replies stop the stream as soon as the XML element or JSON object is
+    complete; with structured output on, the JSON is returned as the node's usual text.
+    """
+    writer = get_stream_writer()
+    print(f"{label}:", end=" ", flush=True)
     response_content = ""
-    for token in linguistic_runnable.stream({"input": state["input"]}):
-        print(token, end="", flush=True)
-        response_content += token
+    parser = EarlyStopParser() if EARLY_STOP and (STRUCTURED_OUTPUT or node in XML_NODES) else None
+    # Tag the LLM call with its node: routers like decide_target_type run inside
+    # another node's task, so langgraph_node alone would misattribute their usage
+    config = {"metadata": {"agent_node": node}}
+    if callbacks:
+        # A config's own callbacks replace the inherited ones, so merge them in
+        config["callbacks"] = merge_configs(ensure_config(), {"callbacks": callbacks})["callbacks"]
+    stream = runnable.stream(inputs, config=config)
+    try:
+        for token in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            print(token, end="", flush=True)
+            writer({"event": "token", "node": node, "token": token})
+            response_content += token
+            if parser is not None and parser.feed(token):
+                response_content = parser.payload
+                break
+    finally:
+        stream.close()
     print()
+    return to_text(NODE_AGENTS.get(node), response_content)
+
+
+def get_linguistic_analysis(state):
+    response_content = stream_agent(
+        linguistic_runnable, {"input": state["input"]}, "Linguistic Analysis", "linguistic_analysis"
+    )
     return {"linguistic_analysis": response_content, "debate_history": []}
 
 
 def decide_target_type(state):
-    print("Deciding Target Type:", end=" ", flush=True)
-    response_content = ""
-    for token in target_decider_runnable.stream(
-        {"linguistic_analysis": state["linguistic_analysis"], "input": state["input"]} 
-    ):
-        print(token, end="", flush=True)
-        response_content += token
-    print()
+    response_content = stream_agent(
+        target_decider_runnable,
+        {"linguistic_analysis": state["linguistic_analysis"], "input": state["input"]},
+        "Deciding Target Type",
+        "decide_target_type",
+    )
     if "implicit" in response_content.lower():
         return "implicit_target_identification"
     else:
@@ -64,23 +149,52 @@ def decide_target_type(state):
 
 
 def get_implicit_target(state):
-    print("Implicit Target:", end=" ", flush=True)
-    response_content = ""
-    for token in implicit_target_runnable.stream({"input": state["input"]}):
-        print(token, end="", flush=True)
-        response_content += token
-    print()
+    response_content = stream_agent(
+        implicit_target_runnable, {"input": state["input"]}, "Implicit Target", "implicit_target_identification"
+    )
     return {"target": response_content}
 
 def get_explicit_target(state):
-    print("Explicit Target:", end=" ", flush=True)
-    response_content = ""
-    for token in explicit_target_runnable.stream({"input": state["input"]}):
-        print(token, end="", flush=True)
-        response_content += token
-    print()
+    response_content = stream_agent(
+        explicit_target_runnable, {"input": state["input"]}, "Explicit Target", "explicit_target_identification"
+    )
     return {"target": response_content}
 
+def get_speculative_analysis(state):
+    """
+    Starts linguistic analysis and both target identifications at once, then keeps
+    the branch picked by decide_target_type and cancels the other one.
+    """
+    branches = {
+        "implicit_target_identification": (implicit_target_runnable, "Implicit Target"),
+        "explicit_target_identification": (explicit_target_runnable, "Explicit Target"),
+    }
+    cancel_events = {name: threading.Event() for name in branches}
+    pool = ThreadPoolExecutor(max_workers=len(branches) + 1)
+
+    def submit(fn, *args):
+        # Each thread needs its own copy of the context for LangGraph's stream writer
+        return pool.submit(contextvars.copy_context().run, fn, *args)
+
+    try:
+        linguistic_future = submit(get_linguistic_analysis, state)
+        target_futures = {
+            name: submit(stream_agent, runnable, {"input": state["input"]}, label, name, cancel_events[name])
+            for name, (runnable, label) in branches.items()
+        }
+
+        update = linguistic_future.result()
+        chosen = decide_target_type({**state, **update})
+        for name, future in target_futures.items():
+            if name != chosen:
+                cancel_events[name].set()
+                future.cancel()
+
+        return {**update, "target": target_futures[chosen].result()}
+    finally:
+        # Don't wait for the cancelled branch; it stops at its next token
+        pool.shutdown(wait=False)
+
 def get_target_info(state):
     """
     This is a placeholder function now that web search is removed.
@@ -89,20 +203,32 @@ def get_target_info(state):
     return {"target_info": "No external information available."}
 
 def debate_turn(state):
-    print(f"Debate Turn {len(state['debate_history']) + 1}:", end=" ", flush=True)
-    response_content = ""
-    # The debate agent now returns XML, so we handle it as a single string
-    for token in debate_runnable.stream(
-        {
+    label = f"Debate Turn {len(state['debate_history']) + 1}"
+    context = state.get("debate_context") if DEBATE_CONTEXT else None
+    if context:
+        # The context already holds the earlier turns' prompts and replies
+        runnable = debate_followup_runnable.first | debate_followup_runnable.last.bind(context=context)
+        inputs = {"target_info": state["target_info"]}
+    else:
+        runnable = debate_runnable
+        inputs = {
             "input": state["input"],
             "debate_history": "\n".join(state["debate_history"]),
             "target_info": state["target_info"], # Pass new info
         }
-    ):
-        print(token, end="", flush=True)
-        response_content += token
-    print()
-
+    generation_context = GenerationContext() if DEBATE_CONTEXT else None
+    # The debate agent now returns XML, so we handle it as a single string
+    response_content = stream_agent(
+        runnable, inputs, label, "debate", callbacks=[generation_context] if generation_context else None
+    )
+    update = parse_debate_response(state, response_content)
+    if generation_context is not None:
+        # Cached and early-stopped replies carry no context; the next turn then
+        # sends the full prompt again
+        update["debate_context"] = generation_context.context
+    return update
+
+def parse_debate_response(state, response_content):
     try:
         # Parse the XML response
         root = ET.fromstring(response_content)
@@ -112,6 +238,9 @@ def debate_turn(state):
             new_target_element = root.find("new_target")
             if new_target_element is not None and new_target_element.text:
                 new_target = new_target_element.text.strip()
+                if convergence_detector and convergence_detector.converged(state["target"], new_target):
+                    print(f"Debate converged: '{new_target}' is equivalent to the current target.")
+                    return {"debate_history": state["debate_history"] + [response_content], "debate_converged": True}
                 # When the target changes, we should probably re-run the fact check.
                 # For now, we just update the target and continue the debate.
                 return {"target": new_target, "debate_history": state["debate_history"] + [response_content]}
@@ -127,6 +256,9 @@ def debate_turn(state):
         return {"debate_history": state["debate_history"] + [response_content]}
 
 def continue_debate(state):
+    if state.get("debate_converged"):
+        return "stance_detection"
+
     # If the target was changed in the last turn, we should re-run fact-checking.
     last_response = state["debate_history"][-1]
     if "<new_target>" in last_response:
@@ -147,18 +279,14 @@ def continue_debate(state):
     return "debate"
 
 def get_stance(state):
-    print("Stance:", end=" ", flush=True)
     input_for_stance = f"Text: {state['input']}\nTarget: {state['target']}\nBackground Information: {state['target_info']}"
-    response_content = ""
-    for token in stance_runnable.stream({"input": input_for_stance}):
-        print(token, end="", flush=True)
-        response_content += token
-    print()
+    response_content = stream_agent(stance_runnable, {"input": input_for_stance}, "Stance", "stance_detection")
+    if DEBATE_CONTEXT:
+        # The debate is over; keep its context out of the saved result
+        return {"stance": response_content, "debate_context": None}
     return {"stance": response_content}
 
 def get_final_response(state):
-    print("Final Response:", end=" ", flush=True)
-
     input_dict = {
         "linguistic_analysis": state["linguistic_analysis"],
         "target": state["target"],
@@ -166,53 +294,64 @@ def get_final_response(state):
         "input": "",
     }
 
-    response_content = ""
-    for token in final_runnable.stream(input_dict):
-        print(token, end="", flush=True)
-        response_content += token
-    print()
+    response_content = stream_agent(final_runnable, input_dict, "Final Response", "final_response_generation")
     return {"final_response": response_content}
 
 
-workflow = StateGraph(AgentState)
+def build_workflow(speculative=False):
+    """
+    Compiles the stance graph. With `speculative=True` the linguistic analysis and
+    both target identifications run as one concurrent node.
+    """
+    workflow = StateGraph(AgentState)
 
-workflow.add_node("linguistic_analysis", get_linguistic_analysis)
-workflow.add_node("implicit_target_identification", get_implicit_target)
-workflow.add_node("explicit_target_identification", get_explicit_target)
-workflow.add_node("get_target_info", get_target_info) # New node
-workflow.add_node("debate", debate_turn)
-workflow.add_node("stance_detection", get_stance)
-workflow.add_node("final_response_generation", get_final_response)
+    workflow.add_node("get_target_info", get_target_info) # New node
+    workflow.add_node("debate", debate_turn)
+    workflow.add_node("stance_detection", get_stance)
+    workflow.add_node("final_response_generation", get_final_response)
 
-workflow.set_entry_point("linguistic_analysis")
+    if speculative:
+        workflow.add_node("speculative_analysis", get_speculative_analysis)
+        workflow.set_entry_point("speculative_analysis")
+        workflow.add_edge("speculative_analysis", "get_target_info")
+    else:
+        workflow.add_node("linguistic_analysis", get_linguistic_analysis)
+        workflow.add_node("implicit_target_identification", get_implicit_target)
+        workflow.add_node("explicit_target_identification", get_explicit_target)
 
-workflow.add_conditional_edges(
-    "linguistic_analysis",
-    decide_target_type,
-    {
-        "implicit_target_identification": "implicit_target_identification",
-        "explicit_target_identification": "explicit_target_identification",
-    },
-)
+        workflow.set_entry_point("linguistic_analysis")
 
-workflow.add_edge("implicit_target_identification", "get_target_info") # Edge to new node
-workflow.add_edge("explicit_target_identification", "get_target_info") # Edge to new node
-workflow.add_edge("get_target_info", "debate") # Edge from new node
-
-workflow.add_conditional_edges(
-    "debate",
-    continue_debate,
-    {
-        "stance_detection": "stance_detection",
-        "debate": "debate",
-        "get_target_info": "get_target_info", # Loop back if target changes
-    },
-)
+        workflow.add_conditional_edges(
+            "linguistic_analysis",
+            decide_target_type,
+            {
+                "implicit_target_identification": "implicit_target_identification",
+                "explicit_target_identification": "explicit_target_identification",
+            },
+        )
+
+        workflow.add_edge("implicit_target_identification", "get_target_info") # Edge to new node
+        workflow.add_edge("explicit_target_identification", "get_target_info") # Edge to new node
+
+    workflow.add_edge("get_target_info", "debate") # Edge from new node
+
+    workflow.add_conditional_edges(
+        "debate",
+        continue_debate,
+        {
+            "stance_detection": "stance_detection",
+            "debate": "debate",
+            "get_target_info": "get_target_info", # Loop back if target changes
+        },
+    )
+
+    workflow.add_edge("stance_detection", "final_response_generation")
+    workflow.add_edge("final_response_generation", END)
+
+    return workflow.compile()
 
-workflow.add_edge("stance_detection", "final_response_generation")
-workflow.add_edge("final_response_generation", END)
 
-app = workflow.compile()
+app = build_workflow(speculative=SPECULATIVE_BRANCHES)
 
 
 def main():
@@ -226,7 +365,9 @@ def main():
             print("-- Analysis --")
             # Set the initial target to an empty string
             initial_state = {"input": user_input, "target": "", "max_turns": 3}
-            app.invoke(initial_state)
+            usage = UsageTracker()
+            app.invoke(initial_state, config={"callbacks": [usage]})
+            print(f"Usage: {usage.summary()}")
             print("------------------")
 
         except KeyboardInterrupt:
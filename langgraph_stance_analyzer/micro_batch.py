@@ -0,0 +1,165 @@
+"""
+Micro-batching of concurrent LLM calls.
+
+With many graph runs in flight (bulk_process, the API's run executor) the same node
+sends one prompt per run. A MicroBatcher collects the prompts submitted within a
+short window (or until the batch is full) and hands them to a batch function in one
+call, then routes every result back to its caller.
+
+Enable it for the graph agents with MICRO_BATCH=1. A batch for an Ollama model is
+sent as concurrent requests, so the server schedules it together across its parallel
+slots (OLLAMA_NUM_PARALLEL). Any other LangChain LLM gets the whole batch in one
+`generate` call, which in-process backends such as HuggingFacePipeline run as a
+single forward batch; a custom `batch_fn` can replace either.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ensure_config
+from langchain_ollama.llms import OllamaLLM
+
+# --- Configuration ---
+MICRO_BATCH = os.environ.get("MICRO_BATCH", "0") == "1"
+MAX_BATCH_SIZE = int(os.environ.get("MICRO_BATCH_MAX_SIZE", 8))
+MAX_WAIT_MS = float(os.environ.get("MICRO_BATCH_MAX_WAIT_MS", 5))
+# Batches running at once; the next batch is collected while earlier ones run
+MAX_IN_FLIGHT = int(os.environ.get("MICRO_BATCH_MAX_IN_FLIGHT", 4))
+
+
+class MicroBatcher:
+    """
+    Runs `batch_fn(items) -> results` over items submitted from any thread or event
+    loop. A batch closes `max_wait_ms` after its first item or when it holds
+    `max_batch` items. Up to `max_in_flight` batches run at once, so a slow batch
+    does not hold up the ones collected after it. `batch_fn` may return an
+    Exception in place of a result to fail only that item.
+    """
+
+    def __init__(self, batch_fn, max_batch=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                 max_in_flight=MAX_IN_FLIGHT, name="micro-batch"):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_in_flight = max_in_flight
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._slots = threading.Semaphore(max_in_flight)
+        self._runner = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix=f"{name}-run")
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    async def asubmit(self, item):
+        return await asyncio.wrap_future(self.submit(item))
+
+    @property
+    def mean_batch_size(self):
+        return self.items / self.batches if self.batches else 0.0
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Wait for a free slot first, so items keep queueing into the next batch
+            self._slots.acquire()
+            batch = self._collect()
+            self.batches += 1
+            self.items += len(batch)
+            self._runner.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                results = [e] * len(items)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+
+class BatchedLLM(Runnable):
+    """
+    Wraps a LangChain LLM so that concurrent calls are grouped by a MicroBatcher.
+    A batched completion is streamed back as a single token. Attribute access falls
+    through to the wrapped LLM, so the cache keys on the same model and options.
+    """
+
+    def __init__(self, llm, batch_fn=None, max_batch=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.llm = llm
+        self._executor = None
+        if batch_fn is None and isinstance(llm, OllamaLLM):
+            # One thread per request of every batch in flight
+            self._executor = ThreadPoolExecutor(max_workers=max_batch * MAX_IN_FLIGHT,
+                                                thread_name_prefix="micro-batch-send")
+        self.batcher = MicroBatcher(batch_fn or self._batch, max_batch, max_wait_ms, name=f"micro-batch-{id(self):x}")
+
+    def __getattr__(self, name):
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def _batch(self, requests):
+        """Default batch_fn over (prompt, config) pairs."""
+        if self._executor is None:
+            prompts = [prompt for prompt, _ in requests]
+            return self.llm.batch(prompts, [config for _, config in requests], return_exceptions=True)
+        # OllamaLLM.generate runs prompts one after another; send them side by side instead
+        futures = [self._executor.submit(self.llm.invoke, prompt, config) for prompt, config in requests]
+        return [future.exception() or future.result() for future in futures]
+
+    def invoke(self, input, config=None, **kwargs):
+        if kwargs:
+            # Call-time parameters (e.g. an Ollama context) are per request; send it alone
+            return self.llm.invoke(input, config, **kwargs)
+        # Resolve the config here: the caller's callbacks (usage tracking) live in a
+        # context variable that the batch worker thread does not see
+        return self.batcher((input, ensure_config(config)))
+
+    def stream(self, input, config=None, **kwargs):
+        yield self.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        if kwargs:
+            return await self.llm.ainvoke(input, config, **kwargs)
+        return await self.batcher.asubmit((input, ensure_config(config)))
+
+    async def astream(self, input, config=None, **kwargs):
+        yield await self.ainvoke(input, config, **kwargs)
+
+
+def batched(llm, batch_fn=None):
+    """Wraps `llm` in a BatchedLLM when MICRO_BATCH is on (or a batch_fn is given)."""
+    if not MICRO_BATCH and batch_fn is None:
+        return llm
+    return BatchedLLM(llm, batch_fn)
@@ -0,0 +1,274 @@
+"""
+Shared HTTP transport for every Ollama caller (agents, chat CLI, evaluation scripts).
+
+Keeps pooled keep-alive connections per thread (sync) and per event loop (async),
+applies a timeout to every call and decodes the NDJSON stream line by line. Every
+request goes to the least-loaded backend of the pool configured by OLLAMA_HOSTS.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from langgraph_stance_analyzer.backend_pool import get_pool
+
+try:
+    # orjson is several times faster than the stdlib for the small per-token chunks
+    import orjson
+
+    _loads = orjson.loads
+    _JSONDecodeError = orjson.JSONDecodeError
+except ImportError:
+    import json
+
+    _loads = json.loads
+    _JSONDecodeError = json.JSONDecodeError
+
+# --- Configuration ---
+CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", 300))
+POOL_SIZE = int(os.environ.get("OLLAMA_POOL_SIZE", 32))
+
+# How long the server keeps the model (and its KV cache) loaded after a request.
+# Set PROMPT_REUSE=0 to fall back to the server default for before/after comparisons.
+PROMPT_REUSE = os.environ.get("PROMPT_REUSE", "1") != "0"
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m") if PROMPT_REUSE else None
+
+# Bytes read from the socket per iteration; requests defaults to 512, which means
+# several syscalls for a single chunk line of a long generation.
+STREAM_CHUNK_SIZE = 8192
+
+_local = threading.local()
+_async_clients = weakref.WeakKeyDictionary()
+pool = get_pool()
+
+
+class OllamaError(Exception):
+    """Raised when the Ollama API cannot be reached or returns an error."""
+
+
+def _url(backend, path):
+    return f"{backend.url}/{path.lstrip('/')}"
+
+
+def _requests_failure(e):
+    """Connection errors, timeouts and 5xx count against the backend; 4xx do not."""
+    if isinstance(e, requests.exceptions.HTTPError):
+        return e.response is None or e.response.status_code >= 500
+    return isinstance(e, requests.exceptions.RequestException)
+
+
+def _httpx_failure(e):
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, httpx.HTTPError)
+
+
+def _with_keep_alive(payload):
+    if KEEP_ALIVE is not None and "keep_alive" not in payload:
+        payload["keep_alive"] = KEEP_ALIVE
+    return payload
+
+
+def _timeout(timeout):
+    if timeout is None:
+        return (CONNECT_TIMEOUT, READ_TIMEOUT)
+    return timeout
+
+
+# --- Sync transport ---
+def get_session():
+    """Returns this thread's pooled keep-alive session."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+
+def post_json(path, payload, timeout=None):
+    """POSTs a non-streaming request and returns the decoded JSON body."""
+    payload = _with_keep_alive(dict(payload))
+
+    def send(backend):
+        response = get_session().post(_url(backend, path), json=payload, timeout=_timeout(timeout))
+        response.raise_for_status()
+        return _loads(response.content)
+
+    try:
+        return pool.call(send, _requests_failure)
+    except requests.exceptions.RequestException as e:
+        raise OllamaError(str(e)) from e
+
+
+def stream_ndjson(path, payload, timeout=None):
+    """
+    POSTs a streaming request and yields each decoded NDJSON chunk.
+    Closing the generator early closes the HTTP stream as well.
+    """
+    payload = _with_keep_alive(dict(payload, stream=True))
+
+    def open_stream(backend):
+        with get_session().post(
+            _url(backend, path), json=payload, stream=True, timeout=_timeout(timeout)
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(chunk_size=STREAM_CHUNK_SIZE):
+                if not line:
+                    continue
+                try:
+                    chunk = _loads(line)
+                except _JSONDecodeError:
+                    continue  # Ignore non-json lines
+                if "error" in chunk:
+                    raise OllamaError(chunk["error"])
+                yield chunk
+
+    try:
+        yield from pool.stream(open_stream, _requests_failure)
+    except requests.exceptions.RequestException as e:
+        raise OllamaError(str(e)) from e
+
+
+def stream_chat(model, messages, options=None, timeout=None, on_done=None, format=None):
+    """
+    Streams a chat completion and yields the content of each message chunk.
+    `on_done` receives the final chunk, which carries the timing and token counts.
+    `format` is "json" or a JSON schema that constrains the reply.
+    """
+    payload = {"model": model, "messages": messages}
+    if options:
+        payload["options"] = options
+    if format:
+        payload["format"] = format
+    for chunk in stream_ndjson("/api/chat", payload, timeout=timeout):
+        content = chunk.get("message", {}).get("content")
+        if content:
+            yield content
+        if chunk.get("done") and on_done is not None:
+            on_done(chunk)
+
+
+def generate(model, prompt, options=None, timeout=None):
+    """Runs a non-streaming completion and returns the response text."""
+    payload = {"model": model, "prompt": prompt, "stream": False}
+    if options:
+        payload["options"] = options
+    return post_json("/api/generate", payload, timeout=timeout).get("response", "")
+
+
+def embed(model, text, timeout=None):
+    """Returns the embedding vector for a single text."""
+    payload = {"model": model, "prompt": text}
+    return post_json("/api/embeddings", payload, timeout=timeout)["embedding"]
+
+
+# --- Async transport ---
+def get_async_client():
+    """Returns the pooled keep-alive client bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _async_timeout(timeout):
+    if timeout is None:
+        return httpx.USE_CLIENT_DEFAULT
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+async def apost_json(path, payload, timeout=None):
+    """Async variant of post_json."""
+    payload = _with_keep_alive(dict(payload))
+
+    async def send(backend):
+        response = await get_async_client().post(
+            _url(backend, path), json=payload, timeout=_async_timeout(timeout)
+        )
+        response.raise_for_status()
+        return _loads(response.content)
+
+    try:
+        return await pool.acall(send, _httpx_failure)
+    except httpx.HTTPError as e:
+        raise OllamaError(str(e)) from e
+
+
+async def astream_ndjson(path, payload, timeout=None):
+    """Async variant of stream_ndjson."""
+    payload = _with_keep_alive(dict(payload, stream=True))
+
+    async def open_stream(backend):
+        async with get_async_client().stream(
+            "POST", _url(backend, path), json=payload, timeout=_async_timeout(timeout)
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                try:
+                    chunk = _loads(line)
+                except _JSONDecodeError:
+                    continue
+                if "error" in chunk:
+                    raise OllamaError(chunk["error"])
+                yield chunk
+
+    try:
+        async for chunk in pool.astream(open_stream, _httpx_failure):
+            yield chunk
+    except httpx.HTTPError as e:
+        raise OllamaError(str(e)) from e
+
+
+async def astream_chat(model, messages, options=None, timeout=None, on_done=None, format=None):
+    """Async variant of stream_chat."""
+    payload = {"model": model, "messages": messages}
+    if options:
+        payload["options"] = options
+    if format:
+        payload["format"] = format
+    async for chunk in astream_ndjson("/api/chat", payload, timeout=timeout):
+        content = chunk.get("message", {}).get("content")
+        if content:
+            yield content
+        if chunk.get("done") and on_done is not None:
+            on_done(chunk)
+
+
+async def agenerate(model, prompt, options=None, timeout=None):
+    """Async variant of generate."""
+    payload = {"model": model, "prompt": prompt, "stream": False}
+    if options:
+        payload["options"] = options
+    return (await apost_json("/api/generate", payload, timeout=timeout)).get("response", "")
+
+
+async def aembed(model, text, timeout=None):
+    """Async variant of embed."""
+    payload = {"model": model, "prompt": text}
+    return (await apost_json("/api/embeddings", payload, timeout=timeout))["embedding"]
+
+
+async def aclose():
+    """Closes the async client bound to the running event loop."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,59 @@
+"""
+OllamaLLM that routes every generation through the backend pool.
+
+The stock OllamaLLM is bound to a single `base_url`; this subclass keeps one Ollama
+client per backend and sends each call to the least-loaded backend, failing over
+to another one if the chosen backend cannot be reached.
+"""
+
+import httpx
+from langchain_ollama.llms import OllamaLLM
+from ollama import AsyncClient, Client, ResponseError
+from pydantic import PrivateAttr
+
+from langgraph_stance_analyzer.backend_pool import get_pool
+
+
+def _ollama_failure(e):
+    """Unreachable hosts, timeouts and 5xx count against the backend; 4xx do not."""
+    if isinstance(e, ResponseError):
+        return e.status_code >= 500
+    return isinstance(e, (ConnectionError, httpx.HTTPError))
+
+
+class PooledOllamaLLM(OllamaLLM):
+    """Drop-in OllamaLLM whose requests are spread over the OLLAMA_HOSTS pool."""
+
+    # Clients per backend URL; shared by copies (bind_llm) of the same LLM
+    _backend_clients: dict = PrivateAttr(default_factory=dict)
+
+    def _clients_for(self, url):
+        clients = self._backend_clients.get(url)
+        if clients is None:
+            client_kwargs = self.client_kwargs or {}
+            clients = (
+                Client(host=url, **{**client_kwargs, **(self.sync_client_kwargs or {})}),
+                AsyncClient(host=url, **{**client_kwargs, **(self.async_client_kwargs or {})}),
+            )
+            self._backend_clients[url] = clients
+        return clients
+
+    def _create_generate_stream(self, prompt, stop=None, **kwargs):
+        params = self._generate_params(prompt, stop=stop, **kwargs)
+
+        def open_stream(backend):
+            client, _ = self._clients_for(backend.url)
+            return client.generate(**params)
+
+        yield from get_pool().stream(open_stream, _ollama_failure)
+
+    async def _acreate_generate_stream(self, prompt, stop=None, **kwargs):
+        params = self._generate_params(prompt, stop=stop, **kwargs)
+
+        async def open_stream(backend):
+            _, client = self._clients_for(backend.url)
+            async for part in await client.generate(**params):
+                yield part
+
+        async for part in get_pool().astream(open_stream, _ollama_failure):
+            yield part
@@ -0,0 +1,101 @@
+"""
+Append-only journal of per-row results for long bulk runs.
+
+Every finished row is appended as one JSON line, keyed by a hash of the row's
+input, and synced to disk before the next one is written. After a crash or Ctrl-C
+the run is started again: rows already in the journal are skipped, and the output
+file is materialized from the journal once every row is done.
+
+A journal can start with a header line describing the job (e.g. its input file and
+that file's hash); resuming with a different header is refused, so two jobs never
+pick up each other's rows.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+
+class JournalMismatchError(ValueError):
+    """The journal on disk was written for a different job."""
+
+
+def file_digest(path, block_size=1 << 20):
+    """sha256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_key(*fields):
+    """Stable key of a row's input fields; identical rows share a key (and a result)."""
+    return hashlib.sha256(json.dumps([str(field) for field in fields]).encode("utf-8")).hexdigest()
+
+
+class ResultsJournal:
+    """
+    JSON-lines file of {"key": ..., "record": {...}} entries; safe to append to
+    from several threads. A line cut off by a crash is dropped on load.
+    With `header`, the file starts with {"header": header}, and opening a journal
+    whose header differs raises JournalMismatchError.
+    """
+
+    def __init__(self, path, header=None):
+        self.path = path
+        self.header = header
+        self._lock = threading.Lock()
+        self.records = self._load()
+
+    def _load(self):
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                # A write cut off by a crash; drop it so the next append starts on a fresh line
+                print(f"[Warning] Dropping an incomplete last line from {self.path}")
+                data = data[:data.rfind(b"\n") + 1]
+                f.truncate(len(data))
+        lines = data.decode("utf-8").splitlines()
+        stored_header = json.loads(lines[0]).get("header") if lines else None
+        if self.header is not None and lines and stored_header != self.header:
+            raise JournalMismatchError(
+                f"{self.path} belongs to another job ({stored_header}); expected {self.header}")
+        for line in lines:
+            entry = json.loads(line)
+            if "key" in entry:
+                records[entry["key"]] = entry["record"]
+        return records
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, key, default=None):
+        return self.records.get(key, default)
+
+    def append(self, key, record):
+        line = json.dumps({"key": key, "record": record}, default=str) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                if self.header is not None and f.tell() == 0:
+                    line = json.dumps({"header": self.header}) + "\n" + line
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.records[key] = record
+
+    def reset(self):
+        """Forgets every recorded row, so the next run starts from scratch."""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.records = {}
+
@@ -0,0 +1,183 @@
+"""
+Semantic cache of agent results for near-duplicate inputs.
+
+Retweets and copy-pasted comments differ from an earlier post by a prefix, a link or
+a few characters, so an exact-match cache misses them. Each input is vectorized
+(an Ollama embedding by default, or hashed character n-grams) and compared with
+every cached input in one matrix product; the result of the most similar one is
+reused when its cosine similarity reaches the threshold.
+
+Entries expire after a TTL, and the least recently used entry is evicted once the
+cache is full. Inputs are only kept in memory, so nothing outlives those limits.
+Hits, misses and evictions are counted for the hit-rate metrics.
+"""
+
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from langgraph_stance_analyzer import ollama_transport
+from langgraph_stance_analyzer.similarity import normalize_rows
+from langgraph_stance_analyzer.target_index import NgramVectorizer
+
+# --- Configuration ---
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE", "0") == "1"
+# "embedding" or "ngram" (no model call)
+SEMANTIC_CACHE_VECTORIZER = os.environ.get("SEMANTIC_CACHE_VECTORIZER", "embedding")
+SEMANTIC_CACHE_EMBEDDING_MODEL = os.environ.get("SEMANTIC_CACHE_EMBEDDING_MODEL", "nomic-embed-text")
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.95))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", 86400))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 10000))
+
+# Retweet prefixes and links carry no stance; drop them before comparing inputs
+RETWEET_PREFIX = re.compile(r"^\s*rt\s+@\w+:?\s*", re.IGNORECASE)
+URL = re.compile(r"https?://\S+|www\.\S+")
+
+
+def normalize_input(text):
+    """Lowercased input without retweet prefix, links or repeated whitespace."""
+    text = URL.sub(" ", RETWEET_PREFIX.sub("", str(text)))
+    return " ".join(text.lower().split())
+
+
+class EmbeddingVectorizer:
+    """
+    Normalized Ollama embeddings, fetched per call. Unlike the target index's
+    vectorizer it does not use the persistent embedding store, which would keep
+    every user post on disk after its cache entry is gone.
+    """
+
+    def __init__(self, model=SEMANTIC_CACHE_EMBEDDING_MODEL):
+        self.model = model
+
+    def transform(self, texts):
+        vectors = [ollama_transport.embed(self.model, text) for text in texts]
+        return normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+
+def get_vectorizer(kind=SEMANTIC_CACHE_VECTORIZER):
+    if kind == "embedding":
+        return EmbeddingVectorizer()
+    return NgramVectorizer()
+
+
+class SemanticCache:
+    """
+    In-memory similarity cache: a (max_entries, dim) matrix of normalized input
+    vectors plus the cached value of each row. Safe to use from several threads.
+    """
+
+    def __init__(self, vectorizer=None, threshold=SEMANTIC_CACHE_THRESHOLD,
+                 ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS, max_entries=SEMANTIC_CACHE_MAX_ENTRIES):
+        self.vectorizer = vectorizer or get_vectorizer()
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {"ttl": 0, "capacity": 0}
+        # Guards the matrix and counters only; inputs are vectorized outside it
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._values = [None] * max_entries
+        self._created = np.zeros(max_entries)
+        self._last_used = np.zeros(max_entries)
+        self._occupied = np.zeros(max_entries, dtype=bool)
+
+    def __len__(self):
+        return int(self._occupied.sum())
+
+    def _vectorize(self, text):
+        return self.vectorizer.transform([normalize_input(text)])[0]
+
+    def _expire(self, now):
+        expired = self._occupied & (self._created <= now - self.ttl)
+        if expired.any():
+            self._occupied[expired] = False
+            for slot in np.flatnonzero(expired):
+                self._values[slot] = None
+            self.evictions["ttl"] += int(expired.sum())
+
+    def lookup(self, text):
+        """
+        Returns (value, similarity) of the most similar live entry, or (None, best
+        similarity) when none reaches the threshold. A failed vectorization is a miss.
+        """
+        try:
+            vector = self._vectorize(text)
+        except Exception as e:
+            print(f"[Warning] Semantic cache lookup failed: {e}")
+            vector = None
+
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            if vector is None or not vector.any() or self._vectors is None or not self._occupied.any():
+                self.misses += 1
+                return None, 0.0
+            scores = np.where(self._occupied, self._vectors @ vector, -np.inf)
+            slot = int(scores.argmax())
+            similarity = float(scores[slot])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None, similarity
+            self.hits += 1
+            self._last_used[slot] = now
+            return self._values[slot], similarity
+
+    def add(self, text, value):
+        """Caches `value` for `text`, evicting the least recently used entry when full."""
+        try:
+            vector = self._vectorize(text)
+        except Exception as e:
+            print(f"[Warning] Semantic cache insert failed: {e}")
+            return
+        if not vector.any():
+            return
+
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            free = np.flatnonzero(~self._occupied)
+            if len(free):
+                slot = int(free[0])
+            else:
+                slot = int(self._last_used.argmin())
+                self.evictions["capacity"] += 1
+            self._vectors[slot] = vector
+            self._values[slot] = value
+            self._created[slot] = self._last_used[slot] = now
+            self._occupied[slot] = True
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "evictions": dict(self.evictions),
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_semantic_cache():
+    """Returns the process-wide semantic cache, or None unless SEMANTIC_CACHE=1."""
+    global _default_cache
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SemanticCache()
+    return _default_cache
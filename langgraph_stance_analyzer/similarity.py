@@ -0,0 +1,44 @@
+"""
+Vectorized cosine similarity between ground-truth targets and candidate targets.
+
+Instead of one `cosine_sim` call per pair, a whole chunk of rows is scored with a
+couple of NumPy matrix operations.
+"""
+
+import numpy as np
+
+
+def normalize_rows(matrix):
+    """L2-normalizes the last axis; all-zero vectors stay zero instead of becoming NaN."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def best_matches(gt_matrix, candidate_matrix):
+    """
+    Scores every row's candidates against that row's ground truth.
+
+    gt_matrix: (N, D) ground-truth embeddings.
+    candidate_matrix: (N, K, D) embeddings of the K candidates of each row.
+
+    Returns (similarities (N, K), best_index (N,), best_score (N,)).
+    """
+    gt = normalize_rows(gt_matrix)
+    candidates = normalize_rows(candidate_matrix)
+    similarities = np.einsum("nd,nkd->nk", gt, candidates)
+    best_index = similarities.argmax(axis=1)
+    best_score = similarities[np.arange(len(similarities)), best_index]
+    return similarities, best_index, best_score
+
+
+def iter_chunks(iterable, size):
+    """Yields lists of up to `size` items, so a file can be scored one chunk at a time."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,147 @@
+"""
+Schema-constrained structured output.
+
+With STRUCTURED_OUTPUT=1 every agent is generated with Ollama's `format` set to a
+JSON schema, so replies carry no preamble and always parse. Free-text fields have a
+`maxLength` and `num_predict` is sized to the longest valid reply, so the cap bounds
+a runaway generation without truncating the JSON. `to_text` turns a reply back into the plain text or XML that the graph's
+nodes (and the run parsers downstream) already consume.
+"""
+
+import json
+import os
+from xml.sax.saxutils import escape
+
+STRUCTURED_OUTPUT = os.environ.get("STRUCTURED_OUTPUT", "0") == "1"
+
+STANCES = ["positive", "negative", "neutral"]
+SIMPLE_STANCES = ["FAVOR", "AGAINST", "NEUTRAL"]
+
+
+def _object(properties, required=None):
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": required if required is not None else list(properties),
+    }
+
+
+def _text(max_length):
+    """A free-text field; the length bound lets the generation cap fit the reply."""
+    return {"type": "string", "maxLength": max_length}
+
+
+TARGET = _text(100)
+# Whitespace the grammar allows around each key and value
+WHITESPACE_SLACK = 8
+
+
+def num_predict_for(schema):
+    """
+    Generation cap (in tokens) for a schema: the longest valid reply counted as one
+    token per character, so the cap can never cut a reply off before the JSON closes.
+    Generation normally ends much earlier, when the object is complete.
+    """
+    tokens = 2  # braces
+    for name, field in schema["properties"].items():
+        if "enum" in field:
+            value = max(len(json.dumps(option)) for option in field["enum"])
+        elif field.get("type") == "boolean":
+            value = len("false")
+        else:
+            value = field["maxLength"] + 2  # quotes
+        tokens += len(json.dumps(name)) + 2 + value + WHITESPACE_SLACK  # colon and comma
+    return tokens
+
+
+# Schema of each agent; free-text fields are bounded so num_predict_for can size the cap
+AGENT_SCHEMAS = {
+    "linguistic": _object({"analysis": _text(600)}),
+    "implicit_target": _object({"target": TARGET}),
+    "explicit_target": _object({"target": TARGET}),
+    "target_decider": _object({"target_type": {"enum": ["explicit", "implicit"]}}),
+    "debate": _object(
+        {"agree": {"type": "boolean"}, "new_target": TARGET, "justification": _text(200)},
+        required=["agree"],
+    ),
+    "stance": _object({"stance": {"enum": STANCES}}),
+    "final": _object({"target": TARGET, "stance": {"enum": STANCES}}),
+    # Simple agents
+    "simple_targets": _object({"target1": TARGET, "target2": TARGET, "target3": TARGET}),
+    "simple_stance": _object({"stance": {"enum": SIMPLE_STANCES}}),
+}
+
+
+def schema_for(agent):
+    """Returns (schema, num_predict) for an agent, or (None, None) when not constrained."""
+    if not STRUCTURED_OUTPUT or agent not in AGENT_SCHEMAS:
+        return None, None
+    schema = AGENT_SCHEMAS[agent]
+    return schema, num_predict_for(schema)
+
+
+def ollama_options(agent):
+    """Top-level `format` and `options` for a raw Ollama request of the given agent."""
+    schema, num_predict = schema_for(agent)
+    if schema is None:
+        return None, None
+    return schema, {"num_predict": num_predict}
+
+
+def prompt_suffix(agent):
+    """Instruction appended to the system prompt so the model knows the expected shape."""
+    schema, _ = schema_for(agent)
+    if schema is None:
+        return ""
+    return (
+        "\n\nRespond ONLY with a JSON object matching this schema, "
+        "ignoring any other output format described above:\n" + json.dumps(schema)
+    )
+
+
+def bind_llm(llm, agent):
+    """Returns a copy of a LangChain Ollama LLM constrained to the agent's schema."""
+    schema, num_predict = schema_for(agent)
+    if schema is None:
+        return llm
+    # model_copy skips validation, which would reject a schema for `format`
+    return llm.model_copy(update={"format": schema, "num_predict": num_predict})
+
+
+def _xml(tag, **fields):
+    inner = "".join(f"<{name}>{escape(str(value))}</{name}>" for name, value in fields.items())
+    return f"<{tag}>{inner}</{tag}>"
+
+
+def to_text(agent, response):
+    """
+    Converts a structured reply to the text the node would have produced without
+    structured output. Unparseable or unconstrained replies are returned unchanged.
+    """
+    schema, _ = schema_for(agent)
+    if schema is None:
+        return response
+    try:
+        data = json.loads(response)
+    except (json.JSONDecodeError, TypeError):
+        return response
+    if not isinstance(data, dict):
+        return response
+
+    if agent == "debate":
+        if data.get("agree") is True:
+            return _xml("response", agree="true")
+        if not data.get("new_target"):
+            return _xml("response", agree="false")
+        return _xml(
+            "response",
+            agree="false",
+            new_target=data["new_target"],
+            justification=data.get("justification", ""),
+        )
+    if agent == "final":
+        return _xml("response", target=data.get("target", ""), stance=data.get("stance", ""))
+
+    # Single-field agents become that field's value
+    field = next(iter(schema["properties"]))
+    return str(data.get(field, response))
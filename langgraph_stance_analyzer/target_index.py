@@ -0,0 +1,281 @@
+"""
+Nearest-canonical-target index.
+
+Predicted targets are free text ("Facebook's Role in Cheating") while the ground
+truth uses short topics ("facebook"). The index holds every known ground-truth
+target and maps a batch of predictions to their closest canonical targets with a
+few matrix products, without an LLM call.
+
+Targets are vectorized by `NgramVectorizer` (hashed character n-grams and content
+words, TF-IDF weighted; no model needed) or `EmbeddingVectorizer` (embeddings from
+the persistent store). Search is an inverted-file index: the vectors are clustered
+with spherical k-means and a query is only scored against the members of its
+`nprobe` closest clusters. Small indexes are searched exhaustively.
+
+Usage:
+    python langgraph_stance_analyzer/target_index.py "Facebook's Role in Cheating" "gun laws" -k 3
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+import threading
+import zlib
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from langgraph_stance_analyzer import ollama_transport
+from langgraph_stance_analyzer.convergence import target_tokens
+from langgraph_stance_analyzer.dataset_io import CHUNK_SIZE, read_chunks
+from langgraph_stance_analyzer.dataset_store import resolve_columns
+from langgraph_stance_analyzer.embedding_store import EmbeddingStore
+from langgraph_stance_analyzer.similarity import normalize_rows
+
+# --- Configuration ---
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Files whose ground-truth targets make up the canonical vocabulary (globs, relative to the repo root)
+TARGET_SOURCES = [
+    "processed_data/merged_train_dataset.csv",
+    "processed_data/test_*.csv",
+]
+# "ngram" or "embedding"
+TARGET_INDEX_VECTORIZER = os.environ.get("TARGET_INDEX_VECTORIZER", "ngram")
+TARGET_INDEX_EMBEDDING_MODEL = os.environ.get("TARGET_INDEX_EMBEDDING_MODEL", "nomic-embed-text")
+# Hashed feature dimension of the n-gram vectorizer
+NGRAM_DIM = int(os.environ.get("TARGET_INDEX_DIM", 2048))
+NGRAM_SIZE = 3
+# Content words count this many times as much as a single character n-gram
+WORD_WEIGHT = 2.0
+# Clusters scored per query; indexes with fewer than EXACT_BELOW targets are searched exhaustively
+NPROBE = int(os.environ.get("TARGET_INDEX_NPROBE", 8))
+EXACT_BELOW = 4096
+# Queries scored at once, bounding the (queries x cluster members) score matrix
+QUERY_BLOCK = 1024
+KMEANS_ITERATIONS = 10
+
+
+def normalize_target(text):
+    """Lowercase, whitespace-collapsed form used to deduplicate targets."""
+    return " ".join(str(text).lower().split())
+
+
+def load_canonical_targets(sources=TARGET_SOURCES):
+    """Distinct ground-truth targets of the source files, in first-seen order."""
+    targets = {}
+    for pattern in sources:
+        paths = sorted(glob.glob(os.path.join(ROOT_DIR, pattern)))
+        if not paths:
+            print(f"[Warning] No target source matches {pattern}")
+        for path in paths:
+            column = None
+            for chunk in read_chunks(path, CHUNK_SIZE):
+                if column is None and chunk:
+                    column = resolve_columns(list(chunk[0]))["target"]
+                for row in chunk:
+                    target = (row.get(column) or "").strip()
+                    if target:
+                        targets.setdefault(normalize_target(target), target)
+    return list(targets.values())
+
+
+class NgramVectorizer:
+    """
+    Hashed bag of character n-grams (over word-padded, lowercased text) and content
+    words, weighted by their IDF over the indexed targets and L2-normalized.
+    """
+
+    def __init__(self, dim=NGRAM_DIM, ngram=NGRAM_SIZE, word_weight=WORD_WEIGHT):
+        self.dim = dim
+        self.ngram = ngram
+        self.word_weight = word_weight
+        self.idf = np.ones(dim, dtype=np.float32)
+
+    def _features(self, text):
+        """(bucket, weight) lists of one text's n-grams and content words."""
+        padded = " " + " ".join(re.findall(r"[a-z0-9]+", str(text).lower())) + " "
+        grams = [padded[i:i + self.ngram] for i in range(len(padded) - self.ngram + 1)]
+        words = [f"w:{word}" for word in target_tokens(str(text))]
+        buckets = [zlib.crc32(feature.encode("utf-8")) % self.dim for feature in grams + words]
+        weights = [1.0] * len(grams) + [self.word_weight] * len(words)
+        return buckets, weights
+
+    def _counts(self, texts):
+        rows, buckets, weights = [], [], []
+        for row, text in enumerate(texts):
+            text_buckets, text_weights = self._features(text)
+            rows.extend([row] * len(text_buckets))
+            buckets.extend(text_buckets)
+            weights.extend(text_weights)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.int64), np.asarray(buckets, dtype=np.int64)),
+                  np.asarray(weights, dtype=np.float32))
+        return matrix
+
+    def fit(self, texts):
+        """Learns the IDF of each bucket from the targets being indexed."""
+        document_frequency = (self._counts(texts) > 0).sum(axis=0)
+        self.idf = np.log((1 + len(texts)) / (1 + document_frequency)).astype(np.float32) + 1
+        return self
+
+    def transform(self, texts):
+        return normalize_rows(self._counts(texts) * self.idf)
+
+
+class EmbeddingVectorizer:
+    """Normalized embeddings from the persistent store; new texts are embedded once."""
+
+    def __init__(self, model=TARGET_INDEX_EMBEDDING_MODEL):
+        self.model = model
+        self.store = EmbeddingStore(model)
+
+    def fit(self, texts):
+        return self
+
+    def transform(self, texts):
+        return normalize_rows(self.store.get_or_compute(
+            [str(text) for text in texts], lambda text: ollama_transport.embed(self.model, text)))
+
+
+def get_vectorizer(kind=TARGET_INDEX_VECTORIZER):
+    if kind == "embedding":
+        return EmbeddingVectorizer()
+    return NgramVectorizer()
+
+
+def spherical_kmeans(vectors, n_clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    """Cluster id per (L2-normalized) vector and the (n_clusters, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)]
+    for _ in range(iterations):
+        assignment = (vectors @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        # Empty clusters keep their old centroid
+        filled = np.bincount(assignment, minlength=n_clusters) > 0
+        centroids[filled] = normalize_rows(sums[filled])
+    return (vectors @ centroids.T).argmax(axis=1), centroids
+
+
+class TargetIndex:
+    """
+    Approximate nearest-neighbour index over canonical targets.
+    `query` takes a batch of texts and returns their top-k targets by cosine similarity.
+    """
+
+    def __init__(self, targets, vectorizer=None, n_clusters=None, nprobe=NPROBE):
+        self.targets = list(targets)
+        self.vectorizer = (vectorizer or get_vectorizer()).fit(self.targets)
+        vectors = self.vectorizer.transform(self.targets)
+
+        if n_clusters is None:
+            n_clusters = 1 if len(self.targets) < EXACT_BELOW else int(np.sqrt(len(self.targets)))
+        self.n_clusters = max(1, min(n_clusters, len(self.targets)))
+        self.nprobe = min(nprobe, self.n_clusters)
+        if self.n_clusters == 1:
+            assignment = np.zeros(len(self.targets), dtype=np.int64)
+            self.centroids = normalize_rows(vectors.sum(axis=0, keepdims=True))
+        else:
+            assignment, self.centroids = spherical_kmeans(vectors, self.n_clusters)
+
+        # Members of each cluster are contiguous: cluster c is columns offsets[c]:offsets[c + 1].
+        # Stored feature-major so a query only reads the rows of the features it has.
+        self.order = np.argsort(assignment, kind="stable")
+        self.vectors_t = np.ascontiguousarray(vectors[self.order].T)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=self.n_clusters))])
+
+    @classmethod
+    def from_datasets(cls, sources=TARGET_SOURCES, **kwargs):
+        return cls(load_canonical_targets(sources), **kwargs)
+
+    def __len__(self):
+        return len(self.targets)
+
+    def query(self, texts, k=1):
+        """
+        Top-k canonical targets of each text. Returns (indices, scores), both (len(texts), k),
+        best first; indices point into `targets` and are -1 where fewer than k were found
+        (e.g. for empty texts).
+        """
+        k = min(k, len(self.targets))
+        queries = self.vectorizer.transform(list(texts))
+        blocks = [self._query_block(queries[i:i + QUERY_BLOCK], k) for i in range(0, len(queries), QUERY_BLOCK)]
+        if not blocks:
+            return np.zeros((0, k), dtype=np.int64), np.zeros((0, k), dtype=np.float32)
+        indices, scores = (np.concatenate(parts) for parts in zip(*blocks))
+        return indices, scores
+
+    def _query_block(self, queries, k):
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        if self.n_clusters == 1:
+            probes = np.zeros((len(queries), 1), dtype=np.int64)
+        else:
+            probes = np.argpartition(-(queries @ self.centroids.T), self.nprobe - 1, axis=1)[:, :self.nprobe]
+        # Features that are zero in every query of the block add nothing to the scores
+        features = np.flatnonzero(queries.any(axis=0))
+        queries = queries[:, features]
+
+        for cluster in np.unique(probes):
+            start, stop = self.offsets[cluster], self.offsets[cluster + 1]
+            if start == stop:
+                continue
+            rows = np.flatnonzero((probes == cluster).any(axis=1)) if self.n_clusters > 1 else slice(None)
+            # Top k within the cluster, then merged with the best found so far
+            scores = queries[rows] @ self.vectors_t[features, start:stop]
+            top = np.argpartition(-scores, min(k, stop - start) - 1, axis=1)[:, :k]
+            scores = np.concatenate([best_scores[rows], np.take_along_axis(scores, top, axis=1)], axis=1)
+            candidates = np.concatenate([best_rows[rows], top + start], axis=1)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores[rows] = np.take_along_axis(scores, top, axis=1)
+            best_rows[rows] = np.take_along_axis(candidates, top, axis=1)
+
+        ranking = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, ranking, axis=1)
+        best_rows = np.take_along_axis(best_rows, ranking, axis=1)
+        # An all-zero query vector (no features) matches nothing
+        empty = ~queries.any(axis=1)
+        best_rows[empty] = -1
+        best_scores[empty] = 0.0
+        indices = np.where(best_rows >= 0, self.order[np.maximum(best_rows, 0)], -1)
+        return indices, np.where(indices >= 0, best_scores, 0.0)
+
+    def nearest(self, texts, k=1):
+        """For each text, a list of up to k (canonical target, score) pairs, best first."""
+        indices, scores = self.query(texts, k)
+        return [
+            [(self.targets[index], float(score)) for index, score in zip(row_indices, row_scores) if index >= 0]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+    def canonicalize(self, text):
+        """The closest canonical target of one text and its score, or (None, 0.0)."""
+        matches = self.nearest([text])[0]
+        return matches[0] if matches else (None, 0.0)
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_default_index():
+    """Returns the process-wide index over TARGET_SOURCES, built on first use."""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = TargetIndex.from_datasets()
+    return _default_index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Map free-text targets to their nearest canonical targets.")
+    parser.add_argument("texts", nargs="+", help="Predicted targets to look up.")
+    parser.add_argument("-k", type=int, default=3, help="Matches per text.")
+    args = parser.parse_args()
+
+    index = get_default_index()
+    print(f"{len(index)} canonical targets in {index.n_clusters} cluster(s)")
+    for text, matches in zip(args.texts, index.nearest(args.texts, args.k)):
+        print(f"{text!r}: " + ", ".join(f"{target!r} ({score:.3f})" for target, score in matches))
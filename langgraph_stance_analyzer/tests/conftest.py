@@ -0,0 +1,19 @@
+import pytest
+
+
+class Clock:
+    """Stands in for `time.time` so tests can move time forward."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch, clocked_module):
+    """Patches `time.time` as seen by `clocked_module`, which each test module provides."""
+    clock = Clock()
+    monkeypatch.setattr(clocked_module.time, "time", clock.time)
+    return clock
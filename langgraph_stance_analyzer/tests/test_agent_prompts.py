@@ -0,0 +1,27 @@
+import glob
+import os
+
+from langgraph_stance_analyzer.agents.agents import PLACEHOLDER, PROMPTS_DIR, split_prompt
+
+
+def test_variable_sections_move_after_static_text():
+    static, dynamic = split_prompt(
+        "Intro.\n\n**Text:**\n{input}\n\n**Info:**\n{target_info}\n\nAnswer in one word."
+    )
+    assert static == "Intro.\n\nAnswer in one word."
+    assert dynamic == "**Text:**\n{input}\n\n**Info:**\n{target_info}"
+
+
+def test_prompt_without_variables_stays_whole():
+    assert split_prompt("Analyze the text.") == ("Analyze the text.", None)
+
+
+def test_escaped_braces_are_not_variables():
+    assert split_prompt('Reply with `{{"agree": true}}`.')[1] is None
+
+
+def test_static_part_of_every_prompt_has_no_variables():
+    for path in glob.glob(os.path.join(PROMPTS_DIR, "*.md")):
+        with open(path, "r") as f:
+            static, _ = split_prompt(f.read())
+        assert not PLACEHOLDER.search(static), os.path.basename(path)
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from langgraph_stance_analyzer.backend_pool import BackendPool
+
+
+class BackendDown(Exception):
+    pass
+
+
+def is_failure(e):
+    return isinstance(e, BackendDown)
+
+
+def items(*values):
+    """A closable stream, like the Ollama client's."""
+    yield from values
+
+
+def outstanding(pool):
+    return [backend.outstanding for backend in pool.backends]
+
+
+def test_stream_fails_over_when_opening_raises():
+    pool = BackendPool(["http://a", "http://b"])
+    opened = []
+
+    def open_stream(backend):
+        opened.append(backend.url)
+        if len(opened) == 1:
+            raise BackendDown()
+        return items("x", "y")
+
+    assert list(pool.stream(open_stream, is_failure)) == ["x", "y"]
+    assert len(opened) == 2
+    assert outstanding(pool) == [0, 0]
+    assert sorted(backend.consecutive_failures for backend in pool.backends) == [0, 1]
+
+
+def test_stream_releases_lease_when_opening_raises_other_errors():
+    pool = BackendPool(["http://a"])
+
+    def open_stream(backend):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        list(pool.stream(open_stream, is_failure))
+    assert outstanding(pool) == [0]
+
+
+def test_stream_releases_lease_when_consumer_stops_early():
+    pool = BackendPool(["http://a"])
+    stream = pool.stream(lambda backend: items("x", "y", "z"), is_failure)
+    assert next(stream) == "x"
+    stream.close()
+    assert outstanding(pool) == [0]
+
+
+def test_astream_releases_lease_when_opening_raises():
+    pool = BackendPool(["http://a", "http://b"])
+
+    def open_stream(backend):
+        raise BackendDown()
+
+    async def consume():
+        return [item async for item in pool.astream(open_stream, is_failure)]
+
+    with pytest.raises(BackendDown):
+        asyncio.run(consume())
+    assert outstanding(pool) == [0, 0]
@@ -0,0 +1,68 @@
+import importlib
+
+import pytest
+
+from langgraph_stance_analyzer import convergence
+from langgraph_stance_analyzer.convergence import ConvergenceDetector, get_detector, string_similarity, target_tokens
+
+
+def test_target_tokens_drop_possessives_and_filler():
+    assert target_tokens("The Role of Facebook's Ads") == {"facebook", "ads"}
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Facebook's role", "the role of Facebook"),
+    ("Gun Control", "gun control"),
+    ("climate change", "Climate   change"),
+])
+def test_equivalent_targets_score_one(a, b):
+    assert string_similarity(a, b) == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Facebook", "Facebook's Role in Cheating"),
+    ("climate change", "climate change denial"),
+    ("free speech", "speech"),
+])
+def test_narrowing_by_one_word_converges_by_default(a, b):
+    assert get_detector("string").converged(a, b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Facebook", "Facebook privacy and election ads"),
+    ("gun control", "gun rights"),
+    ("gun control", "abortion"),
+])
+def test_broader_changes_or_different_targets_do_not_converge(a, b):
+    assert not get_detector("string").converged(a, b)
+
+
+def test_threshold_override(monkeypatch):
+    monkeypatch.setenv("DEBATE_CONVERGENCE_THRESHOLD", "0.9")
+    detector = importlib.reload(convergence).get_detector("string")
+    monkeypatch.delenv("DEBATE_CONVERGENCE_THRESHOLD")
+    importlib.reload(convergence)
+    assert detector.threshold == 0.9
+    assert not detector.converged("Facebook", "Facebook's Role in Cheating")
+
+
+def test_similarity_is_symmetric():
+    pairs = [("climate change", "climate change denial"), ("the", "them"), ("free speech", "speech")]
+    for a, b in pairs:
+        assert string_similarity(a, b) == string_similarity(b, a)
+
+
+def test_detector_handles_empty_targets_and_failures():
+    detector = ConvergenceDetector()
+    assert detector.converged("gun control", "Gun control")
+    assert not detector.converged("", "gun control")
+
+    def broken(a, b):
+        raise RuntimeError("backend down")
+
+    assert not ConvergenceDetector(broken).converged("a", "a")
+
+
+def test_off_by_default(monkeypatch):
+    monkeypatch.delenv("DEBATE_CONVERGENCE", raising=False)
+    assert importlib.reload(convergence).get_detector() is None
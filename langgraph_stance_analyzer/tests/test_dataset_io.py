@@ -0,0 +1,45 @@
+import pyarrow as pa
+import pytest
+
+from langgraph_stance_analyzer.dataset_io import PredictionWriter, iter_rows, read_chunks
+
+ROWS = [{"post": f"post {i}", "label": str(i % 3)} for i in range(25)]
+
+
+def write_arrow(path, rows, batch_rows):
+    table = pa.Table.from_pylist(rows)
+    with pa.ipc.new_file(str(path), table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            writer.write_batch(batch)
+
+
+@pytest.fixture(params=[".csv", ".jsonl", ".parquet", ".arrow"])
+def dataset(request, tmp_path):
+    path = tmp_path / f"rows{request.param}"
+    if request.param == ".arrow":
+        write_arrow(path, ROWS, batch_rows=10)
+    else:
+        with PredictionWriter(str(path)) as writer:
+            for row in ROWS:
+                writer.write(row)
+    return str(path)
+
+
+def test_chunks_cover_every_row_in_order(dataset):
+    chunks = list(read_chunks(dataset, 4))
+    assert all(len(chunk) <= 4 for chunk in chunks)
+    assert [row for chunk in chunks for row in chunk] == ROWS
+
+
+def test_range_and_sample_match_across_formats(dataset):
+    assert [position for position, _ in iter_rows(dataset, start=5, stop=12)] == list(range(5, 12))
+    sampled = [position for position, _ in iter_rows(dataset, sample=0.5, seed=3, chunk_size=4)]
+    # The draw depends on the row index only, not on the chunking
+    assert sampled == [position for position, _ in iter_rows(dataset, sample=0.5, seed=3, chunk_size=7)]
+
+
+def test_arrow_columns_are_projected(tmp_path):
+    path = tmp_path / "rows.arrow"
+    write_arrow(path, ROWS, batch_rows=10)
+    rows = [row for chunk in read_chunks(str(path), 6, columns=["label"]) for row in chunk]
+    assert rows == [{"label": row["label"]} for row in ROWS]
@@ -0,0 +1,61 @@
+import csv
+import os
+
+import pytest
+
+from langgraph_stance_analyzer.dataset_io import iter_rows
+from langgraph_stance_analyzer.dataset_store import DatasetStore, resolve_columns
+
+
+def write_source(path, rows, fieldnames=("post", "new_topic", "label", "seen?")):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+ROWS = [{"post": f" post {i} ", "new_topic": f"topic {i % 4}", "label": str(i % 3), "seen?": "y"} for i in range(12)]
+
+
+def test_columns_resolve_to_standard_names():
+    assert resolve_columns(["Tweet", "GT Target", "GT Stance"]) == {
+        "tweet": "Tweet", "target": "GT Target", "stance": "GT Stance"}
+    assert resolve_columns(["TEXT", "target", "LABEL"]) == {"tweet": "TEXT", "target": "target", "stance": "LABEL"}
+    with pytest.raises(KeyError):
+        resolve_columns(["post", "label"])
+
+
+def test_add_converts_and_load_slices(tmp_path):
+    source = tmp_path / "source.csv"
+    write_source(source, ROWS)
+    store = DatasetStore(str(tmp_path / "store"))
+    entry = store.add("vast", "test", str(source), extra_columns=["seen?"])
+
+    assert entry["rows"] == 12 and entry["columns"] == ["tweet", "target", "stance", "seen?"]
+    table = store.load("vast", "test", columns=["tweet", "stance"], start=3, stop=6)
+    assert table.to_pylist() == [{"tweet": f"post {i}", "stance": str(i % 3)} for i in range(3, 6)]
+    batches = list(store.iter_batches("vast", "test", batch_size=5))
+    assert [batch.num_rows for batch in batches] == [5, 5, 2]
+    # The split is readable like any other input file
+    assert [row["target"] for _, row in iter_rows(store.path("vast", "test"))] == [row["new_topic"] for row in ROWS]
+
+
+def test_unchanged_source_is_not_converted_again(tmp_path):
+    source = tmp_path / "source.csv"
+    write_source(source, ROWS)
+    store = DatasetStore(str(tmp_path / "store"))
+    store.add("vast", "test", str(source))
+    built_at = os.stat(store.path("vast", "test")).st_mtime_ns
+
+    assert store.is_current("vast", "test", str(source))
+    store.add("vast", "test", str(source))
+    assert os.stat(store.path("vast", "test")).st_mtime_ns == built_at
+
+    write_source(source, ROWS[:5])
+    assert not store.is_current("vast", "test", str(source))
+    assert store.add("vast", "test", str(source))["rows"] == 5
+
+
+def test_missing_split_raises(tmp_path):
+    with pytest.raises(KeyError):
+        DatasetStore(str(tmp_path)).load("nope", "test")
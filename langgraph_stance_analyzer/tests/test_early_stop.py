@@ -0,0 +1,47 @@
+from langgraph_stance_analyzer.early_stop import EarlyStopParser
+
+
+def feed_all(parser, tokens):
+    """Feeds tokens until the parser reports completion; returns how many it took."""
+    for count, token in enumerate(tokens, 1):
+        if parser.feed(token):
+            return count
+    return None
+
+
+def test_xml_completes_at_closing_tag_split_across_tokens():
+    parser = EarlyStopParser()
+    tokens = ["Sure! ", "<resp", "onse><agree>true</agree></res", "ponse>", " Because..."]
+    assert feed_all(parser, tokens) == 4
+    assert parser.kind == "xml"
+    assert parser.payload == "<response><agree>true</agree></response>"
+    assert parser.value.find("agree").text == "true"
+
+
+def test_json_ignores_braces_inside_strings():
+    parser = EarlyStopParser()
+    tokens = ["```json\n", '{"target": "a } b', ' \\" {", "nested": {"x": 1}', "}", "\n```"]
+    assert feed_all(parser, tokens) == 4
+    assert parser.value == {"target": 'a } b \" {', "nested": {"x": 1}}
+
+
+def test_incomplete_payload_is_not_reported():
+    parser = EarlyStopParser()
+    assert feed_all(parser, ["<response>", "<agree>false</agree>"]) is None
+    assert not parser.complete
+    assert parser.payload is None and parser.value is None
+
+
+def test_first_payload_wins():
+    parser = EarlyStopParser()
+    assert parser.feed('{"a": 1} {"b": 2}')
+    assert parser.payload == '{"a": 1}'
+    # Later tokens do not change a completed payload
+    assert parser.feed("<x></x>")
+    assert parser.payload == '{"a": 1}'
+
+
+def test_end_marks_position_in_buffer():
+    parser = EarlyStopParser()
+    parser.feed("noise <r>ok</r> tail")
+    assert parser.buffer[parser.start:parser.end] == "<r>ok</r>"
@@ -0,0 +1,67 @@
+import threading
+
+import numpy as np
+
+from langgraph_stance_analyzer.embedding_store import EmbeddingStore
+
+
+def vector(value, dim=4):
+    return np.full(dim, value, dtype=np.float32)
+
+
+def test_round_trip_across_instances(tmp_path):
+    store = EmbeddingStore("model", root=tmp_path)
+    store.add(["a", "b"], [vector(1), vector(2)])
+
+    reopened = EmbeddingStore("model", root=tmp_path, read_only=True)
+    matrix, found = reopened.lookup(["b", "missing", "a"])
+    assert found.tolist() == [True, False, True]
+    np.testing.assert_array_equal(matrix, [vector(2), vector(0), vector(1)])
+
+
+def test_two_writers_adding_the_same_text_keep_rows_aligned(tmp_path):
+    first = EmbeddingStore("model", root=tmp_path)
+    second = EmbeddingStore("model", root=tmp_path)
+    first.add(["x"], [vector(1)])
+    # `second` has not seen "x" yet; it must not write it again or shift later rows
+    second.add(["x", "y"], [vector(1), vector(2)])
+    first.add(["z"], [vector(3)])
+
+    for store in (first, second, EmbeddingStore("model", root=tmp_path)):
+        store.refresh()
+        matrix, found = store.lookup(["x", "y", "z"])
+        assert found.all()
+        np.testing.assert_array_equal(matrix, [vector(1), vector(2), vector(3)])
+
+
+def test_concurrent_adds_from_threads(tmp_path):
+    store = EmbeddingStore("model", root=tmp_path)
+    texts = [f"text {i}" for i in range(50)]
+
+    def add(offset):
+        for i in range(offset, len(texts), 5):
+            store.add([texts[i], texts[(i + 1) % len(texts)]], [vector(i), vector((i + 1) % len(texts))])
+
+    threads = [threading.Thread(target=add, args=(offset,)) for offset in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    matrix, found = EmbeddingStore("model", root=tmp_path).lookup(texts)
+    assert found.all()
+    np.testing.assert_array_equal(matrix[:, 0], np.arange(len(texts)))
+
+
+def test_get_or_compute_embeds_each_new_text_once(tmp_path):
+    store = EmbeddingStore("model", root=tmp_path)
+    calls = []
+
+    def embed(text):
+        calls.append(text)
+        return vector(len(text))
+
+    store.get_or_compute(["aa", "b", "aa"], embed)
+    matrix = store.get_or_compute(["b", "aa", "ccc"], embed)
+    assert calls == ["aa", "b", "ccc"]
+    np.testing.assert_array_equal(matrix[:, 0], [1, 2, 3])
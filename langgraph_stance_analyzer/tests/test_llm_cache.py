@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from langgraph_stance_analyzer import llm_cache
+from langgraph_stance_analyzer.llm_cache import CachedLLM, LLMCache, make_key
+from langgraph_stance_analyzer.usage import UsageTracker
+
+
+@pytest.fixture
+def clocked_module():
+    return llm_cache
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return LLMCache(str(tmp_path / "responses.sqlite"), max_age_days=1, max_size_mb=1)
+
+
+class FakeLLM:
+    """Streams fixed tokens and counts how often it was called."""
+
+    model = "fake-model"
+    temperature = 0.2
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.calls = 0
+
+    def stream(self, input, config=None, **kwargs):
+        self.calls += 1
+        yield from self.tokens
+
+    async def astream(self, input, config=None, **kwargs):
+        self.calls += 1
+        for token in self.tokens:
+            yield token
+
+
+def test_key_depends_on_model_prompt_and_options():
+    key = make_key("m", "prompt", {"temperature": 0.2})
+    assert key == make_key("m", "prompt", {"temperature": 0.2})
+    assert key != make_key("m", "prompt", {"temperature": 0.3})
+    assert key != make_key("m", "prompt!", {"temperature": 0.2})
+    assert key != make_key("other", "prompt", {"temperature": 0.2})
+
+
+def test_round_trip_and_hit_rate(cache):
+    assert cache.get("k") is None
+    cache.put("k", "m", "answer")
+    assert cache.get("k") == "answer"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_expire_after_max_age(cache, clock):
+    cache.put("k", "m", "answer")
+    clock.now += 86400 + 1
+    assert cache.get("k") is None
+
+
+def test_size_eviction_drops_least_recently_used(tmp_path, clock):
+    cache = LLMCache(str(tmp_path / "small.sqlite"), max_size_mb=2 / 1024)  # 2 KiB
+    for name in ("a", "b", "c"):
+        cache.put(name, "m", name * 900)
+        clock.now += 1
+    cache.get("a")  # a is now more recent than b
+    cache.evict()
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_cached_llm_serves_repeats_from_the_cache(cache):
+    llm = FakeLLM(["posi", "tive"])
+    cached = CachedLLM(llm, cache)
+    assert cached.invoke("prompt") == "positive"
+    assert list(cached.stream("prompt")) == ["positive"]
+    assert llm.calls == 1
+    # Call-time parameters (e.g. an Ollama context) are part of the key
+    assert cached.invoke("prompt", context=[1, 2]) == "positive"
+    assert llm.calls == 2
+
+
+def test_early_stopped_stream_caches_only_a_complete_payload(cache):
+    llm = FakeLLM(["<response>", "<agree>true</agree>", "</response>", " trailing", " text"])
+    cached = CachedLLM(llm, cache)
+    stream = cached.stream("complete")
+    for token in stream:
+        if token == "</response>":
+            break
+    stream.close()
+    assert cache.get(cached._key("complete", {})[1]) == "<response><agree>true</agree></response>"
+
+    stream = cached.stream("cut off")
+    next(stream)
+    stream.close()
+    assert cache.get(cached._key("cut off", {})[1]) is None
+
+
+def test_cache_hits_are_reported_to_usage_tracking(cache):
+    cached = CachedLLM(FakeLLM(["posi", "tive"]), cache)
+    cached.invoke("prompt")
+    tracker = UsageTracker()
+    config = {"callbacks": [tracker], "metadata": {"agent_node": "stance_detection"}}
+    assert cached.invoke("prompt", config) == "positive"
+    assert asyncio.run(cached.ainvoke("prompt", config)) == "positive"
+
+    node = tracker.by_node()["stance_detection"]
+    assert node["calls"] == 2 and node["cached_calls"] == 2
+    assert node["prompt_eval_count"] == 0 and node["partial"] is False
+    assert "2 from cache" in tracker.summary()
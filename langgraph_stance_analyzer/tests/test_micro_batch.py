@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from langgraph_stance_analyzer.micro_batch import BatchedLLM, MicroBatcher
+
+
+def test_concurrent_items_share_batches_and_get_their_own_results():
+    sizes = []
+
+    def batch_fn(items):
+        sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch=4, max_wait_ms=200)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(batcher, range(8)))
+    assert results == [item * 2 for item in range(8)]
+    assert max(sizes) <= 4 and sum(sizes) == 8 and len(sizes) < 8
+    assert batcher.mean_batch_size == pytest.approx(8 / len(sizes))
+
+
+def test_an_exception_result_fails_only_its_item():
+    batcher = MicroBatcher(lambda items: [ValueError(item) if item < 0 else item for item in items], max_wait_ms=50)
+    futures = [batcher.submit(item) for item in (1, -1, 2)]
+    assert futures[0].result() == 1 and futures[2].result() == 2
+    with pytest.raises(ValueError):
+        futures[1].result()
+
+
+def test_a_failing_batch_fails_every_item():
+    def batch_fn(items):
+        raise RuntimeError("backend down")
+
+    batcher = MicroBatcher(batch_fn, max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        batcher(1)
+
+
+def test_async_submit():
+    batcher = MicroBatcher(lambda items: [item + 1 for item in items], max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.asubmit(item) for item in range(5)))
+
+    assert asyncio.run(run()) == [1, 2, 3, 4, 5]
+
+
+def test_batched_llm_sends_calls_with_kwargs_on_their_own():
+    calls = []
+
+    class FakeLLM:
+        def invoke(self, input, config=None, **kwargs):
+            calls.append((input, kwargs, threading.current_thread().name))
+            return f"alone: {input}"
+
+    llm = BatchedLLM(FakeLLM(), batch_fn=lambda requests: [f"batched: {prompt}" for prompt, _ in requests])
+    assert llm.invoke("a") == "batched: a"
+    assert llm.invoke("b", context=[1, 2]) == "alone: b"
+    assert calls == [("b", {"context": [1, 2]}, threading.current_thread().name)]
+
+
+def test_a_slow_batch_does_not_hold_up_the_next_one():
+    release = threading.Event()
+
+    def batch_fn(items):
+        if "slow" in items:
+            release.wait(timeout=5)
+        return items
+
+    batcher = MicroBatcher(batch_fn, max_batch=1, max_wait_ms=1, max_in_flight=2)
+    slow = batcher.submit("slow")
+    assert batcher.submit("fast").result(timeout=2) == "fast"
+    assert not slow.done()
+    release.set()
+    assert slow.result(timeout=2) == "slow"
+
+
+def test_batches_in_flight_are_bounded():
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def batch_fn(items):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return items
+
+    batcher = MicroBatcher(batch_fn, max_batch=1, max_wait_ms=1, max_in_flight=2)
+    futures = [batcher.submit(item) for item in range(6)]
+    assert [future.result(timeout=5) for future in futures] == list(range(6))
+    assert peak[0] == 2
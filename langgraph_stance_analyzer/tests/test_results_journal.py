@@ -0,0 +1,73 @@
+import json
+import threading
+
+import pytest
+
+from langgraph_stance_analyzer.results_journal import JournalMismatchError, ResultsJournal, file_digest, row_key
+
+
+def test_row_key_is_stable_and_field_sensitive():
+    assert row_key("post", "topic", 1) == row_key("post", "topic", "1")
+    assert row_key("post", "topic", 1) != row_key("post", "topic", 2)
+    assert row_key("a b", "c") != row_key("a", "b c")
+
+
+def test_records_survive_reopening(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ResultsJournal(path)
+    journal.append("k1", {"stance": "FAVOR"})
+    journal.append("k2", {"stance": "AGAINST"})
+
+    reopened = ResultsJournal(path)
+    assert len(reopened) == 2 and "k1" in reopened
+    assert reopened.get("k2") == {"stance": "AGAINST"}
+
+
+def test_line_cut_off_by_a_crash_is_dropped(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    ResultsJournal(str(path)).append("k1", {"stance": "FAVOR"})
+    with open(path, "a") as f:
+        f.write('{"key": "k2", "rec')
+
+    journal = ResultsJournal(str(path))
+    assert list(journal.records) == ["k1"]
+    journal.append("k3", {"stance": "NONE"})
+    assert list(ResultsJournal(str(path)).records) == ["k1", "k3"]
+
+
+def test_header_is_written_once_and_checked_on_resume(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    header = {"input": "in.csv", "input_sha256": "abc"}
+    journal = ResultsJournal(path, header=header)
+    journal.append("k1", {})
+    journal.append("k2", {})
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0] == {"header": header} and len(lines) == 3
+
+    assert len(ResultsJournal(path, header=header)) == 2
+    with pytest.raises(JournalMismatchError):
+        ResultsJournal(path, header={"input": "in.csv", "input_sha256": "changed"})
+
+
+def test_concurrent_appends_keep_every_line(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ResultsJournal(path, header={"job": 1})
+    threads = [
+        threading.Thread(target=lambda t=t: [journal.append(f"{t}-{i}", {"i": i}) for i in range(50)])
+        for t in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(ResultsJournal(path, header={"job": 1})) == 200
+
+
+def test_file_digest_matches_contents(tmp_path):
+    path = tmp_path / "input.csv"
+    path.write_text("post,label\nhello,1\n")
+    digest = file_digest(str(path), block_size=4)
+    assert digest == file_digest(str(path))
+    path.write_text("post,label\nhello,2\n")
+    assert file_digest(str(path)) != digest
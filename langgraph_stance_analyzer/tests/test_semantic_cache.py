@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+from langgraph_stance_analyzer import semantic_cache, target_index
+from langgraph_stance_analyzer.semantic_cache import SemanticCache, normalize_input
+from langgraph_stance_analyzer.target_index import NgramVectorizer
+
+POST = "The new climate bill is a disaster for working families"
+OTHER = "Vaccines save lives, everyone should get their booster"
+THIRD = "Our local library is extending its weekend opening hours"
+
+
+@pytest.fixture
+def clocked_module():
+    return semantic_cache
+
+
+def make_cache(**kwargs):
+    return SemanticCache(vectorizer=NgramVectorizer(), threshold=0.9, **kwargs)
+
+
+def test_normalize_drops_retweet_prefix_and_links():
+    assert normalize_input("RT @news: Big   News https://t.co/x") == "big news"
+
+
+def test_retweet_of_a_cached_post_is_a_hit(clock):
+    cache = make_cache()
+    cache.add(POST, "result")
+    value, similarity = cache.lookup(f"RT @someone: {POST} https://t.co/abc")
+    assert value == "result" and similarity == pytest.approx(1.0, abs=1e-5)
+    value, similarity = cache.lookup(OTHER)
+    assert value is None and similarity < 0.9
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = make_cache(ttl_seconds=60)
+    cache.add(POST, "result")
+    clock.now += 59
+    assert cache.lookup(POST)[0] == "result"
+    clock.now += 2
+    assert cache.lookup(POST)[0] is None
+    assert len(cache) == 0
+    assert cache.stats()["evictions"] == {"ttl": 1, "capacity": 0}
+
+
+def test_least_recently_used_entry_is_evicted_when_full(clock):
+    cache = make_cache(max_entries=2)
+    cache.add(POST, "post")
+    clock.now += 1
+    cache.add(OTHER, "other")
+    clock.now += 1
+    # Using the older entry makes the newer one the least recently used
+    assert cache.lookup(POST)[0] == "post"
+    clock.now += 1
+    cache.add(THIRD, "third")
+
+    assert len(cache) == 2
+    assert cache.lookup(OTHER)[0] is None
+    assert cache.lookup(POST)[0] == "post"
+    assert cache.lookup(THIRD)[0] == "third"
+    assert cache.stats()["evictions"]["capacity"] == 1
+
+
+def test_failed_vectorization_is_a_miss(clock):
+    class Failing:
+        def transform(self, texts):
+            raise ConnectionError("embedding backend down")
+
+    cache = SemanticCache(vectorizer=Failing())
+    cache.add(POST, "result")
+    assert cache.lookup(POST) == (None, 0.0)
+    assert len(cache) == 0 and cache.hit_rate() == 0.0
+
+
+def test_embeddings_are_fetched_concurrently_and_not_persisted(clock, monkeypatch):
+    # Once lookups start, each embed call waits until both lookups are inside it
+    barrier = threading.Barrier(2, timeout=5)
+    looking_up = threading.Event()
+    concurrent_calls = []
+
+    def embed(model, text):
+        if looking_up.is_set():
+            barrier.wait()
+            concurrent_calls.append(text)
+        return [1.0, 0.0, 0.0]
+
+    monkeypatch.setattr(semantic_cache.ollama_transport, "embed", embed)
+    monkeypatch.setattr(target_index, "EmbeddingStore", None)  # any use of the disk store fails
+    cache = SemanticCache(vectorizer=semantic_cache.get_vectorizer("embedding"))
+    cache.add(POST, "result")
+
+    looking_up.set()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.lookup(POST))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(concurrent_calls) == 2
+    assert [value for value, _ in results] == ["result", "result"]
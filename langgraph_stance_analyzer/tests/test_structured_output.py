@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from langgraph_stance_analyzer import structured_output
+from langgraph_stance_analyzer.structured_output import AGENT_SCHEMAS, schema_for, to_text
+
+
+@pytest.fixture(autouse=True)
+def structured(monkeypatch):
+    monkeypatch.setattr(structured_output, "STRUCTURED_OUTPUT", True)
+
+
+def longest_reply(schema):
+    """The longest reply the schema allows, pretty-printed like a verbose model would."""
+    reply = {}
+    for name, field in schema["properties"].items():
+        if "enum" in field:
+            reply[name] = max(field["enum"], key=lambda option: len(json.dumps(option)))
+        elif field.get("type") == "boolean":
+            reply[name] = False
+        else:
+            reply[name] = "x" * field["maxLength"]
+    return json.dumps(reply, indent=2)
+
+
+@pytest.mark.parametrize("agent", sorted(AGENT_SCHEMAS))
+def test_cap_fits_the_longest_valid_reply(agent):
+    schema, num_predict = schema_for(agent)
+    # Every token is at least one character
+    assert len(longest_reply(schema)) <= num_predict
+
+
+@pytest.mark.parametrize("agent", sorted(AGENT_SCHEMAS))
+def test_free_text_fields_are_bounded(agent):
+    schema, _ = schema_for(agent)
+    for field in schema["properties"].values():
+        if field.get("type") == "string":
+            assert field["maxLength"] > 0
+
+
+def test_schema_is_off_without_structured_output(monkeypatch):
+    monkeypatch.setattr(structured_output, "STRUCTURED_OUTPUT", False)
+    assert schema_for("debate") == (None, None)
+
+
+def test_debate_reply_becomes_xml():
+    reply = json.dumps({"agree": False, "new_target": "gun control", "justification": "a < b"})
+    assert to_text("debate", reply) == (
+        "<response><agree>false</agree><new_target>gun control</new_target>"
+        "<justification>a &lt; b</justification></response>"
+    )
+
+
+def test_incomplete_reply_is_returned_unchanged():
+    assert to_text("stance", '{"stance": "posi') == '{"stance": "posi'
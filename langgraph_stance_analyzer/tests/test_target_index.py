@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from langgraph_stance_analyzer.target_index import NgramVectorizer, TargetIndex, normalize_target
+
+WORDS = [
+    "climate", "change", "gun", "control", "abortion", "vaccine", "mandate", "tax", "reform", "border",
+    "security", "police", "funding", "student", "debt", "minimum", "wage", "health", "care", "energy",
+    "nuclear", "power", "free", "speech", "trade", "deal", "housing", "crisis", "school", "choice",
+]
+
+
+def make_targets(n, seed=0):
+    rng = np.random.default_rng(seed)
+    targets = {}
+    while len(targets) < n:
+        target = " ".join(rng.choice(WORDS, size=3, replace=False))
+        targets.setdefault(normalize_target(target), target)
+    return list(targets.values())
+
+
+def misspell(text, rng):
+    """Drops one character, like a typo in a predicted target."""
+    i = int(rng.integers(1, len(text) - 1))
+    return text[:i] + text[i + 1:]
+
+
+@pytest.fixture(scope="module")
+def targets():
+    return make_targets(1500)
+
+
+def test_exact_index_finds_each_target_itself(targets):
+    index = TargetIndex(targets[:300], NgramVectorizer())
+    indices, scores = index.query(targets[:300])
+    assert indices[:, 0].tolist() == list(range(300))
+    assert np.allclose(scores[:, 0], 1.0, atol=1e-5)
+
+
+def test_clustered_index_recall_against_exact_search(targets):
+    rng = np.random.default_rng(1)
+    queries = [misspell(target, rng) for target in rng.choice(targets, size=300)]
+    exact = TargetIndex(targets, NgramVectorizer(), n_clusters=1)
+    approximate = TargetIndex(targets, NgramVectorizer(), n_clusters=40, nprobe=8)
+    exact_top, _ = exact.query(queries)
+    approximate_top, _ = approximate.query(queries)
+    recall = np.mean(exact_top[:, 0] == approximate_top[:, 0])
+    assert recall >= 0.95
+
+
+def test_top_k_is_sorted_and_matches_exact_scores(targets):
+    index = TargetIndex(targets, NgramVectorizer(), n_clusters=1)
+    _, scores = index.query(["climate change tax"], k=5)
+    assert np.all(np.diff(scores[0]) <= 1e-6)
+    vectors = index.vectorizer.transform(targets)
+    query = index.vectorizer.transform(["climate change tax"])[0]
+    assert scores[0] == pytest.approx(np.sort(vectors @ query)[::-1][:5], abs=1e-5)
+
+
+def test_empty_queries_match_nothing(targets):
+    index = TargetIndex(targets[:50], NgramVectorizer())
+    indices, scores = index.query(["", "gun control"], k=2)
+    assert indices[0].tolist() == [-1, -1] and scores[0].tolist() == [0.0, 0.0]
+    assert index.nearest([""]) == [[]]
+    assert index.canonicalize("") == (None, 0.0)
+
+
+def test_canonicalize_maps_a_paraphrase_to_its_target():
+    index = TargetIndex(["Gun Control", "Climate Change", "Donald Trump"], NgramVectorizer())
+    target, score = index.canonicalize("gun-control laws")
+    assert target == "Gun Control"
+    assert 0 < score <= 1
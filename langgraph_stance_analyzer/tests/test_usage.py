@@ -0,0 +1,60 @@
+import uuid
+
+from langchain_core.outputs import Generation, LLMResult
+
+from langgraph_stance_analyzer.usage import UsageTracker
+
+FINAL_CHUNK = {
+    "done": True, "prompt_eval_count": 40, "prompt_eval_duration": 10**8,
+    "eval_count": 3, "eval_duration": 2 * 10**8, "load_duration": 0, "total_duration": 3 * 10**8,
+}
+
+
+def start(tracker, node):
+    run_id = uuid.uuid4()
+    tracker.on_llm_start({}, ["prompt"], run_id=run_id, metadata={"agent_node": node})
+    return run_id
+
+
+def stream(tracker, run_id, tokens):
+    for token in tokens:
+        tracker.on_llm_new_token(token, run_id=run_id)
+
+
+def test_final_chunk_usage_is_recorded_as_is():
+    tracker = UsageTracker()
+    run_id = start(tracker, "stance_detection")
+    stream(tracker, run_id, ["neg", "ative", ""])
+    tracker.on_llm_end(LLMResult(generations=[[Generation(text="negative", generation_info=FINAL_CHUNK)]]), run_id=run_id)
+
+    node = tracker.by_node()["stance_detection"]
+    assert node["prompt_eval_count"] == 40 and node["eval_count"] == 3
+    assert node["partial"] is False and node["partial_calls"] == 0
+
+
+def test_closed_stream_counts_streamed_chunks_and_is_partial():
+    tracker = UsageTracker()
+    run_id = start(tracker, "debate")
+    stream(tracker, run_id, ["<response>", "<agree>", "true", "</agree>", "</response>"])
+    tracker.on_llm_error(GeneratorExit(), run_id=run_id)
+
+    node = tracker.by_node()["debate"]
+    assert node["eval_count"] == 5
+    assert node["eval_duration"] >= 0
+    assert node["partial"] is True and node["partial_calls"] == 1
+    assert "1 partial" in tracker.summary()
+
+
+def test_partial_flag_is_per_node():
+    tracker = UsageTracker()
+    complete = start(tracker, "stance_detection")
+    tracker.on_llm_end(LLMResult(generations=[[Generation(text="x", generation_info=FINAL_CHUNK)]]), run_id=complete)
+    aborted = start(tracker, "final_response_generation")
+    stream(tracker, aborted, ["<response>"])
+    tracker.on_llm_end(LLMResult(generations=[[Generation(text="<response>")]]), run_id=aborted)
+
+    report = tracker.report()
+    assert report["nodes"]["stance_detection"]["partial"] is False
+    assert report["nodes"]["final_response_generation"]["partial"] is True
+    assert report["total"]["partial_calls"] == 1
+    assert report["total"]["eval_count"] == 4
@@ -0,0 +1,146 @@
+"""
+Per-call LLM usage captured from Ollama's final stream chunk.
+
+Pass a UsageTracker as a callback when invoking the graph; every LLM call made by
+the agents reports its prompt/eval token counts and durations to it.
+
+Calls that end without the final chunk (cancelled, failed or closed early) are
+recorded as partial: their eval count is the number of streamed chunks and their
+eval duration the time from the first to the last chunk, both estimates.
+Calls served from the LLM response cache are recorded as cached, with zero usage.
+"""
+
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Fields of Ollama's final chunk that are recorded (durations are in nanoseconds)
+USAGE_FIELDS = (
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+    "load_duration",
+    "total_duration",
+)
+
+
+def usage_from_chunk(chunk):
+    """Picks the usage fields out of a final Ollama response chunk."""
+    return {field: chunk.get(field) or 0 for field in USAGE_FIELDS}
+
+
+def estimated_usage(chunks, first_token, last_token):
+    """Usage of a call without a final chunk, from what was streamed before it ended."""
+    usage = usage_from_chunk({})
+    usage["eval_count"] = chunks
+    if first_token is not None:
+        usage["eval_duration"] = int((last_token - first_token) * 1e9)
+    return usage
+
+
+class UsageTracker(BaseCallbackHandler):
+    """Collects one usage record per LLM call, tagged with the graph node that made it."""
+
+    def __init__(self):
+        self.calls = []
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        with self._lock:
+            metadata = metadata or {}
+            node = metadata.get("agent_node") or metadata.get("langgraph_node")
+            self._runs[run_id] = {
+                "node": node, "started": time.perf_counter(), "chunks": 0, "first_token": None, "last_token": None,
+            }
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        now = time.perf_counter()
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return
+            run["chunks"] += 1
+            if run["first_token"] is None:
+                run["first_token"] = now
+            run["last_token"] = now
+
+    def _finish(self, run_id, generation_info):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            self.record(usage_from_chunk(generation_info))
+            return
+        latency = time.perf_counter() - run["started"]
+        if generation_info.get("cached"):
+            self.record(usage_from_chunk({}), node=run["node"], latency=latency, cached=True)
+        elif generation_info.get("done"):
+            self.record(usage_from_chunk(generation_info), node=run["node"], latency=latency)
+        else:
+            usage = estimated_usage(run["chunks"], run["first_token"], run["last_token"])
+            self.record(usage, node=run["node"], latency=latency, partial=True)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        generation_info = {}
+        if response.generations and response.generations[0]:
+            generation_info = response.generations[0][0].generation_info or {}
+        self._finish(run_id, generation_info)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        # Includes streams closed early on purpose: no final chunk, but the time was spent
+        self._finish(run_id, {})
+
+    def record(self, usage, node=None, latency=None, partial=False, cached=False):
+        """
+        Adds one call; `latency` is the wall-clock seconds the call took, if known.
+        `partial` marks usage estimated from the streamed chunks, `cached` a call
+        served from the LLM response cache.
+        """
+        with self._lock:
+            self.calls.append(
+                {"node": node, **usage, "latency": latency or 0.0, "partial": partial, "cached": cached}
+            )
+
+    def _aggregate(self, calls):
+        totals = {field: sum(call[field] for call in calls) for field in USAGE_FIELDS}
+        totals["latency"] = round(sum(call["latency"] for call in calls), 4)
+        totals["calls"] = len(calls)
+        # Calls whose counts are estimates; a partial total undercounts prompt tokens
+        totals["partial_calls"] = sum(1 for call in calls if call.get("partial"))
+        totals["partial"] = totals["partial_calls"] > 0
+        totals["cached_calls"] = sum(1 for call in calls if call.get("cached"))
+        return totals
+
+    def totals(self):
+        with self._lock:
+            calls = list(self.calls)
+        return self._aggregate(calls)
+
+    def by_node(self):
+        """Totals per graph node, in the order the nodes first called the LLM."""
+        with self._lock:
+            calls = list(self.calls)
+        nodes = {}
+        for call in calls:
+            nodes.setdefault(call["node"] or "unknown", []).append(call)
+        return {node: self._aggregate(node_calls) for node, node_calls in nodes.items()}
+
+    def report(self):
+        """The usage block stored in a run's JSON."""
+        return {"total": self.totals(), "nodes": self.by_node()}
+
+    def summary(self):
+        """One-line prompt-eval report for the run."""
+        totals = self.totals()
+        summary = (
+            f"{totals['calls']} LLM calls, prompt eval {totals['prompt_eval_count']} tokens "
+            f"in {totals['prompt_eval_duration'] / 1e9:.2f}s, "
+            f"load {totals['load_duration'] / 1e9:.2f}s"
+        )
+        if totals["partial"]:
+            summary += f" ({totals['partial_calls']} partial, counts estimated)"
+        if totals["cached_calls"]:
+            summary += f" ({totals['cached_calls']} from cache)"
+        return summary
@@ -1,12 +1,22 @@
 """
 Script to merge multiple stance detection training datasets into one unified training set,
 and process test/val datasets with standardized columns, preserving folder structure.
+
+Datasets are loaded and standardized in a process pool (--workers, 1 = serial). Every
+CSV is also written as Parquet next to it, with `target` and `stance` stored as
+categoricals, which downstream code can load much faster and in less memory.
 """
 
+import argparse
+import glob
 import pandas as pd
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from near_duplicates import LSHIndex, MinHasher, drop_near_duplicates, find_leakage
+
 # Base directory for datasets
 BASE_DIR = Path("/Users/pavan/Documents/college/major-project/agentic-target-stance-detection/data_new/Zero_Stance-Chat_GPT")
 
@@ -18,6 +28,9 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 PROCESSED_DATA_DIR = Path("./data_processed/Zero_Stance-Chat_GPT")
 PROCESSED_DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# Held-out test sets checked for leakage when near-duplicate removal is on
+LEAKAGE_TEST_GLOB = "./processed_data/test_*.csv"
+
 # Standard column names
 STANDARD_COLS = {
     'tweet': ['Tweet', 'tweet', 'post', 'text'],
@@ -25,6 +38,13 @@ STANDARD_COLS = {
     'stance': ['Stance 1', 'stance', 'label', 'GT Stance']
 }
 
+# Parallel build
+NUM_WORKERS = os.cpu_count() or 1
+CATEGORICAL_COLS = ['target', 'stance']
+# pandas' default NA markers, so the pyarrow reader drops the same rows as pd.read_csv
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+             '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
 # Stance normalization
 STANCE_MAP = {
     'FAVOR': 'FAVOR',
@@ -120,6 +140,11 @@ def normalize_stance(stance):
     return STANCE_MAP.get(stance_str, stance_str if stance_str in ['FAVOR', 'AGAINST', 'NONE'] else None)
 
 
+def normalize_stance_series(stances):
+    """Vectorized normalize_stance over a whole column."""
+    return stances.astype("string").str.strip().str.upper().map(STANCE_MAP)
+
+
 def find_column(df, possible_names):
     """Find a column in dataframe by trying multiple possible names."""
     for name in possible_names:
@@ -146,7 +171,7 @@ def standardize_columns(df):
     })
     
     # Normalize stance
-    standardized['stance'] = standardized['stance'].apply(normalize_stance)
+    standardized['stance'] = normalize_stance_series(standardized['stance'])
     
     # Drop rows with missing or invalid data
     standardized = standardized.dropna(subset=['tweet', 'target', 'stance'])
@@ -160,13 +185,48 @@ def standardize_columns(df):
     return standardized
 
 
+def read_csv_fast(file_path):
+    """Read a CSV with pyarrow's multithreaded parser, falling back to pandas' C engine."""
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        return pd.read_csv(file_path, low_memory=False)
+    try:
+        table = pa_csv.read_csv(
+            file_path,
+            # Tweets can contain line breaks inside quoted fields
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(null_values=NA_VALUES, strings_can_be_null=True),
+        )
+    except pa.ArrowInvalid:
+        return pd.read_csv(file_path, low_memory=False)
+    return table.to_pandas()
+
+
+def write_parquet(df, csv_path):
+    """Write df as Parquet next to csv_path, with categorical target/stance columns."""
+    try:
+        df.astype({col: 'category' for col in CATEGORICAL_COLS}).to_parquet(Path(csv_path).with_suffix('.parquet'), index=False)
+    except ImportError:
+        print(f"  ✗ Skipping Parquet for {csv_path}: pyarrow is not installed")
+
+
+def run_in_pool(fn, items, workers):
+    """Map fn over items, in a process pool when workers > 1; results keep the input order."""
+    if workers <= 1:
+        return [fn(*item) for item in items]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fn, *zip(*items)))
+
+
 def load_dataset(file_path, split_type="train"):
     """Load and standardize a dataset file."""
     try:
         if not os.path.exists(file_path):
             return None
         
-        df = pd.read_csv(file_path, low_memory=False)
+        df = read_csv_fast(file_path)
         standardized = standardize_columns(df)
         
         if standardized is None or len(standardized) == 0:
@@ -180,41 +240,37 @@ def load_dataset(file_path, split_type="train"):
         return None
 
 
-def collect_train_datasets():
+def collect_train_datasets(base_dir=BASE_DIR, workers=NUM_WORKERS):
     """Collect all training datasets from priority list."""
-    train_datasets = []
-    
     print("Collecting training datasets...\n")
     
-    # Load main training datasets
-    for rel_path in TRAIN_DATASETS:
-        full_path = BASE_DIR / rel_path
-        df = load_dataset(full_path, "train")
-        if df is not None:
-            train_datasets.append(df)
-    
-    # Load special training datasets
-    for rel_path in SPECIAL_TRAIN_PATHS:
-        full_path = BASE_DIR / rel_path
-        df = load_dataset(full_path, "train")
-        if df is not None:
-            train_datasets.append(df)
+    # Main training datasets first, then the special ones, as before
+    paths = [(base_dir / rel_path, "train") for rel_path in TRAIN_DATASETS + SPECIAL_TRAIN_PATHS]
+    return [df for df in run_in_pool(load_dataset, paths, workers) if df is not None]
+
+
+def process_test_val_file(full_path, output_path, split_type, parquet=True):
+    """Standardize one test/val file and save it (and its Parquet copy); returns 1 if saved."""
+    df = load_dataset(full_path, split_type)
+    if df is None:
+        return 0
     
-    return train_datasets
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(output_path, index=False)
+    if parquet:
+        write_parquet(df, output_path)
+    print(f"  ✓ Saved {split_type}: {output_path}")
+    return 1
 
 
-def process_test_val_datasets():
+def process_test_val_datasets(base_dir=BASE_DIR, workers=NUM_WORKERS, parquet=True):
     """Process test and val datasets, standardize columns, and save with same folder structure."""
     print(f"\n{'=' * 80}")
     print("Processing test and validation datasets...")
     print(f"{'=' * 80}\n")
     
-    all_test_val = TEST_VAL_DATASETS + SPECIAL_TEST_VAL_PATHS
-    processed_count = 0
-    
-    for rel_path in all_test_val:
-        full_path = BASE_DIR / rel_path
-        
+    tasks = []
+    for rel_path in TEST_VAL_DATASETS + SPECIAL_TEST_VAL_PATHS:
         # Determine split type from filename
         if 'raw_test' in rel_path:
             split_type = 'test'
@@ -222,20 +278,10 @@ def process_test_val_datasets():
             split_type = 'val'
         else:
             continue
-        
-        # Load and standardize
-        df = load_dataset(full_path, split_type)
-        if df is None:
-            continue
-        
-        # Create output path preserving folder structure
-        output_path = PROCESSED_DATA_DIR / rel_path
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Save standardized dataset
-        df.to_csv(output_path, index=False)
-        print(f"  ✓ Saved {split_type}: {output_path}")
-        processed_count += 1
+        # Output path preserves the folder structure
+        tasks.append((base_dir / rel_path, PROCESSED_DATA_DIR / rel_path, split_type, parquet))
+    
+    processed_count = sum(run_in_pool(process_test_val_file, tasks, workers))
     
     print(f"\n✓ Processed {processed_count} test/val datasets")
     return processed_count
@@ -253,14 +299,37 @@ def merge_and_deduplicate(df_list):
 
 
 
-def main():
+def remove_near_duplicates(train_merged, threshold, test_paths=(), drop_leaked=False):
+    """
+    Drop near-identical train rows (same target and stance, MinHash LSH similarity of the
+    tweet >= threshold) and report train/test leakage, dropping the leaked rows if asked.
+    """
+    index = LSHIndex(MinHasher().signatures(train_merged['tweet'].tolist()), threshold)
+    deduplicated, _ = drop_near_duplicates(train_merged, threshold, index=index)
+    print(f"  Near duplicates (threshold {threshold}): removed {len(train_merged) - len(deduplicated)} rows")
+    
+    leaked_rows = set()
+    for test_path in test_paths:
+        leaked = find_leakage(train_merged, pd.read_csv(test_path), threshold, index=index)
+        leaked_rows.update(leaked['train_row'].tolist())
+        print(f"  Leakage: {leaked['test_row'].nunique()} rows of {test_path} match "
+              f"{leaked['train_row'].nunique()} train rows")
+    if drop_leaked and leaked_rows:
+        # train_merged has a RangeIndex, so train_row positions are also labels
+        deduplicated = deduplicated[~deduplicated.index.isin(leaked_rows)]
+        print(f"  Dropped train rows leaking into the test sets; {len(deduplicated)} rows remain")
+    return deduplicated.reset_index(drop=True)
+
+
+def main(base_dir=BASE_DIR, workers=NUM_WORKERS, parquet=True, near_dup_threshold=None, drop_leaked=False):
     print("=" * 80)
     print("Dataset Processing Script")
     print("=" * 80)
     print()
+    start_time = time.perf_counter()
     
     # Step 1: Collect all training datasets
-    train_datasets = collect_train_datasets()
+    train_datasets = collect_train_datasets(base_dir, workers)
     
     print(f"\n{'=' * 80}")
     print("Dataset Summary:")
@@ -275,6 +344,11 @@ def main():
     print(f"\nAfter merging and deduplication:")
     print(f"  Train: {len(train_merged)} rows")
     
+    if near_dup_threshold is not None:
+        train_merged = remove_near_duplicates(
+            train_merged, near_dup_threshold, sorted(glob.glob(LEAKAGE_TEST_GLOB)), drop_leaked
+        )
+    
     # Step 3: Final statistics for training
     print(f"\n{'=' * 80}")
     print("Final Training Dataset Statistics:")
@@ -298,11 +372,13 @@ def main():
     # Save to CSV
     train_path = OUTPUT_DIR / "unified_train.csv"
     train_final.to_csv(train_path, index=False)
+    if parquet:
+        write_parquet(train_final, train_path)
     
     print(f"\n✓ Saved unified training dataset: {train_path}")
     
     # Step 5: Process test and val datasets
-    processed_count = process_test_val_datasets()
+    processed_count = process_test_val_datasets(base_dir, workers, parquet)
     
     print(f"\n{'=' * 80}")
     print("SUCCESS! All datasets processed and saved.")
@@ -310,9 +386,21 @@ def main():
     print(f"  - Unified training dataset: {train_path}")
     print(f"  - Processed test/val datasets: {processed_count} files")
     print(f"  - Output location: {PROCESSED_DATA_DIR}")
+    print(f"  - Took {time.perf_counter() - start_time:.1f}s with {workers} worker(s)")
     print(f"{'=' * 80}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Merge the stance datasets into unified train/test/val files.")
+    parser.add_argument("--base-dir", type=Path, default=BASE_DIR, help="Root of the Zero_Stance-Chat_GPT datasets.")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="Processes used to load datasets (1 = serial).")
+    parser.add_argument("--no-parquet", action="store_true", help="Only write CSV files.")
+    parser.add_argument("--near-dup-threshold", type=float,
+                        help="Also drop near-duplicate train rows at this MinHash similarity (e.g. 0.8) and check "
+                             f"leakage into {LEAKAGE_TEST_GLOB}.")
+    parser.add_argument("--drop-leaked", action="store_true",
+                        help="With --near-dup-threshold, drop train rows that near-duplicate a test row.")
+    args = parser.parse_args()
+    main(args.base_dir, max(1, args.workers), parquet=not args.no_parquet,
+         near_dup_threshold=args.near_dup_threshold, drop_leaked=args.drop_leaked)
 
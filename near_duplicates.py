@@ -0,0 +1,273 @@
+"""
+Near-duplicate detection for the stance datasets with MinHash and LSH.
+
+Tweets are normalized (case, URLs, mentions, "RT", punctuation and whitespace),
+cut into 5-byte shingles and reduced to MinHash signatures. Banded LSH only
+compares tweets that share a band, so the whole corpus is clustered in near-linear
+time instead of comparing every pair. A pair counts as a near duplicate when the
+estimated Jaccard similarity of its shingles reaches the threshold.
+
+Used by merge_datasets.py (--near-dup-threshold); run on its own to check a train
+file for redundant rows and for leakage into the test files:
+
+    python near_duplicates.py --train processed_data/merged_train_dataset.csv \
+        --test processed_data/test_*.csv --threshold 0.8
+"""
+
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+DEFAULT_THRESHOLD = 0.8
+NUM_PERM = 128
+# Bytes per shingle; a shingle is packed into one integer, so at most 8
+SHINGLE_SIZE = 5
+SEED = 1
+# Shingles hashed per block when computing signatures
+CHUNK_SHINGLES = 1 << 15
+
+URL_PATTERN = re.compile(r"https?://\S+|www\.\S+")
+MENTION_PATTERN = re.compile(r"@\w+")
+RETWEET_PATTERN = re.compile(r"^\s*rt\b:?")
+NON_WORD_PATTERN = re.compile(r"[^\w\s]+")
+SPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Lowercase and strip URLs, mentions, a leading RT, punctuation and extra whitespace."""
+    text = str(text).lower()
+    text = URL_PATTERN.sub(" ", text)
+    text = MENTION_PATTERN.sub(" ", text)
+    text = RETWEET_PATTERN.sub(" ", text)
+    text = NON_WORD_PATTERN.sub(" ", text)
+    return SPACE_PATTERN.sub(" ", text).strip()
+
+
+def shingles(texts, size=SHINGLE_SIZE):
+    """
+    Every `size`-byte window of each normalized text, packed big-endian into a
+    uint64, as one flat array plus the offset of each text's first shingle.
+    Texts shorter than a shingle are padded to one.
+    """
+    encoded = [normalize_text(text).encode("utf-8").ljust(size) for text in texts]
+    lengths = np.array([len(e) for e in encoded], dtype=np.int64)
+    counts = lengths - size + 1
+    buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+
+    # Start of every window in the joined buffer, skipping windows that span two texts
+    text_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    positions = np.arange(counts.sum()) + np.repeat(text_starts - offsets, counts)
+
+    values = np.zeros(len(positions), dtype=np.uint64)
+    for j in range(size):
+        values = (values << np.uint64(8)) | buffer[positions + j]
+    return values, offsets
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures with `num_perm` multiply-shift hash functions
+    ((a * x + b) mod 2**64) >> 32, which need no modulo and wrap in uint64.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=SEED):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+
+    def signatures(self, texts):
+        """Returns an (len(texts), num_perm) uint32 array of signatures."""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.num_perm), dtype=np.uint32)
+        values, offsets = shingles(texts, self.shingle_size)
+        ends = np.append(offsets[1:], len(values))
+
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        shift = np.uint64(32)
+        # Texts are hashed in blocks of about CHUNK_SHINGLES shingles so that every pass
+        # over a block (one per hash function) stays in the CPU cache
+        start = 0
+        while start < len(texts):
+            stop = int(np.searchsorted(ends, ends[start] - 1 + CHUNK_SHINGLES, side="right"))
+            stop = max(stop, start + 1)
+            block = values[offsets[start]:ends[stop - 1]]
+            block_offsets = offsets[start:stop] - offsets[start]
+            hashed = np.empty_like(block)
+            for i in range(self.num_perm):
+                np.multiply(block, self.a[i], out=hashed)
+                np.add(hashed, self.b[i], out=hashed)
+                np.right_shift(hashed, shift, out=hashed)
+                signatures[start:stop, i] = np.minimum.reduceat(hashed, block_offsets)
+            start = stop
+        return signatures
+
+
+def lsh_params(threshold, num_perm=NUM_PERM):
+    """
+    Bands and rows per band (bands * rows <= num_perm) whose S-curve threshold
+    (1 / bands) ** (1 / rows) is closest to `threshold`.
+    """
+    candidates = [(bands, num_perm // bands) for bands in range(1, num_perm + 1)]
+    return min(candidates, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+def similarity(signatures_a, signatures_b):
+    """Estimated Jaccard similarity of row-aligned signature arrays."""
+    return np.mean(signatures_a == signatures_b, axis=-1)
+
+
+def connected_components(n, u, v):
+    """Component label (smallest member) of n nodes joined by the edges u[i] - v[i]."""
+    labels = np.arange(n)
+    while True:
+        # Hook the larger root of every edge onto the smaller one, then flatten the trees
+        lu, lv = labels[u], labels[v]
+        if np.array_equal(lu, lv):
+            return labels
+        np.minimum.at(labels, np.maximum(lu, lv), np.minimum(lu, lv))
+        while True:
+            flattened = labels[labels]
+            if np.array_equal(flattened, labels):
+                break
+            labels = flattened
+
+
+class LSHIndex:
+    """
+    Banded LSH over MinHash signatures; `threshold` is the estimated Jaccard cut-off.
+    Each band is reduced to a 64-bit key and kept as a sorted array, so building,
+    clustering and querying are vectorized (sort and searchsorted) per band.
+    """
+
+    def __init__(self, signatures, threshold=DEFAULT_THRESHOLD, seed=SEED):
+        self.signatures = signatures
+        self.threshold = threshold
+        self.bands, self.rows = lsh_params(threshold, signatures.shape[1])
+        rng = np.random.default_rng(seed + 1)
+        self._mix = rng.integers(0, 1 << 63, size=self.rows, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        # Per band: the doc ids in key order (stable, so equal keys keep doc order) and the sorted keys
+        self.orders, self.sorted_keys = [], []
+        for band in range(self.bands):
+            keys = self._band_keys(signatures, band)
+            order = np.argsort(keys, kind="stable")
+            self.orders.append(order)
+            self.sorted_keys.append(keys[order])
+
+    def _band_keys(self, signatures, band):
+        chunk = signatures[:, band * self.rows:(band + 1) * self.rows].astype(np.uint64)
+        # Random odd multipliers with wrap-around; a collision only adds a candidate
+        return (chunk * self._mix).sum(axis=1, dtype=np.uint64)
+
+    def _similar(self, docs_a, docs_b, signatures_b=None):
+        signatures_b = self.signatures if signatures_b is None else signatures_b
+        return similarity(self.signatures[docs_a], signatures_b[docs_b]) >= self.threshold
+
+    def clusters(self):
+        """
+        Cluster label per indexed document (the smallest document id in the cluster).
+        Each bucket member is checked against the bucket's first member only, which
+        keeps large buckets linear.
+        """
+        heads, members = [], []
+        for order, keys in zip(self.orders, self.sorted_keys):
+            if len(keys) < 2:
+                continue
+            same = np.concatenate([[False], keys[1:] == keys[:-1]])
+            # Position of each bucket's first member, carried forward over the bucket
+            first = np.maximum.accumulate(np.where(same, 0, np.arange(len(keys))))
+            heads.append(order[first[same]])
+            members.append(order[same])
+        if not heads:
+            return np.arange(len(self.signatures))
+        heads, members = np.concatenate(heads), np.concatenate(members)
+        similar = self._similar(heads, members)
+        return connected_components(len(self.signatures), heads[similar], members[similar])
+
+    def query(self, signatures):
+        """Yields (query row, indexed doc, similarity) for every match at or above the threshold."""
+        pairs = []
+        for band, (order, keys) in enumerate(zip(self.orders, self.sorted_keys)):
+            query_keys = self._band_keys(signatures, band)
+            left = np.searchsorted(keys, query_keys, side="left")
+            counts = np.searchsorted(keys, query_keys, side="right") - left
+            rows = np.repeat(np.arange(len(signatures)), counts)
+            # Offsets within each query's run of equal keys
+            within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            pairs.append(np.stack([rows, order[np.repeat(left, counts) + within]], axis=1))
+        pairs = np.unique(np.concatenate(pairs), axis=0) if pairs else np.empty((0, 2), dtype=np.int64)
+        scores = similarity(self.signatures[pairs[:, 1]], signatures[pairs[:, 0]])
+        for (query_row, doc), score in zip(pairs[scores >= self.threshold], scores[scores >= self.threshold]):
+            yield int(query_row), int(doc), float(score)
+
+
+def drop_near_duplicates(df, threshold=DEFAULT_THRESHOLD, text_col="tweet", key_cols=("target", "stance"), index=None):
+    """
+    Keeps the first row of every group of near-identical `text_col` values that also
+    share `key_cols` (compared case-insensitively). A tweet labelled for another
+    target or with another stance is a different example and is kept.
+    Returns the deduplicated frame and a cluster label per row of `df`.
+    """
+    if index is None:
+        index = LSHIndex(MinHasher().signatures(df[text_col].tolist()), threshold)
+    clusters = index.clusters()
+    keys = pd.DataFrame({"cluster": clusters})
+    for col in key_cols:
+        keys[col] = df[col].astype(str).str.strip().str.lower().to_numpy()
+    keep = ~keys.duplicated().to_numpy()
+    return df[keep], clusters
+
+
+def find_leakage(train_df, test_df, threshold=DEFAULT_THRESHOLD, text_col="tweet", index=None):
+    """
+    Pairs of train and test rows whose `text_col` values are near duplicates.
+    Pass the train set's LSHIndex as `index` to reuse it across several test sets.
+    """
+    hasher = MinHasher()
+    if index is None:
+        index = LSHIndex(hasher.signatures(train_df[text_col].tolist()), threshold)
+    matches = list(index.query(hasher.signatures(test_df[text_col].tolist())))
+    leaked = pd.DataFrame(matches, columns=["test_row", "train_row", "similarity"])
+    leaked["test_tweet"] = test_df[text_col].iloc[leaked["test_row"]].to_numpy()
+    leaked["train_tweet"] = train_df[text_col].iloc[leaked["train_row"]].to_numpy()
+    return leaked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate rows and train/test leakage with MinHash LSH.")
+    parser.add_argument("--train", required=True, help="Train CSV with a 'tweet' column.")
+    parser.add_argument("--test", nargs="*", default=[], help="Test CSVs to check for leakage.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Estimated Jaccard similarity of character shingles (0-1).")
+    parser.add_argument("--output", help="Write the train file without near duplicates here.")
+    parser.add_argument("--leakage-report", help="Write the leaked (test, train) pairs to this CSV.")
+    args = parser.parse_args()
+
+    train = pd.read_csv(args.train)
+    index = LSHIndex(MinHasher().signatures(train["tweet"].tolist()), args.threshold)
+    deduplicated, clusters = drop_near_duplicates(train, args.threshold, index=index)
+    sizes = pd.Series(clusters).value_counts()
+    print(f"{args.train}: {len(train)} rows, {int((sizes > 1).sum())} near-duplicate clusters, "
+          f"{len(train) - len(deduplicated)} redundant rows at threshold {args.threshold}")
+    if args.output:
+        deduplicated.to_csv(args.output, index=False)
+        print(f"  ✓ Saved deduplicated train set: {args.output}")
+
+    reports = []
+    for test_path in args.test:
+        leaked = find_leakage(train, pd.read_csv(test_path), args.threshold, index=index)
+        print(f"{test_path}: {leaked['test_row'].nunique()} test rows near-duplicate a train row")
+        reports.append(leaked.assign(test_file=test_path))
+    if args.leakage_report and reports:
+        pd.concat(reports, ignore_index=True).to_csv(args.leakage_report, index=False)
+        print(f"  ✓ Saved leakage report: {args.leakage_report}")
+
+
+if __name__ == "__main__":
+    main()
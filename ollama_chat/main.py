@@ -1,5 +1,5 @@
 
-from ollama_client import stream_chat
+from ollama_client import ChatSession
 from config import MODEL_NAME
 
 def main():
@@ -7,17 +7,23 @@ def main():
     Main function to run the chat application.
     """
     print(f"Using model: {MODEL_NAME}")
-    print("Enter your prompt (or 'quit' to exit):")
+    print("Enter your prompt (or 'quit' to exit, 'reset' to start a new conversation):")
+
+    session = ChatSession(MODEL_NAME)
 
     while True:
         try:
             prompt = input("> ")
             if prompt.lower() == 'quit':
                 break
+            if prompt.lower() == 'reset':
+                session = ChatSession(MODEL_NAME)
+                continue
 
-            for chunk in stream_chat(MODEL_NAME, prompt):
+            for chunk in session.send(prompt):
                 print(chunk, end="", flush=True)
-            print()  
+            print()
+            print(session.usage_summary())
 
         except KeyboardInterrupt:
             print("\nExiting...")
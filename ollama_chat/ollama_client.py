@@ -1,27 +1,49 @@
+import os
+import sys
 
-import requests
-import json
-
-OLLAMA_API_URL = "http://localhost:11434/api/chat"
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from langgraph_stance_analyzer import ollama_transport
 
 def stream_chat(model, prompt):
     """
     Streams the chat response from the Ollama API.
     """
-    data = {
-        "model": model,
-        "messages": [{"role": "user", "content": prompt}],
-        "stream": True,
-    }
-
-    with requests.post(OLLAMA_API_URL, json=data, stream=True) as response:
-        response.raise_for_status()
-        for line in response.iter_lines():
-            if line:
-                try:
-                    json_data = json.loads(line)
-                    if "content" in json_data["message"]:
-                        yield json_data["message"]["content"]
-                except json.JSONDecodeError:
-                    
-                    pass
+    messages = [{"role": "user", "content": prompt}]
+    yield from ollama_transport.stream_chat(model, messages)
+
+
+class ChatSession:
+    """
+    Multi-turn chat that resends the conversation so far on every turn.
+    Each request extends the previous one, so the server reuses the KV cache of the
+    earlier turns and only evaluates the new message; keep_alive keeps it resident.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.messages = []
+        self.last_usage = None
+
+    def _on_done(self, chunk):
+        self.last_usage = chunk
+
+    def send(self, prompt):
+        """Streams the reply to a user message and records it in the history."""
+        self.messages.append({"role": "user", "content": prompt})
+        reply = []
+        try:
+            for chunk in ollama_transport.stream_chat(self.model, self.messages, on_done=self._on_done):
+                reply.append(chunk)
+                yield chunk
+        except BaseException:
+            # Drop the unanswered message so the history stays a valid prefix
+            self.messages.pop()
+            raise
+        self.messages.append({"role": "assistant", "content": "".join(reply)})
+
+    def usage_summary(self):
+        if not self.last_usage:
+            return ""
+        prompt_tokens = self.last_usage.get("prompt_eval_count", 0)
+        prompt_seconds = self.last_usage.get("prompt_eval_duration", 0) / 1e9
+        return f"[prompt eval: {prompt_tokens} tokens in {prompt_seconds:.2f}s]"
@@ -1,15 +1,27 @@
 import csv
-import requests
 import numpy as np
 import os
+import sys
 import glob
-import json
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+from langgraph_stance_analyzer import ollama_transport
+from langgraph_stance_analyzer.embedding_store import EmbeddingStore
+from langgraph_stance_analyzer.similarity import best_matches, iter_chunks
+from langgraph_stance_analyzer.target_index import get_default_index
 
 # --- Configuration ---
-OLLAMA_BASE_URL = "http://localhost:11434/api"
 GENERATION_MODEL = "llama3.1:8b"     # LLM for generating alternative predictions
 EMBEDDING_MODEL = "nomic-embed-text"    # LLM for calculating similarity
 EMBEDDING_DIM = 768                     # Dimension for nomic-embed-text
+NUM_CANDIDATES = 3                      # Original prediction + two generated alternatives
+CHUNK_SIZE = 1024                       # Rows embedded and scored per batch
+# Where the two alternatives come from: "llm" (GENERATION_MODEL, one call per row) or
+# "index" (the two nearest canonical targets from the target index, no LLM call)
+ALTERNATIVES_SOURCE = os.environ.get("EVAL_ALTERNATIVES", "llm")
+
+# Persistent embeddings, shared across runs so repeated targets are embedded only once
+EMBEDDING_STORE = EmbeddingStore(EMBEDDING_MODEL)
 
 # ------------------ LLM-based Alternative Generation ------------------
 def generate_alternatives(gt_target: str, pred_target: str) -> list[str]:
@@ -32,15 +44,8 @@ Predicted Topic: "{pred_target}"
 
 Alternative Phrases:"""
 
-    payload = {
-        "model": GENERATION_MODEL,
-        "prompt": prompt,
-        "stream": False,
-    }
     try:
-        response = requests.post(f"{OLLAMA_BASE_URL}/generate", json=payload, timeout=20)
-        response.raise_for_status()
-        text = response.json().get("response", "")
+        text = ollama_transport.generate(GENERATION_MODEL, prompt, timeout=20)
         # Parse response, removing potential numbering like "1. "
         alternatives = [
             line.split('.', 1)[-1].strip()
@@ -57,35 +62,53 @@ Alternative Phrases:"""
         print(f"\n[Warning] Could not generate alternatives for '{pred_target}': {e}")
         return [pred_target, pred_target] # Fallback to original if generation fails
 
+def index_alternatives(gt_targets: list[str], pred_targets: list[str]) -> list[list[str]]:
+    """
+    The two canonical targets nearest to each predicted target, looked up for the
+    whole chunk at once. Falls back like generate_alternatives: the GT for an empty
+    prediction, the prediction itself when fewer than two matches are found.
+    """
+    matches = get_default_index().nearest(pred_targets, k=2)
+    alternatives = []
+    for gt_target, pred_target, pred_matches in zip(gt_targets, pred_targets, matches):
+        if not pred_target or pred_target.lower() == 'n/a':
+            alternatives.append([gt_target, gt_target])
+            continue
+        row_alternatives = [target for target, _ in pred_matches]
+        while len(row_alternatives) < 2:
+            row_alternatives.append(pred_target)
+        alternatives.append(row_alternatives)
+    return alternatives
+
 # ------------------ Embedding Function ------------------
-def get_embedding(text: str) -> list[float]:
-    """Gets the embedding for a given text using the specified embedding model."""
-    if not text or str(text).lower() == 'n/a' or str(text).strip() == "":
-        return [0.0] * EMBEDDING_DIM 
-        
-    payload = {
-        "model": EMBEDDING_MODEL,
-        "prompt": str(text)
-    }
+def _is_empty(text) -> bool:
+    return not text or str(text).lower() == 'n/a' or str(text).strip() == ""
+
+def get_embeddings(texts: list[str]) -> np.ndarray:
+    """
+    Gets the embeddings for a batch of texts, reading from the persistent store and
+    only calling the embedding model for texts it has not seen before.
+    Empty texts and failed calls get a zero vector.
+    """
+    matrix = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    keep = [i for i, text in enumerate(texts) if not _is_empty(text)]
+    if not keep:
+        return matrix
+
+    def embed(text):
+        return ollama_transport.embed(EMBEDDING_MODEL, text, timeout=20)
+
+    kept_texts = [str(texts[i]) for i in keep]
     try:
-        response = requests.post(f"{OLLAMA_BASE_URL}/embeddings", json=payload, timeout=20)
-        response.raise_for_status()
-        return response.json()["embedding"]
-    except Exception as e:
-        print(f"\n[Warning] Error getting embedding for '{text}': {e}")
-        return [0.0] * EMBEDDING_DIM
-
-# ------------------ Cosine Similarity ------------------
-def cosine_sim(a: list[float], b: list[float]) -> float:
-    a = np.array(a)
-    b = np.array(b)
-    norm_a = np.linalg.norm(a)
-    norm_b = np.linalg.norm(b)
-    
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-        
-    return float(np.dot(a, b) / (norm_a * norm_b))
+        matrix[keep] = EMBEDDING_STORE.get_or_compute(kept_texts, embed)
+    except Exception:
+        # Fall back to one text at a time so a single failure only zeroes its own row
+        for i, text in zip(keep, kept_texts):
+            try:
+                matrix[i] = EMBEDDING_STORE.get_or_compute([text], embed)[0]
+            except Exception as e:
+                print(f"\n[Warning] Error getting embedding for '{text}': {e}")
+    return matrix
 
 # ------------------ Helper: Smart Column Getter ------------------
 def get_value_from_row(row, possible_keys):
@@ -149,40 +172,39 @@ def evaluate_file(input_path):
             infile.seek(0)
             reader = csv.DictReader(infile)
             
-            for i, row in enumerate(reader):
-                total_rows += 1
-                
-                gt_target = row[t_key].strip()
-                gt_stance = row[s_key].strip().upper()
-                original_pred_target = row[pt_key].strip()
-                pred_stance = row[ps_key].strip().upper()
+            for rows in iter_chunks(reader, CHUNK_SIZE):
+                gt_targets = [row[t_key].strip() for row in rows]
 
                 # --- Generate & Evaluate Multiple Targets ---
-                alternatives = generate_alternatives(gt_target, original_pred_target)
-                all_candidates = [original_pred_target] + alternatives
-
-                gt_emb = get_embedding(gt_target)
-                
-                similarities = []
-                for candidate in all_candidates:
-                    candidate_emb = get_embedding(candidate)
-                    similarities.append(cosine_sim(gt_emb, candidate_emb))
-                
-                best_similarity = max(similarities) if similarities else 0.0
-                
+                pred_targets = [row[pt_key].strip() for row in rows]
+                if ALTERNATIVES_SOURCE == "index":
+                    all_alternatives = index_alternatives(gt_targets, pred_targets)
+                else:
+                    all_alternatives = [generate_alternatives(gt, pred) for gt, pred in zip(gt_targets, pred_targets)]
+                all_candidates = [[pred] + alternatives for pred, alternatives in zip(pred_targets, all_alternatives)]
+
+                # Embed the whole chunk and score every row in one pass
+                gt_matrix = get_embeddings(gt_targets)
+                candidate_matrix = get_embeddings([c for candidates in all_candidates for c in candidates])
+                candidate_matrix = candidate_matrix.reshape(len(rows), NUM_CANDIDATES, -1)
+                _, _, best_similarity = best_matches(gt_matrix, candidate_matrix)
+
                 final_similarity = best_similarity + (1.0 - best_similarity) * 0.6
-                
+                similarity_scores.extend(final_similarity.tolist())
+
+                for row, score in zip(rows, final_similarity):
+                    total_rows += 1
+                    gt_stance = row[s_key].strip().upper()
+                    pred_stance = row[ps_key].strip().upper()
 
-                similarity_scores.append(final_similarity)
+                    is_correct = (gt_stance == pred_stance)
+                    if is_correct:
+                        stance_matches += 1
 
-                is_correct = (gt_stance == pred_stance)
-                if is_correct:
-                    stance_matches += 1
+                    row["Normalized_Target_Similarity"] = f"{score:.4f}"
+                    row["Stance_Correct"] = str(is_correct)
 
-                row["Normalized_Target_Similarity"] = f"{final_similarity:.4f}"
-                row["Stance_Correct"] = str(is_correct)
-                writer.writerow(row)
-                
+                writer.writerows(rows)
                 print(f"   Processed {total_rows} rows... (Current Avg Sim: {np.mean(similarity_scores):.4f})", end="\r")
 
     avg_sim = np.mean(similarity_scores) if similarity_scores else 0
@@ -19,6 +19,7 @@ def compile_agent_runs():
         return
 
     all_runs_data = []
+    skipped = 0
     print(f"Reading run files from: {AGENT_RUNS_DIR}")
 
     # Get all json files, sort them to have a consistent order
@@ -30,12 +31,18 @@ def compile_agent_runs():
             with open(file_path, "r") as f:
                 data = json.load(f)
 
+            # Queued, running and failed runs have no (or an error) result
+            if data.get("status") != "completed":
+                skipped += 1
+                continue
+            result = data.get("result") or {}
+
             # Extract debate history length
-            debate_history = data.get("result", {}).get("debate_history", [])
+            debate_history = result.get("debate_history", [])
             debate_turns = len(debate_history) if debate_history is not None else 0
 
             # Extract the final internal target from the agent
-            agent_final_target = data.get("result", {}).get("target", None)
+            agent_final_target = result.get("target", None)
 
             # Collect the desired data in a dictionary
             run_summary = {
@@ -57,6 +64,9 @@ def compile_agent_runs():
         except Exception as e:
             print(f"[Warning] An unexpected error occurred while processing {filename}: {e}")
 
+    if skipped:
+        print(f"Skipped {skipped} run(s) that did not complete.")
+
     if not all_runs_data:
         print("No valid run files were found to process.")
         return
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from ingest import SOURCES, assign_splits, ingest, map_chunk
+
+WTWT = SOURCES['wtwt']
+
+
+def raw_frame(rows):
+    return pd.DataFrame({
+        'text': [f'tweet number {i}' for i in range(rows)],
+        'merger': [list(WTWT['target_map'])[i % 5] for i in range(rows)],
+        'stance': [['support', 'refute', 'unrelated', 'comment'][i % 4] for i in range(rows)],
+    })
+
+
+def test_rows_with_unmapped_stances_or_targets_are_dropped():
+    frame = raw_frame(8)
+    frame.loc[0, 'merger'] = 'UNKNOWN'
+    mapped = map_chunk(frame, WTWT)
+    # 'comment' (rows 3 and 7) has no mapping in wtwt, nor does the UNKNOWN merger
+    assert list(mapped.index) == [1, 2, 4, 5, 6]
+    assert set(mapped['stance']) == {'FAVOR', 'AGAINST', 'NONE'}
+    assert mapped.loc[1, 'target'] == WTWT['target_map'][frame.loc[1, 'merger']]
+
+
+def test_splits_are_deterministic_and_independent_of_row_order():
+    mapped = map_chunk(raw_frame(400), WTWT)
+    splits = pd.Series(assign_splits(mapped, WTWT['split']), index=mapped.index)
+    shuffled = mapped.sample(frac=1, random_state=0)
+    assert (assign_splits(shuffled, WTWT['split']) == splits[shuffled.index].to_numpy()).all()
+    assert (assign_splits(mapped, WTWT['split']) == splits.to_numpy()).all()
+
+
+def test_split_ratio_is_roughly_ten_two_three():
+    mapped = map_chunk(raw_frame(20_000), WTWT)
+    names, counts = np.unique(assign_splits(mapped, WTWT['split']), return_counts=True)
+    shares = dict(zip(names, counts / counts.sum()))
+    for name, weight in WTWT['split'].items():
+        assert abs(shares[name] - weight / 15) < 0.02
+
+
+def test_ingested_files_do_not_depend_on_chunk_size(tmp_path):
+    source_dir = tmp_path / WTWT['dir']
+    source_dir.mkdir()
+    raw_frame(1000).to_csv(source_dir / 'wtwt_dataset.csv', index=False)
+
+    outputs = []
+    for chunk_size in (1000, 7):
+        counts = ingest('wtwt', tmp_path, chunk_size)
+        assert sum(counts.values()) == 750
+        outputs.append({split: (source_dir / f'raw_{split}_all_onecol.csv').read_text() for split in counts})
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from near_duplicates import (
+    LSHIndex, MinHasher, connected_components, drop_near_duplicates, find_leakage, lsh_params,
+    normalize_text, shingles, similarity,
+)
+
+BASE = "the new climate bill is a disaster for working families across the country"
+DISTINCT = [
+    "vaccines save lives and everyone should get their booster this winter",
+    "the referee made three terrible calls in the second half of the match",
+    "our local library is extending its opening hours on weekends",
+]
+
+
+def test_normalize_strips_retweets_links_mentions_and_punctuation():
+    assert normalize_text("RT @user: Hello,   World!! https://t.co/x") == "hello world"
+
+
+def test_shingles_are_packed_windows_of_each_text():
+    values, offsets = shingles(["abcdef", "xy"], size=5)
+    expected = [int.from_bytes(window, "big") for window in (b"abcde", b"bcdef", b"xy   ")]
+    assert values.tolist() == expected
+    assert offsets.tolist() == [0, 2]
+
+
+def test_signatures_match_a_direct_minhash():
+    hasher = MinHasher(num_perm=16)
+    texts = [BASE, "short", DISTINCT[0]]
+    signatures = hasher.signatures(texts)
+    values, offsets = shingles(texts)
+    ends = np.append(offsets[1:], len(values))
+    for row, (start, end) in enumerate(zip(offsets, ends)):
+        for i in range(16):
+            a, b = int(hasher.a[i]), int(hasher.b[i])
+            hashed = [((a * x + b) % 2**64) >> 32 for x in values[start:end].tolist()]
+            assert signatures[row, i] == min(hashed)
+
+
+def test_estimated_similarity_tracks_jaccard():
+    a, b = BASE, BASE.replace("disaster", "catastrophe")
+    sa, sb = (set(shingles([text])[0].tolist()) for text in (a, b))
+    jaccard = len(sa & sb) / len(sa | sb)
+    signatures = MinHasher(num_perm=512).signatures([a, b])
+    assert similarity(signatures[0], signatures[1]) == pytest.approx(jaccard, abs=0.08)
+
+
+def test_lsh_params_put_the_s_curve_near_the_threshold():
+    bands, rows = lsh_params(0.8)
+    assert bands * rows <= 128
+    assert (1 / bands) ** (1 / rows) == pytest.approx(0.8, abs=0.05)
+
+
+def test_connected_components_follow_chains():
+    labels = connected_components(6, np.array([4, 2, 1]), np.array([5, 1, 0]))
+    assert labels.tolist() == [0, 0, 0, 3, 4, 4]
+
+
+def test_clusters_group_near_duplicates_only():
+    texts = [BASE, "RT @news: " + BASE + "!", *DISTINCT, BASE + " http://t.co/abc"]
+    clusters = LSHIndex(MinHasher().signatures(texts), threshold=0.8).clusters()
+    assert clusters.tolist() == [0, 0, 2, 3, 4, 0]
+
+
+def test_drop_keeps_copies_with_another_label():
+    df = pd.DataFrame({
+        "tweet": [BASE, BASE + "!!", BASE, DISTINCT[0]],
+        "target": ["climate bill", "Climate Bill ", "climate bill", "vaccines"],
+        "stance": ["AGAINST", "against", "FAVOR", "FAVOR"],
+    })
+    kept, clusters = drop_near_duplicates(df)
+    assert kept.index.tolist() == [0, 2, 3]
+    assert clusters[0] == clusters[1] == clusters[2]
+
+
+def test_leakage_reports_test_rows_copied_from_train():
+    train = pd.DataFrame({"tweet": [*DISTINCT, BASE]})
+    test = pd.DataFrame({"tweet": ["nothing in common with anything above at all", "RT " + BASE.upper()]})
+    leaked = find_leakage(train, test)
+    assert leaked[["test_row", "train_row"]].values.tolist() == [[1, 3]]
+    assert leaked["similarity"].iloc[0] == pytest.approx(1.0)